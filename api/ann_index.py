@@ -0,0 +1,208 @@
+"""
+IVF-flat approximate nearest-neighbour search over a VectorIndex
+
+A spherical k-means coarse quantizer splits the rows of a ``VectorIndex``
+into ``nlist`` inverted lists. A query scores the centroids, scans only the
+``nprobe`` closest lists with exact inner products and keeps the top k, so
+the work per query drops from N rows to about ``N * nprobe / nlist``. Raising
+``nprobe`` trades latency for recall.
+
+The lists hold row ids only; vectors and the domain/audience bitmaps are read
+from the base index, so filtering works exactly as in a brute-force scan and
+no second copy of the vectors is kept. New rows are assigned to their nearest
+existing centroid as they arrive; ``needs_training`` turns true once the
+index has grown enough that the centroids should be refit. With a trained
+``QuantizedIndex`` attached, the probed rows are scored on their compact
+codes and only the best candidates are re-scored on the float vectors.
+"""
+import os
+import threading
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from api.knowledge_index import SearchHit
+from api.vector_index import ALL_AUDIENCES, VectorIndex, top_k_rows
+
+IVF_NLIST = int(os.getenv("IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("IVF_NPROBE", "8"))
+IVF_MIN_ROWS = int(os.getenv("IVF_MIN_ROWS", "50000"))
+
+IVF_FILE = "ivf.npz"
+TRAIN_POINTS_PER_LIST = 64
+ASSIGN_BATCH = 65536
+
+
+def default_nlist(rows: int) -> int:
+    """About 4 * sqrt(N) lists, the usual IVF starting point"""
+    return max(1, int(4 * np.sqrt(rows)))
+
+
+def spherical_kmeans(points: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Unit-norm centroids maximizing inner product with their assigned points"""
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(points @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        counts = np.bincount(assignment, minlength=clusters)
+        starts = np.cumsum(counts) - counts
+        sums = np.zeros_like(centroids)
+        filled = counts > 0
+        sums[filled] = np.add.reduceat(points[order], starts[filled], axis=0)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        # Re-seed empty clusters from random points so every list stays useful
+        sums[empty] = points[rng.choice(len(points), int(empty.sum()))]
+        norms[empty] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file ANN search with incremental inserts over a VectorIndex"""
+
+    def __init__(self, base: VectorIndex, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, quantized=None):
+        self.base = base
+        self.quantized = quantized
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        self._pending: List[List[int]] = []
+        self._trained_rows = 0
+        self._assigned = 0
+        self._lock = threading.Lock()
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def needs_training(self) -> bool:
+        """True once the base has IVF_MIN_ROWS rows and has doubled since training"""
+        size = self.base.view().size
+        return size >= IVF_MIN_ROWS and (not self.trained or size >= 2 * self._trained_rows)
+
+    def _assign(self, rows: np.ndarray) -> np.ndarray:
+        vectors = self.base.view().vectors
+        lists = np.empty(len(rows), dtype=np.int64)
+        for start in range(0, len(rows), ASSIGN_BATCH):
+            batch = rows[start:start + ASSIGN_BATCH]
+            lists[start:start + len(batch)] = np.argmax(vectors[batch] @ self.centroids.T, axis=1)
+        return lists
+
+    def train(self, sample_size: Optional[int] = None, iterations: int = 10, seed: int = 0):
+        """Fit the coarse quantizer on a sample of rows and rebuild every list"""
+        view = self.base.view()
+        size = view.size
+        if not size:
+            return
+        nlist = min(self.nlist or default_nlist(size), size)
+        rng = np.random.default_rng(seed)
+        sample_size = min(size, sample_size or nlist * TRAIN_POINTS_PER_LIST)
+        sample = np.sort(rng.choice(size, sample_size, replace=False))
+        centroids = spherical_kmeans(np.asarray(view.vectors[sample]), nlist, iterations, seed)
+
+        with self._lock:
+            # rows committed while k-means ran were skipped by add_rows; take them in here
+            size = self.base.view().size
+            self.centroids = centroids
+            rows = np.arange(size)
+            assignment = self._assign(rows)
+            order = np.argsort(assignment, kind="stable")
+            bounds = np.searchsorted(assignment[order], np.arange(nlist + 1))
+            self._lists = [rows[order[bounds[i]:bounds[i + 1]]] for i in range(nlist)]
+            self._pending = [[] for _ in range(nlist)]
+            self._trained_rows = size
+            self._assigned = size
+
+    def add_rows(self, rows: Iterable[int]):
+        """Route newly added base rows to their nearest list"""
+        if not self.trained:
+            return
+        rows = np.fromiter(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        with self._lock:
+            rows = rows[rows >= self._assigned]
+            if not len(rows):
+                return
+            for row, target in zip(rows.tolist(), self._assign(rows).tolist()):
+                self._pending[target].append(row)
+            self._assigned = int(rows.max()) + 1
+
+    def sync(self):
+        """Assign any base rows added since the last train or add_rows call"""
+        size = self.base.view().size
+        if self.trained and size > self._assigned:
+            self.add_rows(range(self._assigned, size))
+
+    def _list(self, i: int) -> np.ndarray:
+        if self._pending[i]:
+            with self._lock:
+                if self._pending[i]:
+                    self._lists[i] = np.concatenate([self._lists[i], np.asarray(self._pending[i], dtype=np.int64)])
+                    self._pending[i] = []
+        return self._lists[i]
+
+    def search(self, query: np.ndarray, k: int = 5, domains: Optional[Iterable[str]] = None,
+               audience_mask: int = ALL_AUDIENCES, nprobe: Optional[int] = None) -> List[SearchHit]:
+        """Approximate top-``k``; falls back to an exact scan until trained"""
+        if not self.trained:
+            return self.base.search(query, k, domains=domains, audience_mask=audience_mask)
+        with self.base.pin() as view:
+            return self._search(view, query, k, domains, audience_mask, nprobe)
+
+    def _search(self, view, query: np.ndarray, k: int, domains: Optional[Iterable[str]],
+                audience_mask: int, nprobe: Optional[int]) -> List[SearchHit]:
+        if not view.size or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+
+        probe = top_k_rows(self.centroids @ query, nprobe or self.nprobe)
+        rows = np.concatenate([self._list(int(i)) for i in probe])
+        rows = self.base.filter_rows(view, rows, domains, audience_mask)
+        if not len(rows):
+            return []
+
+        quantized = self.quantized
+        if quantized is not None and quantized.trained:
+            quantized.sync()
+            rows = np.sort(rows[rows < quantized._encoded])
+            return quantized.rerank(rows, quantized.approximate_scores(rows, query), query, k, view) if len(rows) else []
+
+        scores = view.vectors[rows] @ query
+        top = top_k_rows(scores, k)
+        return [SearchHit(float(scores[t]), int(rows[t]), self.base.payloads[int(rows[t])]) for t in top]
+
+    def save(self):
+        """Persist centroids and lists next to the base index"""
+        if not self.trained:
+            return
+        lists = [self._list(i) for i in range(len(self._lists))]
+        lengths = np.array([len(rows) for rows in lists], dtype=np.int64)
+        tmp = self.base.path / f"{IVF_FILE}.tmp.npz"
+        np.savez(tmp, centroids=self.centroids, lengths=lengths,
+                 rows=np.concatenate(lists) if lists else np.empty(0, dtype=np.int64),
+                 trained_rows=self._trained_rows)
+        os.replace(tmp, self.base.path / IVF_FILE)
+
+    def load(self) -> bool:
+        """Restore a saved quantizer; rows added since the save are assigned on load"""
+        path = self.base.path / IVF_FILE
+        if not path.exists():
+            return False
+        with np.load(path) as data:
+            centroids = data["centroids"]
+            if centroids.shape[1] != self.base.dimension:
+                return False
+            bounds = np.concatenate([[0], np.cumsum(data["lengths"])])
+            rows = data["rows"]
+            self.centroids = centroids
+            self._lists = [rows[bounds[i]:bounds[i + 1]] for i in range(len(centroids))]
+            self._pending = [[] for _ in range(len(centroids))]
+            self._trained_rows = int(data["trained_rows"])
+        self._assigned = int(rows.max()) + 1 if len(rows) else 0
+        self.sync()
+        return True
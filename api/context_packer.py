@@ -0,0 +1,151 @@
+"""
+Token-budgeted packing of retrieved chunks into an agent's context
+
+Ingestion cuts documents into windows that overlap by ``CHUNK_OVERLAP``
+characters, so the best hits for a question are often neighbours from one
+source and repeat each other's edges. ``ContextPacker`` walks the ranked hits
+best first and splices each one into the passage it overlaps or touches
+(same source, by the ``start`` / ``end`` offsets ingestion stores), keeping
+the overlapping text once. A hit is taken if the tokens it adds fit in what
+is left of the budget; otherwise it is skipped and smaller, lower-ranked hits
+still get their chance. Passages come out ordered by their best hit.
+
+Offsets are only a hint: chunks reused from an earlier version of a source
+keep that version's offsets, so a splice is only made when the texts agree
+on the overlap, and chunks that do not line up stay separate passages.
+"""
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from api.retrieval import page_content
+
+# Prompt tokens the retrieved knowledge may take up in an agent's context
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+# The chunker skips whitespace between windows; chunks this close are still one passage
+ADJACENT_GAP = 2
+# Shared characters needed to splice chunks whose offsets do not line up
+SPLICE_MIN_OVERLAP = 16
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), as for the message window"""
+    return len(text) // 4 + 1
+
+
+def splice(first: str, second: str, overlap: int) -> Optional[str]:
+    """``first`` followed by what ``second`` adds past their shared text, or None if they do not overlap
+
+    ``overlap`` is the expected number of shared characters (negative when
+    the chunks only touch); it is tried first, then the longest end of
+    ``first`` that ``second`` starts with.
+    """
+    if overlap <= 0:
+        return f"{first} {second}" if overlap >= -ADJACENT_GAP else None
+    if overlap <= len(second) and first.endswith(second[:overlap]):
+        return first + second[overlap:]
+    # Longest suffix of first that second starts with, found from second's first word
+    anchor = second.split(" ", 1)[0]
+    pos = first.find(anchor, max(0, len(first) - len(second)))
+    while 0 <= pos <= len(first) - SPLICE_MIN_OVERLAP:
+        if second.startswith(first[pos:]):
+            return first[:pos] + second
+        pos = first.find(anchor, pos + 1)
+    return None
+
+
+class Passage:
+    """Contiguous text of one source, built from one or more retrieved chunks"""
+
+    def __init__(self, text: str, source: Optional[str], start: Optional[int], end: Optional[int],
+                 score: float, rank: int):
+        self.text = text
+        self.source = source
+        self.start = start
+        self.end = end
+        self.score = score
+        self.rank = rank
+        self.chunks = 1
+
+    @property
+    def label(self) -> str:
+        return f"[{self.source}] " if self.source else ""
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.label + self.text)
+
+
+class ContextPacker:
+    """Greedy, relevance-ordered fill of a token budget with de-overlapped passages"""
+
+    def __init__(self, budget_tokens: int = CONTEXT_TOKEN_BUDGET):
+        self.budget_tokens = budget_tokens
+
+    def pack(self, hits: Sequence[Tuple[Any, float]],
+             budget_tokens: Optional[int] = None) -> Tuple[List[Passage], Dict[str, int]]:
+        """Best-first ``(doc, score)`` hits -> passages in relevance order, and packing stats"""
+        budget = self.budget_tokens if budget_tokens is None else budget_tokens
+        passages: List[Passage] = []
+        used = 0
+        stats = {"chunks": len(hits), "packed": 0, "merged": 0, "skipped": 0, "raw_tokens": 0}
+        for rank, (doc, score) in enumerate(hits):
+            text = page_content(doc).strip()
+            if not text:
+                continue
+            metadata = getattr(doc, "metadata", None) or {}
+            candidate = Passage(text, metadata.get("source"), metadata.get("start"), metadata.get("end"), score, rank)
+            stats["raw_tokens"] += candidate.tokens
+            merged, replaced = self._merge(candidate, passages)
+            cost = merged.tokens - sum(passage.tokens for passage in replaced)
+            if used + cost > budget:
+                if passages:
+                    stats["skipped"] += 1
+                    continue
+                # The best hit alone is over budget: keep as many of its leading words as fit
+                merged = self._truncate(candidate, budget)
+                if merged is None:
+                    stats["skipped"] += 1
+                    continue
+                cost = merged.tokens
+            for passage in replaced:
+                passages.remove(passage)
+            passages.append(merged)
+            used += cost
+            stats["packed"] += 1
+            stats["merged"] += bool(replaced)
+        passages.sort(key=lambda passage: passage.rank)
+        stats["tokens"] = used
+        return passages, stats
+
+    def _merge(self, candidate: Passage, passages: List[Passage]) -> Tuple[Passage, List[Passage]]:
+        """``candidate`` spliced with the passages of its source it overlaps, and the passages it replaces"""
+        if candidate.source is None or candidate.start is None or candidate.end is None:
+            return candidate, []
+        neighbours = sorted(
+            (p for p in passages if p.source == candidate.source and p.start is not None
+             and p.start <= candidate.end + ADJACENT_GAP and candidate.start <= p.end + ADJACENT_GAP),
+            key=lambda p: p.start,
+        )
+        merged, replaced = candidate, []
+        for passage in neighbours:
+            first, second = (passage, merged) if passage.start <= merged.start else (merged, passage)
+            if second.end <= first.end and second.text in first.text:
+                text = first.text
+            else:
+                text = splice(first.text, second.text, first.end - second.start)
+                if text is None:
+                    continue
+            combined = Passage(text, candidate.source, first.start, max(first.end, second.end),
+                               max(merged.score, passage.score), min(merged.rank, passage.rank))
+            combined.chunks = merged.chunks + passage.chunks
+            merged = combined
+            replaced.append(passage)
+        return merged, replaced
+
+    def _truncate(self, passage: Passage, budget: int) -> Optional[Passage]:
+        chars = max(0, (budget - 1) * 4 - len(passage.label))
+        cut = passage.text.rfind(" ", 0, chars + 1)
+        if cut <= 0:
+            return None
+        # Without offsets it is not spliced with later chunks of its source
+        return Passage(passage.text[:cut], passage.source, None, None, passage.score, passage.rank)
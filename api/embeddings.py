@@ -0,0 +1,238 @@
+"""
+Pluggable embedding providers with a local CPU backend and a two-level cache
+
+Every provider is a LangChain ``Embeddings`` (so it can be handed to Chroma)
+and also exposes ``embed(texts)``, which returns an L2-normalized float32
+matrix for the NumPy indexes. ``HashingEmbeddings`` needs no network, key or
+model download: it hashes word unigrams and bigrams into a fixed number of
+signed buckets and builds the whole batch with one ``np.bincount``.
+
+``CachedEmbeddings`` wraps any provider with an in-memory LRU and an on-disk
+SQLite store keyed by a hash of the provider identity and the text, so
+repeated queries and re-ingested chunks are never embedded twice, even
+across restarts and workers.
+"""
+import abc
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from api.knowledge_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "auto")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", str(Path(__file__).resolve().parent.parent / "data" / "embedding_cache"))
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length in place; all-zero rows stay zero"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    np.divide(matrix, norms, out=matrix, where=norms > 0)
+    return matrix
+
+
+class EmbeddingProvider(Embeddings):
+    """LangChain-compatible embeddings that can also return a float32 matrix"""
+
+    name = "base"
+    dimension: Optional[int] = None
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the vector space, so cached vectors are never mixed across models"""
+        return f"{self.name}:{self.dimension}"
+
+    @abc.abstractmethod
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """float32 matrix with one row per text"""
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed([text])[0].tolist()
+
+
+class HashingEmbeddings(EmbeddingProvider):
+    """Signed feature hashing of word unigrams and bigrams, CPU only"""
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = EMBEDDING_DIM, feature_cache_size: int = 200_000):
+        self.dimension = dimension
+        self._features: Dict[str, int] = {}
+        self._feature_cache_size = feature_cache_size
+
+    def _bucket(self, feature: str) -> int:
+        """Signed bucket: index + 1 for a positive feature, -(index + 1) for a negative one"""
+        bucket = self._features.get(feature)
+        if bucket is None:
+            h = zlib.crc32(feature.encode("utf-8"))
+            bucket = (h % self.dimension + 1) * (1 if h & 0x80000000 else -1)
+            if len(self._features) >= self._feature_cache_size:
+                self._features.clear()
+            self._features[feature] = bucket
+        return bucket
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        buckets: List[int] = []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            rows.extend([row] * len(features))
+            buckets.extend(self._bucket(feature) for feature in features)
+
+        n, dim = len(texts), self.dimension
+        if not buckets:
+            return np.zeros((n, dim), dtype=np.float32)
+        signed = np.asarray(buckets, dtype=np.int64)
+        flat = np.asarray(rows, dtype=np.int64) * dim + np.abs(signed) - 1
+        counts = np.bincount(flat, weights=np.sign(signed), minlength=n * dim).reshape(n, dim)
+        # Sublinear term frequency keeps repeated words from dominating
+        matrix = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+        return normalize_rows(matrix)
+
+
+class LangChainEmbeddings(EmbeddingProvider):
+    """Adapts a LangChain embeddings model (e.g. OpenAI) to the provider interface"""
+
+    def __init__(self, embeddings: Embeddings, name: str):
+        self.embeddings = embeddings
+        self.name = name
+
+    @property
+    def cache_key(self) -> str:
+        return self.name
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        matrix = np.asarray(self.embeddings.embed_documents(list(texts)), dtype=np.float32)
+        self.dimension = matrix.shape[1] if matrix.ndim == 2 else self.dimension
+        return normalize_rows(matrix.reshape(len(texts), -1))
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.asarray([self.embeddings.embed_query(text)], dtype=np.float32)
+        return normalize_rows(vector)[0].tolist()
+
+
+class CachedEmbeddings(EmbeddingProvider):
+    """In-memory LRU in front of an on-disk SQLite cache in front of a provider"""
+
+    def __init__(self, provider: EmbeddingProvider, capacity: int = EMBEDDING_CACHE_SIZE,
+                 cache_dir: Optional[str] = EMBEDDING_CACHE_DIR):
+        self.provider = provider
+        self.name = provider.name
+        self.capacity = capacity
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if cache_dir:
+            Path(cache_dir).mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(Path(cache_dir) / "embeddings.sqlite3"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self.hits = self.disk_hits = self.misses = 0
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self.provider.dimension
+
+    @property
+    def cache_key(self) -> str:
+        return self.provider.cache_key
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.provider.cache_key}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def _from_disk(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch)
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        keys = [self._key(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    vectors[key] = self._lru[key]
+            self.hits += len(vectors)
+            missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+            if missing and self._db is not None:
+                stored = self._from_disk(missing)
+                self.disk_hits += len(stored)
+                for key, vector in stored.items():
+                    vectors[key] = vector
+                    self._remember(key, vector)
+                missing = [key for key in missing if key not in stored]
+
+        if missing:
+            wanted = set(missing)
+            todo = {key: text for key, text in zip(keys, texts) if key in wanted}
+            computed = self.provider.embed(list(todo.values()))
+            with self._lock:
+                self.misses += len(todo)
+                for key, vector in zip(todo, computed):
+                    vectors[key] = vector
+                    self._remember(key, vector)
+                if self._db is not None:
+                    with self._db:
+                        self._db.executemany(
+                            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                            [(key, vector.astype(np.float32).tobytes()) for key, vector in zip(todo, computed)],
+                        )
+
+        if not keys:
+            return np.zeros((0, self.dimension or 0), dtype=np.float32)
+        return np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"provider": self.cache_key, "memory_entries": len(self._lru), "hits": self.hits,
+                "disk_hits": self.disk_hits, "misses": self.misses}
+
+
+def get_embedding_provider(name: str = EMBEDDING_PROVIDER, cache: bool = True) -> EmbeddingProvider:
+    """Build the configured provider
+
+    ``auto`` uses OpenAI when a key is configured and the package is
+    installed, and the local hashing provider otherwise.
+    """
+    provider: Optional[EmbeddingProvider] = None
+    if name == "openai" and not os.getenv("OPENAI_API_KEY"):
+        logger.warning("OPENAI_API_KEY is not set, using local hashing embeddings")
+    elif name in ("auto", "openai") and os.getenv("OPENAI_API_KEY"):
+        try:
+            from langchain_openai import OpenAIEmbeddings
+            model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
+            provider = LangChainEmbeddings(OpenAIEmbeddings(model=model), name=f"openai:{model}")
+        except ImportError:
+            logger.warning("langchain-openai is not installed, using local hashing embeddings")
+    elif name not in ("auto", "local", "hashing"):
+        raise ValueError(f"Unknown embedding provider: {name}")
+    if provider is None:
+        provider = HashingEmbeddings()
+    return CachedEmbeddings(provider) if cache else provider
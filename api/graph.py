@@ -3,12 +3,16 @@
 LangGraph Cloud Integration for GHC Digital Twin System
 Enhanced with real API keys and deployment configuration
 """
-from typing import TypedDict, List, Union, Dict, Any
+from typing import TypedDict, List, Union, Dict, Any, Optional, Callable, Awaitable
 from langgraph.graph import StateGraph, END, START
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.callbacks.manager import adispatch_custom_event
+from collections import OrderedDict
 import httpx
 import os
 import json
+import uuid
 import asyncio
 from datetime import datetime
 from dotenv import load_dotenv
@@ -24,6 +28,8 @@ class AgentState(TypedDict):
     current_agent: str
     processed_by: List[str]
     final_response: str
+    response_metadata: dict
+    message_window: dict
 
 # LangGraph Cloud Configuration - Using your REAL credentials!
 DR_BASE_URL = os.getenv("DR_BASE_URL", "https://digitalroots-bf3899aefd705f6789c2466e0c9b974d.us.langgraph.app")
@@ -35,6 +41,20 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 # Use the specific deployment URL if available
 ACTIVE_DEPLOYMENT_URL = LANGGRAPH_DEPLOYMENT_URL or DR_BASE_URL
 
+# Latency budget for the deployment's first token. When it is exceeded the
+# enhanced local answer is returned as provisional. 0 disables racing.
+DEPLOYMENT_RACE_BUDGET_MS = int(os.getenv("DEPLOYMENT_RACE_BUDGET_MS", "0"))
+UPGRADE_JOBS_MAX = int(os.getenv("UPGRADE_JOBS_MAX", "256"))
+
+# Message types the deployment uses for assistant output in "values" events
+AI_MESSAGE_TYPES = {"ai", "assistant"}
+
+# Conversation window for persistent threads: older turns are dropped (and
+# optionally folded into an extractive summary) once either limit is hit
+MESSAGE_WINDOW_TURNS = int(os.getenv("MESSAGE_WINDOW_TURNS", "20"))
+MESSAGE_WINDOW_TOKENS = int(os.getenv("MESSAGE_WINDOW_TOKENS", "6000"))
+MESSAGE_WINDOW_SUMMARIZE = os.getenv("MESSAGE_WINDOW_SUMMARIZE", "true").lower() == "true"
+
 # Assistant IDs for different audiences
 ASSISTANT_IDS = {
     "boardroom": os.getenv("ASSISTANT_ID_BOARDROOM", "76f94782-5f1d-4ea0-8e69-294da3e1aefb"),
@@ -48,8 +68,19 @@ print(f"?? Deployment ID: {DEPLOYMENT_ID}")
 print(f"?? API Key configured: {'?' if DR_API_KEY else '?'}")
 print(f"?? OpenAI Key configured: {'?' if OPENAI_API_KEY else '?'}")
 
-async def call_langgraph_deployment(question: str, agent_type: str = "ceo_digital_twin", audience: str = "public") -> Dict[str, Any]:
-    """Call your live LangGraph deployment with streaming support"""
+async def call_langgraph_deployment(
+    question: str,
+    agent_type: str = "ceo_digital_twin",
+    audience: str = "public",
+    first_token: Optional[asyncio.Event] = None,
+    on_content: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """Call your live LangGraph deployment with streaming support
+
+    ``first_token`` is set as soon as the first streamed content arrives, so
+    callers racing the deployment know it is alive before the run finishes.
+    ``on_content`` is awaited with the full content every time it changes.
+    """
     
     if not ACTIVE_DEPLOYMENT_URL or not DR_API_KEY:
         raise Exception("LangGraph deployment credentials not configured")
@@ -91,14 +122,17 @@ async def call_langgraph_deployment(question: str, agent_type: str = "ceo_digita
             print(f"?? Calling LangGraph Deployment: {agent_type} for {audience}")
             print(f"?? URL: {ACTIVE_DEPLOYMENT_URL}/runs/stream")
             
-            response = await client.post(
+            async with client.stream(
+                "POST",
                 f"{ACTIVE_DEPLOYMENT_URL}/runs/stream",
                 headers=headers,
                 json=payload
-            )
-            
-            if response.status_code == 200:
-                # Handle streaming response
+            ) as response:
+                if response.status_code != 200:
+                    print(f"? LangGraph deployment error: {response.status_code}")
+                    return {"success": False, "error": f"http_{response.status_code}", "fallback": True}
+
+                # Handle streaming response line by line as it arrives
                 content = ""
                 async for line in response.aiter_lines():
                     if line.startswith("data: "):
@@ -106,22 +140,26 @@ async def call_langgraph_deployment(question: str, agent_type: str = "ceo_digita
                             data = json.loads(line[6:])
                             if data.get("messages"):
                                 last_msg = data["messages"][-1]
-                                if last_msg.get("content"):
+                                # the first values event echoes the human input; only answer text counts
+                                if last_msg.get("type", last_msg.get("role")) not in AI_MESSAGE_TYPES:
+                                    continue
+                                if last_msg.get("content") and last_msg["content"] != content:
                                     content = last_msg["content"]
+                                    if first_token is not None:
+                                        first_token.set()
+                                    if on_content is not None:
+                                        await on_content(content)
                         except:
                             continue
-                
-                print(f"? LangGraph deployment response received")
-                return {
-                    "success": True,
-                    "response": {"content": content or "Response received from LangGraph"},
-                    "source": "langgraph_deployment",
-                    "agent_type": agent_type,
-                    "deployment_id": DEPLOYMENT_ID
-                }
-            else:
-                print(f"? LangGraph deployment error: {response.status_code}")
-                return {"success": False, "error": f"http_{response.status_code}", "fallback": True}
+
+            print(f"? LangGraph deployment response received")
+            return {
+                "success": True,
+                "response": {"content": content or "Response received from LangGraph"},
+                "source": "langgraph_deployment",
+                "agent_type": agent_type,
+                "deployment_id": DEPLOYMENT_ID
+            }
             
     except httpx.TimeoutException:
         print("? LangGraph deployment timeout - using fallback")
@@ -138,13 +176,13 @@ ENHANCED_RESPONSES = {
 As CEO Digital Twin, I provide strategic oversight for our sustainable agriculture operations:
 
 **Current Performance (Q3 2024):**
-- Revenue: 3.2M with 32% YoY growth
+- Revenue: €3.2M with 32% YoY growth
 - EBITDA Margin: 22% and improving
 - Operations: 750 hectares across Gran Canaria & Tenerife
 - Team: 180 employees including 45 engineers
 
 **Strategic Priorities:**
-- Series A funding target: 8M for technology expansion
+- Series A funding target: €8M for technology expansion
 - Market expansion to mainland Spain and North Africa
 - Carbon-neutral operations (achieved Q4 2024)
 - Precision agriculture technology integration
@@ -156,9 +194,9 @@ Our focus remains on sustainable growth and operational excellence.""",
 From a CEO perspective on financial performance:
 
 **Key Metrics:**
-- Q3 2024 Revenue: 3.2M (32% YoY growth)
+- Q3 2024 Revenue: €3.2M (32% YoY growth)
 - Operating cash flow positive since Q2 2024
-- Series A funding target: 8M for expansion
+- Series A funding target: €8M for expansion
 - Strong EBITDA margins supporting growth
 
 **Financial Strategy:**
@@ -220,88 +258,298 @@ Based on our current operational data and market position, this aligns with our
     
     return base_response + question_context
 
+SUMMARY_MESSAGE_NAME = "conversation_summary"
+
+class MessageWindowPolicy:
+    """Limits applied to ``AgentState.messages`` after every agent turn"""
+
+    def __init__(
+        self,
+        max_turns: int = MESSAGE_WINDOW_TURNS,
+        token_budget: int = MESSAGE_WINDOW_TOKENS,
+        summarize: bool = MESSAGE_WINDOW_SUMMARIZE,
+        summary_max_chars: int = 1500,
+        summary_line_chars: int = 160,
+    ):
+        self.max_turns = max(1, max_turns)
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.summary_max_chars = summary_max_chars
+        self.summary_line_chars = summary_line_chars
+
+DEFAULT_WINDOW_POLICY = MessageWindowPolicy()
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Cheap token estimate (~4 characters per token)"""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    return len(content) // 4 + 1
+
+def _is_summary(message: BaseMessage) -> bool:
+    return isinstance(message, SystemMessage) and message.name == SUMMARY_MESSAGE_NAME
+
+def _summary_line(message: BaseMessage, max_chars: int) -> str:
+    """First sentence of a message, as one line of the running summary"""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    text = " ".join(content.replace("*", "").split())
+    for end in (". ", "? ", "! "):
+        cut = text.find(end)
+        if 0 < cut < max_chars:
+            text = text[:cut + 1]
+            break
+    role = "user" if isinstance(message, HumanMessage) else "assistant"
+    return f"- {role}: {text[:max_chars]}"
+
+def compact_messages(state: AgentState, policy: MessageWindowPolicy = DEFAULT_WINDOW_POLICY) -> AgentState:
+    """Keep ``state["messages"]`` within the turn and token limits of ``policy``
+
+    Work is incremental: ``state["message_window"]`` carries the token and turn
+    totals of the messages already accounted for, so each call only looks at
+    newly appended messages and at the ones it evicts. Evicted turns are
+    folded into a single summary message at the head of the list.
+    """
+    messages = state["messages"]
+    window = state.get("message_window") or {"tokens": 0, "turns": 0, "counted": 0}
+
+    has_summary = bool(messages) and _is_summary(messages[0])
+    head = 1 if has_summary else 0
+
+    # Account for messages appended since the last compaction
+    counted = min(max(window["counted"], head), len(messages))
+    for message in messages[counted:]:
+        window["tokens"] += estimate_tokens(message)
+        if isinstance(message, HumanMessage):
+            window["turns"] += 1
+
+    summary_tokens = estimate_tokens(messages[0]) if has_summary else 0
+    evicted: List[BaseMessage] = []
+    start = head
+    # Evict whole turns from the front, but never the latest one
+    while window["turns"] > 1 and (
+        window["turns"] > policy.max_turns
+        or window["tokens"] + summary_tokens > policy.token_budget
+    ):
+        end = start + 1
+        while end < len(messages) and not isinstance(messages[end], HumanMessage):
+            end += 1
+        for message in messages[start:end]:
+            window["tokens"] -= estimate_tokens(message)
+            evicted.append(message)
+        if isinstance(messages[start], HumanMessage):
+            window["turns"] -= 1
+        start = end
+
+    if evicted:
+        del messages[head:start]
+        if policy.summarize:
+            lines = messages[0].content.split("\n")[1:] if has_summary else []
+            lines.extend(_summary_line(m, policy.summary_line_chars) for m in evicted if m.content)
+            # Keep the most recent lines that fit the summary budget
+            kept, size = [], 0
+            for line in reversed(lines):
+                size += len(line) + 1
+                if size > policy.summary_max_chars:
+                    break
+                kept.append(line)
+            summary = SystemMessage(
+                content="Summary of earlier conversation:\n" + "\n".join(reversed(kept)),
+                name=SUMMARY_MESSAGE_NAME
+            )
+            if has_summary:
+                messages[0] = summary
+            else:
+                messages.insert(0, summary)
+
+    window["counted"] = len(messages)
+    state["message_window"] = window
+    return state
+
+class UpgradeRegistry:
+    """Remote deployment runs still in flight after a provisional local answer
+
+    Bounded: once ``max_jobs`` is reached the oldest jobs are forgotten, which
+    cancels them if they have not finished yet.
+    """
+
+    def __init__(self, max_jobs: int = UPGRADE_JOBS_MAX):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, asyncio.Task]" = OrderedDict()
+
+    def register(self, task: asyncio.Task) -> str:
+        job_id = uuid.uuid4().hex
+        self._jobs[job_id] = task
+        while len(self._jobs) > self.max_jobs:
+            _, oldest = self._jobs.popitem(last=False)
+            if not oldest.done():
+                oldest.cancel()
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the state of an upgrade job, or None if it is unknown"""
+        task = self._jobs.get(job_id)
+        if task is None:
+            return None
+        if not task.done():
+            return {"job_id": job_id, "status": "pending"}
+        if task.cancelled():
+            return {"job_id": job_id, "status": "failed", "error": "cancelled"}
+        if task.exception() is not None:
+            return {"job_id": job_id, "status": "failed", "error": str(task.exception())}
+
+        result = task.result()
+        if not result.get("success"):
+            return {"job_id": job_id, "status": "failed", "error": result.get("error")}
+        return {
+            "job_id": job_id,
+            "status": "complete",
+            "response": _deployment_content(result),
+            "processing_method": "langgraph_deployment"
+        }
+
+UPGRADE_REGISTRY = UpgradeRegistry()
+
+def _deployment_content(deployment_result: Dict[str, Any]) -> str:
+    deployment_response = deployment_result.get("response", {})
+    if isinstance(deployment_response, dict):
+        return deployment_response.get("content", str(deployment_response))
+    return str(deployment_response)
+
+class _DeltaForwarder:
+    """Turns successive full-content snapshots into deltas for ``on_delta``
+
+    Once ``finish`` has been called, later snapshots (e.g. from a remote run
+    left going behind a provisional answer) are no longer forwarded.
+    """
+
+    def __init__(self, on_delta: Optional[Callable[[str], Awaitable[None]]]):
+        self.on_delta = on_delta
+        self.sent = ""
+        self.finished = False
+
+    async def __call__(self, content: str):
+        if self.finished or self.on_delta is None:
+            return
+        # A rewritten message (not an extension of what was sent) is resent whole
+        delta = content[len(self.sent):] if content.startswith(self.sent) else content
+        self.sent = content
+        if delta:
+            await self.on_delta(delta)
+
+    async def finish(self, content: str):
+        await self(content)
+        self.finished = True
+
+async def resolve_agent_response(
+    question: str,
+    agent_type: str,
+    context: dict,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> Dict[str, Any]:
+    """Answer from the LangGraph deployment, falling back to the enhanced response
+
+    With ``DEPLOYMENT_RACE_BUDGET_MS`` set, the deployment only gets that long to
+    produce its first token. Past the budget the enhanced answer is returned as
+    provisional and the remote run keeps going under an upgrade job id.
+    ``on_delta`` receives the answer incrementally as it is produced.
+    """
+    audience = context.get("audience", "public")
+    forward = _DeltaForwarder(on_delta)
+
+    if DEPLOYMENT_RACE_BUDGET_MS <= 0:
+        deployment_result = await call_langgraph_deployment(question, agent_type, audience, on_content=forward)
+    else:
+        first_token = asyncio.Event()
+        remote = asyncio.create_task(
+            call_langgraph_deployment(question, agent_type, audience, first_token=first_token, on_content=forward)
+        )
+        token_wait = asyncio.create_task(first_token.wait())
+        await asyncio.wait(
+            {remote, token_wait},
+            timeout=DEPLOYMENT_RACE_BUDGET_MS / 1000,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        token_wait.cancel()
+
+        if not (first_token.is_set() or remote.done()):
+            job_id = UPGRADE_REGISTRY.register(remote)
+            print(f"?? Deployment missed {DEPLOYMENT_RACE_BUDGET_MS}ms budget for {agent_type}, job {job_id}")
+            content = generate_enhanced_response(agent_type, question, context)
+            await forward.finish(content)
+            return {
+                "content": content,
+                "processing_method": "enhanced_provisional",
+                "provisional": True,
+                "upgrade_job_id": job_id
+            }
+        deployment_result = await remote
+
+    if deployment_result.get("success"):
+        print(f"? Using LangGraph Deployment response for {agent_type}")
+        content = _deployment_content(deployment_result)
+        await forward.finish(content)
+        return {
+            "content": content,
+            "processing_method": "langgraph_deployment",
+            "provisional": False
+        }
+
+    print(f"?? Using enhanced fallback for {agent_type}")
+    content = generate_enhanced_response(agent_type, question, context)
+    await forward.finish(content)
+    return {
+        "content": content,
+        "processing_method": "enhanced_fallback",
+        "provisional": False
+    }
+
+def _apply_agent_response(state: AgentState, agent_type: str, resolved: Dict[str, Any]) -> AgentState:
+    response_content = resolved["content"]
+    state["messages"].append(AIMessage(content=response_content))
+    state["current_agent"] = agent_type
+    state.setdefault("processed_by", []).append(f"{agent_type}_{resolved['processing_method']}")
+    state["final_response"] = response_content
+    state["response_metadata"] = {
+        "deployment_method": resolved["processing_method"],
+        "provisional": resolved["provisional"],
+        "upgrade_job_id": resolved.get("upgrade_job_id")
+    }
+    return compact_messages(state)
+
+CONTENT_DELTA_EVENT = "content_delta"
+
+def _delta_dispatcher(agent_type: str, config: RunnableConfig) -> Callable[[str], Awaitable[None]]:
+    """Publish answer deltas as custom events, visible through ``graph.astream_events``"""
+    async def dispatch(delta: str):
+        await adispatch_custom_event(CONTENT_DELTA_EVENT, {"agent_type": agent_type, "delta": delta}, config=config)
+    return dispatch
+
 # Agent processing functions with deployment integration
-async def ceo_agent_node(state: AgentState) -> AgentState:
+async def ceo_agent_node(state: AgentState, config: RunnableConfig) -> AgentState:
     """CEO Digital Twin with LangGraph deployment integration"""
     
     messages = state["messages"]
     agent_type = state.get("agent_type", "ceo_digital_twin")
     context = state.get("context", {})
-    audience = context.get("audience", "public")
     
     # Get the last human message
     last_message = next((msg for msg in reversed(messages) if isinstance(msg, HumanMessage)), None)
     question = last_message.content if last_message else "Strategic analysis request"
     
-    # Try LangGraph deployment first
-    deployment_result = await call_langgraph_deployment(question, agent_type, audience)
-    
-    if deployment_result.get("success"):
-        # Use real LangGraph deployment response
-        deployment_response = deployment_result.get("response", {})
-        
-        if isinstance(deployment_response, dict):
-            response_content = deployment_response.get("content", str(deployment_response))
-        else:
-            response_content = str(deployment_response)
-            
-        processing_method = "langgraph_deployment"
-        print("? Using LangGraph Deployment response")
-    else:
-        # Use enhanced fallback
-        response_content = generate_enhanced_response(agent_type, question, context)
-        processing_method = "enhanced_fallback"
-        print("?? Using enhanced fallback response")
-    
-    # Update state
-    ai_message = AIMessage(content=response_content)
-    state["messages"].append(ai_message)
-    state["current_agent"] = agent_type
-    state["processed_by"].append(f"{agent_type}_{processing_method}")
-    state["final_response"] = response_content
-    
-    return state
+    resolved = await resolve_agent_response(question, agent_type, context, _delta_dispatcher(agent_type, config))
+    return _apply_agent_response(state, agent_type, resolved)
 
-async def other_agent_node(state: AgentState) -> AgentState:
+async def other_agent_node(state: AgentState, config: RunnableConfig) -> AgentState:
     """Handler for other agent types with deployment integration"""
     
     messages = state["messages"] 
     agent_type = state.get("agent_type", "ceo_digital_twin")
     context = state.get("context", {})
-    audience = context.get("audience", "public")
     
     # Get the last human message
     last_message = next((msg for msg in reversed(messages) if isinstance(msg, HumanMessage)), None)
     question = last_message.content if last_message else "Analysis request"
     
-    # Try LangGraph deployment first
-    deployment_result = await call_langgraph_deployment(question, agent_type, audience)
-    
-    if deployment_result.get("success"):
-        # Use real LangGraph deployment response
-        deployment_response = deployment_result.get("response", {})
-        
-        if isinstance(deployment_response, dict):
-            response_content = deployment_response.get("content", str(deployment_response))
-        else:
-            response_content = str(deployment_response)
-            
-        processing_method = "langgraph_deployment"
-        print(f"? Using LangGraph Deployment response for {agent_type}")
-    else:
-        # Use enhanced fallback
-        response_content = generate_enhanced_response(agent_type, question, context)
-        processing_method = "enhanced_fallback"
-        print(f"?? Using enhanced fallback for {agent_type}")
-    
-    # Update state
-    ai_message = AIMessage(content=response_content)
-    state["messages"].append(ai_message)
-    state["current_agent"] = agent_type
-    state["processed_by"].append(f"{agent_type}_{processing_method}")
-    state["final_response"] = response_content
-    
-    return state
+    resolved = await resolve_agent_response(question, agent_type, context, _delta_dispatcher(agent_type, config))
+    return _apply_agent_response(state, agent_type, resolved)
 
 def route_agent(state: AgentState) -> str:
     """Route to appropriate agent based on agent_type"""
@@ -360,4 +608,4 @@ except Exception as e:
     LANGGRAPH_COMPILED = False
 
 # Export for use in the main application
-__all__ = ["graph", "AgentState", "call_langgraph_deployment", "LANGGRAPH_COMPILED"]
\ No newline at end of file
+__all__ = ["graph", "AgentState", "CONTENT_DELTA_EVENT", "call_langgraph_deployment", "compact_messages", "MessageWindowPolicy", "UPGRADE_REGISTRY", "LANGGRAPH_COMPILED"]
\ No newline at end of file
@@ -0,0 +1,509 @@
+"""
+Background ingestion pipeline for the knowledge stores
+
+``/api/knowledge/ingest`` used to split, embed and store a whole document
+inside the request. Documents now go onto a bounded queue and return a job
+id straight away. Worker tasks chunk each document lazily (in a worker
+thread, ``INGEST_BATCH_SIZE`` chunks at a time), drop chunks whose
+content hash is already indexed in the target domain (or repeated within the
+document), and stage the rest in a store segment in batches of
+``INGEST_BATCH_SIZE`` chunks, so each embedding call covers a whole batch and
+runs on the store executor instead of the event loop. The segment is
+committed once the whole document is staged, so readers see all of a
+document version or none of it. Job progress is kept in a bounded registry.
+
+A chunk staged by a running job is reserved until that job commits: a
+concurrent job meeting the same chunk takes the reference it commits, and
+only embeds the chunk itself if that job fails. Commits are awaited without
+a timeout, so a job never reports failure for a write that went through.
+
+With a ``DocumentManifest`` attached, re-ingesting a source is incremental:
+an unchanged document is skipped, chunks the previous version already stored
+are reused without embedding, and chunks that disappeared are tombstoned in
+the same commit once no source references them any more.
+
+Large documents can be submitted as an iterable of text blocks (a file read
+with ``read_blocks``) instead of one string. ``stream_chunks`` cuts them as
+they arrive, into the same windows with the same offsets as the string, and
+the document hash is computed on the way, so only the current window and
+the blocks it overlaps are held in memory.
+
+Every document is cleared for one audience (``public``, ``investor`` or
+``boardroom``; ``INGEST_DEFAULT_AUDIENCE`` when the caller does not say).
+Chunks are only reused between documents cleared for the same audience, so
+a chunk's audience bitmap always matches the document that stored it.
+"""
+import asyncio
+import itertools
+import logging
+import math
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from api.knowledge_index import AUDIENCES
+from api.manifest import DocumentManifest
+from api.retrieval import ContentHasher, content_hash
+from api.store_executor import BoundedExecutor
+
+logger = logging.getLogger(__name__)
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "32"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_JOBS_MAX = int(os.getenv("INGEST_JOBS_MAX", "1000"))
+# Embedding a full batch takes longer than a search
+INGEST_BATCH_TIMEOUT = float(os.getenv("INGEST_BATCH_TIMEOUT", "120"))
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+# Characters read per block when a document is streamed from a file
+INGEST_READ_BLOCK = int(os.getenv("INGEST_READ_BLOCK", str(1 << 20)))
+# Audience of documents ingested without one; the most restrictive, so nothing leaks by default
+INGEST_DEFAULT_AUDIENCE = os.getenv("INGEST_DEFAULT_AUDIENCE", "boardroom")
+
+# (text, start offset, end offset) in the original document
+Chunk = Tuple[str, int, int]
+# A document as one string, or as an iterable of consecutive blocks of it
+Content = Union[str, Iterable[str]]
+Chunker = Callable[[Content], Iterable[Chunk]]
+# open_segment(domain, audience) returns a segment with blocking methods run on the store executor:
+#   add(texts, metadatas)        embed and stage one batch
+#   commit(removed) -> refs      publish every staged chunk and tombstone removed
+#                                (domain, ref) pairs at once; one reference per staged chunk
+OpenSegment = Callable[[str, Optional[str]], Any]
+# (domain, audience, chunk content hash) of a stored chunk
+ChunkKey = Tuple[str, Optional[str], str]
+
+
+class IngestionQueueFull(RuntimeError):
+    """Raised when the ingestion queue is at capacity"""
+
+
+def stream_chunks(blocks: Iterable[str], chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[Chunk]:
+    """Yield windows of at most ``chunk_size`` characters, overlapping by about ``overlap``
+
+    ``blocks`` is the document as consecutive pieces of any size (a string, a
+    file read in blocks); offsets are into their concatenation. Windows end
+    at the last whitespace inside the window when there is one, so words are
+    not cut in half. Runs in one pass and only keeps the current window and
+    the blocks it overlaps.
+    """
+    blocks = iter(blocks)
+    # buffer holds document[base:base + len(buffer)], from the character before ``start``
+    buffer, base, start, exhausted = "", 0, 0, False
+    while True:
+        # A full window plus one character tells whether the window is the last one
+        if not exhausted and base + len(buffer) <= start + chunk_size:
+            pieces, available = [], base + len(buffer)
+            while available <= start + chunk_size:
+                block = next(blocks, None)
+                if block is None:
+                    exhausted = True
+                    break
+                pieces.append(block)
+                available += len(block)
+            keep = max(0, start - 1 - base)
+            buffer = buffer[keep:] + "".join(pieces)
+            base += keep
+        length = base + len(buffer)
+        if start >= length:
+            break
+        end = min(start + chunk_size, length)
+        s, e = start - base, end - base
+        if end < length:
+            cut = buffer.rfind(" ", s + overlap + 1, e)
+            cut = max(cut, buffer.rfind("\n", s + overlap + 1, e))
+            if cut > s:
+                e = cut
+                end = base + cut
+        chunk = buffer[s:e].strip()
+        if chunk:
+            yield chunk, start, end
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+        # Start the next window on a word boundary
+        while start < end and not buffer[start - 1 - base].isspace():
+            start += 1
+
+
+def split_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> Iterator[Chunk]:
+    """``stream_chunks`` of a document held in one string"""
+    return stream_chunks((text,), chunk_size, overlap)
+
+
+def chunk_content(content: Content) -> Iterator[Chunk]:
+    """Default chunker of the pipeline: a whole document or an iterable of its blocks"""
+    return stream_chunks((content,) if isinstance(content, str) else content)
+
+
+def read_blocks(path: str, block_size: int = INGEST_READ_BLOCK, encoding: str = "utf-8") -> Iterator[str]:
+    """Text of the file at ``path`` in blocks of ``block_size`` characters, for streaming ingestion"""
+    with open(path, encoding=encoding, errors="replace") as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                return
+            yield block
+
+
+def _next_chunks(chunks: Iterator[Chunk], count: int) -> List[Tuple[str, int, int, str]]:
+    """Up to ``count`` more chunks, each with its content hash"""
+    return [(text, start, end, content_hash(text)) for text, start, end in itertools.islice(chunks, count)]
+
+
+def _hashed_blocks(blocks: Iterable[str], hasher: ContentHasher) -> Iterator[str]:
+    for block in blocks:
+        hasher.update(block)
+        yield block
+
+
+class IngestionJob:
+    """Progress of one document through the pipeline"""
+
+    def __init__(self, content: Content, source: str, domain: str, metadata: Optional[Dict[str, Any]] = None,
+                 audience: str = INGEST_DEFAULT_AUDIENCE, size: Optional[int] = None):
+        self.job_id = uuid.uuid4().hex
+        self.content = content
+        self.source = source
+        self.domain = domain
+        self.audience = audience
+        self.metadata = metadata or {}
+        self.status = "queued"
+        self.error: Optional[str] = None
+        # Unknown for a stream unless the caller gives its size
+        self.bytes_total = len(content) if isinstance(content, str) else size
+        self.bytes_done = 0
+        self.chunks_seen = 0
+        self.chunks_indexed = 0
+        self.duplicates = 0
+        self.chunks_removed = 0
+        self.unchanged = False
+        self.batches = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.status = status
+        self.error = error
+        self.finished_at = time.time()
+        if status == "completed" and self.bytes_total is not None:
+            self.bytes_done = self.bytes_total
+        self.content = ""
+        self.done.set()
+
+    def progress(self) -> Optional[float]:
+        """Share of the document chunked so far; None for a stream of unknown size"""
+        if self.status == "completed" or self.bytes_total == 0:
+            return 1.0
+        if self.bytes_total is None:
+            return None
+        return round(min(self.bytes_done / self.bytes_total, 1.0), 4)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "source": self.source,
+            "domain": self.domain,
+            "audience": self.audience,
+            "progress": self.progress(),
+            "chunks_seen": self.chunks_seen,
+            "chunks_indexed": self.chunks_indexed,
+            "duplicates_skipped": self.duplicates,
+            "chunks_removed": self.chunks_removed,
+            "unchanged": self.unchanged,
+            "batches": self.batches,
+            "error": self.error,
+            "queued_seconds": round((self.started_at or time.time()) - self.created_at, 3),
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else 0.0,
+        }
+
+
+class IngestionPipeline:
+    """Bounded queue of documents drained by worker tasks in embedding-sized batches"""
+
+    def __init__(self, open_segment: OpenSegment, executor: BoundedExecutor,
+                 known_chunks: Optional[Dict[ChunkKey, str]] = None, chunker: Chunker = chunk_content,
+                 workers: int = INGEST_WORKERS, queue_size: int = INGEST_QUEUE_SIZE,
+                 batch_size: int = INGEST_BATCH_SIZE, max_jobs: int = INGEST_JOBS_MAX,
+                 manifest: Optional[DocumentManifest] = None):
+        self.open_segment = open_segment
+        self.manifest = manifest
+        self.executor = executor
+        self.chunker = chunker
+        self.workers = workers
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.max_jobs = max_jobs
+        self.known_chunks: Dict[ChunkKey, str] = known_chunks if known_chunks is not None else {}
+        # Chunks staged by a running job, resolved to their reference (None on failure) at its commit
+        self._reserved: Dict[ChunkKey, asyncio.Future] = {}
+        # (domain, ref) -> running jobs that will record the reference, so no other job tombstones it first
+        self._in_use: Dict[Tuple[str, str], int] = {}
+        # Orphans are selected under this lock and jobs release their references under it
+        self._orphan_lock = asyncio.Lock()
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._source_locks: Dict[str, Tuple[asyncio.Lock, int]] = {}
+
+    def _ensure_workers(self):
+        if self._tasks and not all(task.done() for task in self._tasks):
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker(), name=f"ingest-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, content: Content, source: str, domain: str, metadata: Optional[Dict[str, Any]] = None,
+               audience: str = INGEST_DEFAULT_AUDIENCE, size: Optional[int] = None) -> IngestionJob:
+        """Queue a document and return its job; raises IngestionQueueFull when saturated
+
+        ``content`` may be an iterable of blocks (see ``read_blocks``), which
+        is consumed as it is chunked; ``size`` is its length, for progress.
+        """
+        if audience not in AUDIENCES:
+            raise ValueError(f"Unknown audience '{audience}'")
+        self._ensure_workers()
+        job = IngestionJob(content, source, domain, metadata, audience, size)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise IngestionQueueFull(f"Ingestion queue is full ({self.queue_size} documents waiting)")
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        return job
+
+    def job(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"queued": self._queue.qsize() if self._queue else 0, "queue_limit": self.queue_size,
+                "workers": self.workers, "jobs": statuses, "known_chunks": len(self.known_chunks),
+                "sources": len(self.manifest) if self.manifest is not None else None}
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                job.finish("failed", "cancelled")
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion job {job.job_id} ({job.source}) failed: {e}")
+                job.finish("failed", str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _stage(self, job: IngestionJob, segment, texts: List[str], metadatas: List[Dict[str, Any]]):
+        await self.executor.run(segment.add, texts, metadatas, timeout=INGEST_BATCH_TIMEOUT)
+        job.chunks_indexed += len(texts)
+        job.batches += 1
+
+    async def _run(self, job: IngestionJob):
+        job.status = "running"
+        job.started_at = time.time()
+        # Versions of one source are applied in submission order, never side by side
+        lock, users = self._source_locks.get(job.source, (asyncio.Lock(), 0))
+        self._source_locks[job.source] = (lock, users + 1)
+        try:
+            async with lock:
+                await self._ingest(job)
+        finally:
+            lock, users = self._source_locks[job.source]
+            if users == 1:
+                del self._source_locks[job.source]
+            else:
+                self._source_locks[job.source] = (lock, users - 1)
+
+    async def _ingest(self, job: IngestionJob):
+        # A stream is hashed as it is chunked, so whether it changed is only known at its end
+        hasher = None if isinstance(job.content, str) else ContentHasher()
+        document_hash = content_hash(job.content) if hasher is None else None
+        entry = await self.executor.run(self.manifest.get, job.source) if self.manifest is not None else None
+        same_place = entry is not None and (entry.domain, entry.audience) == (job.domain, job.audience)
+        if same_place and entry.content_hash == document_hash:
+            job.unchanged = True
+            job.finish("completed")
+            return
+        previous = entry.chunks if same_place else {}
+
+        timestamp = time.strftime("%Y-%m-%dT%H:%M:%S")
+        segment = self.open_segment(job.domain, job.audience)
+        # chunk hash -> store reference, None while staged
+        chunks: Dict[str, Optional[str]] = {}
+        texts: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        staged: List[str] = []
+        # chunk hash -> (reservation, text, metadata) of chunks another job is embedding
+        pending: Dict[str, Tuple[asyncio.Future, str, Dict[str, Any]]] = {}
+        reserved: Dict[ChunkKey, asyncio.Future] = {}
+
+        try:
+            content = job.content if hasher is None else _hashed_blocks(job.content, hasher)
+            chunk_iter = iter(self.chunker(content))
+            while True:
+                # Reading a streamed file, chunking and hashing run in a worker thread, a batch at a time
+                batch = await asyncio.to_thread(_next_chunks, chunk_iter, self.batch_size)
+                if not batch:
+                    break
+                for text, start, end, digest in batch:
+                    job.chunks_seen += 1
+                    key = (job.domain, job.audience, digest)
+                    ref = previous.get(digest) or self.known_chunks.get(key)
+                    metadata = {**job.metadata, "source": job.source, "domain": job.domain, "audience": job.audience,
+                                "timestamp": timestamp, "chunk_hash": digest, "start": start, "end": end}
+                    if digest in chunks or digest in pending:
+                        job.duplicates += 1
+                    elif ref is not None:
+                        # Stored by an earlier version of this source or by another one
+                        self._hold(job, chunks, digest, ref)
+                        job.duplicates += 1
+                    elif key in self._reserved:
+                        # Staged by a concurrent job; its reference is taken once that job commits
+                        pending[digest] = (self._reserved[key], text, metadata)
+                        job.duplicates += 1
+                    else:
+                        self._reserved[key] = reserved[key] = asyncio.get_running_loop().create_future()
+                        chunks[digest] = None
+                        staged.append(digest)
+                        texts.append(text)
+                        metadatas.append(metadata)
+                    if len(texts) >= self.batch_size:
+                        await self._stage(job, segment, texts, metadatas)
+                        texts, metadatas = [], []
+                job.bytes_done = batch[-1][2]
+
+            if texts:
+                await self._stage(job, segment, texts, metadatas)
+            if hasher is not None:
+                document_hash = hasher.hexdigest()
+                if same_place and entry.content_hash == document_hash and not staged and not pending:
+                    job.unchanged = True
+                    job.finish("completed")
+                    return
+            orphans = []
+            if self.manifest is not None:
+                orphans = await self._orphans(job.source, job.domain,
+                                              [ref for ref in chunks.values() if ref is not None])
+            # No timeout: once the commit runs, the job must record what it published
+            refs = await self.executor.run(segment.commit, [(domain, ref) for domain, _, ref in orphans],
+                                           timeout=math.inf)
+            self._record(job, staged, refs, chunks)
+            if pending:
+                await self._take_pending(job, timestamp, pending, chunks)
+            if self.manifest is not None:
+                await self.executor.run(self.manifest.put, job.source, job.domain, document_hash, chunks, job.audience,
+                                        timeout=math.inf)
+        finally:
+            # Reservations of a failed job are released for others to embed
+            self._release(reserved)
+            await self._drop_holds(job, chunks)
+        job.chunks_removed = len(orphans)
+        job.finish("completed")
+
+    def _record(self, job: IngestionJob, staged: List[str], refs: List[str], chunks: Dict[str, Optional[str]]):
+        """Publish the references of committed chunks to known_chunks and their reservations"""
+        for digest, ref in zip(staged, refs):
+            self._hold(job, chunks, digest, ref)
+            key = (job.domain, job.audience, digest)
+            self.known_chunks[key] = ref
+            reservation = self._reserved.pop(key, None)
+            if reservation is not None and not reservation.done():
+                reservation.set_result(ref)
+
+    def _release(self, reserved: Dict[ChunkKey, asyncio.Future]):
+        for key, reservation in reserved.items():
+            if not reservation.done():
+                reservation.set_result(None)
+            if self._reserved.get(key) is reservation:
+                del self._reserved[key]
+
+    async def _take_pending(self, job: IngestionJob, timestamp: str,
+                            pending: Dict[str, Tuple[asyncio.Future, str, Dict[str, Any]]],
+                            chunks: Dict[str, Optional[str]]):
+        """References of chunks staged by concurrent jobs; the ones those jobs failed to commit are embedded here
+
+        Runs after this job's own commit, so two jobs waiting on each other's
+        chunks cannot deadlock.
+        """
+        await asyncio.wait([reservation for reservation, _, _ in pending.values()])
+        missing = []
+        for digest, (reservation, text, metadata) in pending.items():
+            ref = reservation.result() or self.known_chunks.get((job.domain, job.audience, digest))
+            if ref is not None:
+                self._hold(job, chunks, digest, ref)
+            else:
+                missing.append((digest, text, metadata))
+        if not missing:
+            return
+        segment = self.open_segment(job.domain, job.audience)
+        for batch in range(0, len(missing), self.batch_size):
+            rows = missing[batch:batch + self.batch_size]
+            job.duplicates -= len(rows)
+            await self._stage(job, segment, [text for _, text, _ in rows], [metadata for _, _, metadata in rows])
+        refs = await self.executor.run(segment.commit, [], timeout=math.inf)
+        self._record(job, [digest for digest, _, _ in missing], refs, chunks)
+
+    def _hold(self, job: IngestionJob, chunks: Dict[str, Optional[str]], digest: str, ref: str):
+        """Give ``digest`` the reference ``ref`` and keep it from being orphaned until the job's manifest put"""
+        chunks[digest] = ref
+        self._in_use[(job.domain, ref)] = self._in_use.get((job.domain, ref), 0) + 1
+
+    async def _drop_holds(self, job: IngestionJob, chunks: Dict[str, Optional[str]]):
+        async with self._orphan_lock:
+            for ref in chunks.values():
+                if ref is None:
+                    continue
+                key = (job.domain, ref)
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+
+    async def _orphans(self, source: str, domain: Optional[str] = None,
+                       keep: Iterable[str] = ()) -> List[Tuple[str, str, str]]:
+        """The manifest's orphans of ``source`` that no running job holds, already dropped from known_chunks
+
+        A job holds a reference from the moment it takes it until its
+        manifest put, and only lets go under the same lock, so a reference
+        it took is either still held here or already in the manifest.
+        Dropping the orphans from known_chunks before the commit that
+        tombstones them means no job can take one in between.
+        """
+        async with self._orphan_lock:
+            orphans = await self.executor.run(self.manifest.orphans, source, domain, keep)
+            orphans = [(chunk_domain, digest, ref) for chunk_domain, digest, ref in orphans
+                       if (chunk_domain, ref) not in self._in_use]
+            self._forget_chunks(orphans)
+        return orphans
+
+    def _forget_chunks(self, orphans: List[Tuple[str, str, str]]):
+        for domain, digest, ref in orphans:
+            for audience in (*AUDIENCES, None):
+                if self.known_chunks.get((domain, audience, digest)) == ref:
+                    del self.known_chunks[(domain, audience, digest)]
+
+    async def forget(self, source: str) -> int:
+        """Drop a source from the manifest and tombstone its unshared chunks"""
+        entry = await self.executor.run(self.manifest.get, source) if self.manifest is not None else None
+        if entry is None:
+            return 0
+        orphans = await self._orphans(source)
+        segment = self.open_segment(entry.domain, entry.audience or INGEST_DEFAULT_AUDIENCE)
+        await self.executor.run(segment.commit, [(domain, ref) for domain, _, ref in orphans], timeout=math.inf)
+        await self.executor.run(self.manifest.remove, source)
+        return len(orphans)
@@ -0,0 +1,217 @@
+"""
+In-memory BM25 inverted index over knowledge base entries
+
+Postings are kept per term, so a query only touches the documents that share
+at least one of its terms. Each document carries a bitmask of the knowledge
+domains it belongs to, which lets searches filter by an agent's
+specialization while scoring instead of afterwards. An audience bitmap per
+document works the same way, so a public query never scores a chunk cleared
+only for investors or the board.
+"""
+import heapq
+import math
+import re
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# Figures keep their decimals and unit suffix ("3.2m", "22%") as one token
+TOKEN_RE = re.compile(r"[0-9]+(?:[.,][0-9]+)*[a-z%]*|[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or our "
+    "the this to was we were what when where which who why will with you your".split()
+)
+
+
+# From least to most privileged; a chunk cleared for one audience is visible to every later one
+AUDIENCES = ("public", "investor", "boardroom")
+ALL_AUDIENCES = 0xFF
+
+
+def audience_bits(level: str) -> int:
+    """Bitmap of the audiences that may see a chunk cleared for ``level``"""
+    rank = AUDIENCES.index(level)
+    return sum(1 << i for i in range(rank, len(AUDIENCES)))
+
+
+def audience_mask(audience: str) -> int:
+    """Query-side bit for ``audience``; an unknown audience gets the public bit"""
+    return 1 << AUDIENCES.index(audience) if audience in AUDIENCES else 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word/number tokens with stopwords removed and plurals folded"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith("ies"):
+            token = token[:-3] + "y"
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class SearchHit(NamedTuple):
+    score: float
+    doc_id: int
+    payload: Any
+
+
+class _Postings(NamedTuple):
+    """What a search reads, published together; dicts are copied before a writer changes them"""
+    terms: Dict[str, Dict[int, int]]
+    doc_len: Dict[int, int]
+    domain_mask: Dict[int, int]
+    audiences: Dict[int, int]
+    payloads: Dict[int, Any]
+    total_len: int
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index, with incremental add/remove
+
+    Changes are copy-on-write: ``update`` copies the postings of the terms it
+    touches and the document table, then publishes them in one assignment, so
+    a search reads a consistent snapshot without a lock. Writers must still be
+    serialized by the caller.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = _Postings({}, {}, {}, {}, {}, 0)
+        self._doc_terms: Dict[int, Dict[str, int]] = {}
+        self._domain_bits: Dict[str, int] = {}
+        self._next_id = 0
+
+    @classmethod
+    def from_knowledge_base(cls, knowledge_base: Dict[str, List[str]], **kwargs) -> "BM25Index":
+        """Index every fact of a ``{domain: [fact, ...]}`` knowledge base"""
+        index = cls(**kwargs)
+        index.update([(fact, fact, [domain], ALL_AUDIENCES) for domain, facts in knowledge_base.items() for fact in facts])
+        return index
+
+    def __len__(self) -> int:
+        return len(self._postings.doc_len)
+
+    def domain_mask(self, domains: Iterable[str]) -> int:
+        """Bitmask for ``domains``; unknown domains contribute nothing"""
+        mask = 0
+        for domain in domains:
+            mask |= self._domain_bits.get(domain, 0)
+        return mask
+
+    def add(self, text: str, payload: Any = None, domains: Iterable[str] = (), audiences: int = ALL_AUDIENCES) -> int:
+        """Index ``text``, visible to the ``audiences`` bitmap, and return its document id"""
+        return self.update([(text, payload, domains, audiences)])[0]
+
+    def remove(self, doc_id: int) -> bool:
+        """Drop a document from the index; returns False if it was not indexed"""
+        if doc_id not in self._doc_terms:
+            return False
+        self.update(removed=[doc_id])
+        return True
+
+    def update(self, added: Iterable[Tuple[str, Any, Iterable[str], int]] = (),
+               removed: Iterable[int] = ()) -> List[int]:
+        """Remove documents, add ``(text, payload, domains, audiences)`` ones and publish both at once
+
+        Returns the new document ids. Batch changes: each call copies the
+        per-document tables.
+        """
+        current = self._postings
+        terms = dict(current.terms)
+        doc_len, domain_mask = dict(current.doc_len), dict(current.domain_mask)
+        audience_map, payloads = dict(current.audiences), dict(current.payloads)
+        total_len = current.total_len
+        copied = set()
+
+        def postings(term: str) -> Dict[int, int]:
+            if term not in copied:
+                copied.add(term)
+                terms[term] = dict(terms.get(term, {}))
+            return terms[term]
+
+        for doc_id in removed:
+            doc_terms = self._doc_terms.pop(doc_id, None)
+            if doc_terms is None:
+                continue
+            for term in doc_terms:
+                term_postings = postings(term)
+                del term_postings[doc_id]
+                if not term_postings:
+                    del terms[term]
+                    copied.discard(term)
+            total_len -= doc_len.pop(doc_id)
+            del domain_mask[doc_id], audience_map[doc_id], payloads[doc_id]
+
+        doc_ids = []
+        for text, payload, domains, audiences in added:
+            doc_id = self._next_id
+            self._next_id += 1
+            mask = 0
+            for domain in domains:
+                if domain not in self._domain_bits:
+                    self._domain_bits[domain] = 1 << len(self._domain_bits)
+                mask |= self._domain_bits[domain]
+
+            doc_terms: Dict[str, int] = {}
+            for token in tokenize(text):
+                doc_terms[token] = doc_terms.get(token, 0) + 1
+            for term, tf in doc_terms.items():
+                postings(term)[doc_id] = tf
+
+            length = sum(doc_terms.values())
+            self._doc_terms[doc_id] = doc_terms
+            doc_len[doc_id] = length
+            domain_mask[doc_id] = mask
+            audience_map[doc_id] = audiences
+            payloads[doc_id] = text if payload is None else payload
+            total_len += length
+            doc_ids.append(doc_id)
+
+        self._postings = _Postings(terms, doc_len, domain_mask, audience_map, payloads, total_len)
+        return doc_ids
+
+    def search(self, query: str, k: int = 5, domains: Optional[Iterable[str]] = None,
+               audience_mask: int = ALL_AUDIENCES) -> List[SearchHit]:
+        """Top-``k`` documents for ``query``, best first
+
+        With ``domains`` only documents tagged with at least one of them are
+        scored, and only documents sharing a bit with ``audience_mask``.
+        """
+        snapshot = self._postings
+        n_docs = len(snapshot.doc_len)
+        if not n_docs or k <= 0:
+            return []
+
+        mask = None
+        if domains is not None:
+            mask = self.domain_mask(domains)
+            if not mask:
+                return []
+
+        k1, b = self.k1, self.b
+        avg_len = snapshot.total_len / n_docs or 1.0
+        doc_len = snapshot.doc_len
+        domain_mask = snapshot.domain_mask
+        audiences = snapshot.audiences if audience_mask != ALL_AUDIENCES else None
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            postings = snapshot.terms.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                if mask is not None and not domain_mask[doc_id] & mask:
+                    continue
+                if audiences is not None and not audiences[doc_id] & audience_mask:
+                    continue
+                norm = k1 * (1 - b + b * doc_len[doc_id] / avg_len)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [SearchHit(score, doc_id, snapshot.payloads[doc_id]) for doc_id, score in best]
@@ -0,0 +1,119 @@
+"""
+Per-source document manifest for incremental re-indexing
+
+For every ingested source the manifest records the domain, the audience it
+was cleared for, a hash of the whole document and, per chunk, its content
+hash and the store reference it was written under (a row id in the native
+index, a document id in Chroma).
+Re-ingesting a source compares against this record: an unchanged document is
+skipped outright, chunks whose hash is already present are reused, and only
+new chunks are embedded. Chunks that disappeared are tombstoned once no other
+source still references them, so a nightly resync touches only the deltas.
+Changing a document's audience re-stores its chunks under the new audience.
+"""
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MANIFEST_FILE = "manifest.sqlite3"
+
+
+class ManifestEntry:
+    """What the manifest knows about one source"""
+
+    __slots__ = ("source", "domain", "audience", "content_hash", "chunks", "updated_at")
+
+    def __init__(self, source: str, domain: str, audience: Optional[str], content_hash: str, chunks: Dict[str, str],
+                 updated_at: float):
+        self.source = source
+        self.domain = domain
+        # None for sources recorded before chunks carried an audience
+        self.audience = audience
+        self.content_hash = content_hash
+        self.chunks = chunks
+        self.updated_at = updated_at
+
+
+class DocumentManifest:
+    """SQLite record of source -> document hash and chunk hash -> store reference"""
+
+    def __init__(self, directory: str):
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.path = Path(directory) / MANIFEST_FILE
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, domain TEXT NOT NULL, "
+                "content_hash TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS chunks (source TEXT NOT NULL, domain TEXT NOT NULL, "
+                "chunk_hash TEXT NOT NULL, ref TEXT NOT NULL, PRIMARY KEY (source, chunk_hash))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS chunks_by_hash ON chunks (domain, chunk_hash)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS chunks_by_ref ON chunks (domain, ref)")
+            if "audience" not in {row[1] for row in self._db.execute("PRAGMA table_info(sources)")}:
+                self._db.execute("ALTER TABLE sources ADD COLUMN audience TEXT")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+
+    def get(self, source: str) -> Optional[ManifestEntry]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT domain, audience, content_hash, updated_at FROM sources WHERE source = ?", (source,)
+            ).fetchone()
+            if row is None:
+                return None
+            chunks = dict(self._db.execute("SELECT chunk_hash, ref FROM chunks WHERE source = ?", (source,)))
+        return ManifestEntry(source, row[0], row[1], row[2], chunks, row[3])
+
+    def chunk_refs(self) -> Dict[Tuple[str, Optional[str], str], str]:
+        """(domain, audience, chunk hash) -> store reference for every recorded chunk"""
+        with self._lock:
+            return {(domain, audience, digest): ref for domain, audience, digest, ref in self._db.execute(
+                "SELECT chunks.domain, sources.audience, chunk_hash, ref FROM chunks JOIN sources USING (source)")}
+
+    def orphans(self, source: str, domain: Optional[str] = None, keep: Iterable[str] = ()) -> List[Tuple[str, str, str]]:
+        """Chunks ``source`` would drop by keeping only the references ``keep`` in ``domain``
+
+        Returns ``(domain, chunk_hash, ref)`` for those no other source
+        references; the caller tombstones them along with its update.
+        """
+        keep = set(keep)
+        with self._lock:
+            return [
+                (chunk_domain, digest, ref) for chunk_domain, digest, ref in
+                list(self._db.execute("SELECT domain, chunk_hash, ref FROM chunks WHERE source = ?", (source,)))
+                if not (chunk_domain == domain and ref in keep) and self._db.execute(
+                    "SELECT 1 FROM chunks WHERE domain = ? AND ref = ? AND source != ? LIMIT 1",
+                    (chunk_domain, ref, source)).fetchone() is None
+            ]
+
+    def put(self, source: str, domain: str, content_hash: str, chunks: Dict[str, str], audience: Optional[str] = None):
+        """Replace the record for ``source``"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._db.executemany(
+                "INSERT INTO chunks (source, domain, chunk_hash, ref) VALUES (?, ?, ?, ?)",
+                [(source, domain, digest, ref) for digest, ref in chunks.items()],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO sources (source, domain, audience, content_hash, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (source, domain, audience, content_hash, time.time()),
+            )
+
+    def remove(self, source: str):
+        """Forget ``source``"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._db.execute("DELETE FROM sources WHERE source = ?", (source,))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
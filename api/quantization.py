@@ -0,0 +1,313 @@
+"""
+Quantized vector codes with exact re-ranking for the memory-mapped index
+
+Float32 vectors cost ``4 * dim`` bytes per chunk. A ``QuantizedIndex`` keeps
+a compact code per row of a ``VectorIndex`` and scans the codes instead:
+
+- ``ScalarQuantizer`` (int8): one signed byte per dimension with a
+  per-dimension scale, 4x smaller than float32.
+- ``ProductQuantizer`` (PQ): the vector is split into ``m`` sub-vectors, each
+  replaced by the id of its nearest of 256 k-means centroids, so a 384-d
+  vector takes ``m`` bytes (32x smaller at m=48). Scores come from a
+  per-query lookup table (asymmetric distance computation).
+
+The code scan picks the best ``candidates`` rows and only those rows are
+re-scored exactly against the float vectors, so the float matrix is touched
+for a few hundred rows per query instead of being scanned.
+"""
+import os
+import threading
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from api.knowledge_index import SearchHit
+from api.vector_index import ALL_AUDIENCES, VectorIndex, top_k_rows
+
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+QUANTIZATION_MIN_ROWS = int(os.getenv("QUANTIZATION_MIN_ROWS", "10000"))
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "100"))
+# 0 picks one subspace per 8 dimensions (48 bytes for 384-d vectors)
+PQ_SUBSPACES = int(os.getenv("PQ_SUBSPACES", "0"))
+
+CODES_FILE = "codes.{kind}.u8"
+QUANTIZER_FILE = "quantizer.{kind}.npz"
+SCAN_BLOCK = 16384
+TRAIN_SAMPLE = 65536
+
+
+class ScalarQuantizer:
+    """Symmetric int8 quantization with one scale per dimension"""
+
+    kind = "int8"
+    dtype = np.uint8
+    transposed = False
+
+    def __init__(self):
+        self.scale: Optional[np.ndarray] = None
+
+    def code_size(self, dimension: int) -> int:
+        return dimension
+
+    def columns(self, dimension: int) -> int:
+        return dimension
+
+    def train(self, sample: np.ndarray):
+        self.scale = np.maximum(np.abs(sample).max(axis=0), 1e-12).astype(np.float32) / 127
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+        return codes.view(np.uint8)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # Fold the scale into the query once, then one product per block of codes
+        scaled = (query * self.scale).astype(np.float32)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCAN_BLOCK):
+            block = codes[start:start + SCAN_BLOCK].view(np.int8)
+            out[start:start + len(block)] = block.astype(np.float32) @ scaled
+        return out
+
+    def state(self) -> dict:
+        return {"scale": self.scale}
+
+    def restore(self, state):
+        self.scale = state["scale"]
+
+
+class ProductQuantizer:
+    """``m`` sub-quantizers of 256 centroids each, scored by table lookup"""
+
+    kind = "pq"
+    # Codes are stored as pairs of sub-quantizer ids, one uint16 row per pair of
+    # subspaces, so a scan is m/2 contiguous lookups into 65,536-entry tables
+    dtype = np.dtype("<u2")
+    transposed = True
+
+    def __init__(self, subspaces: int = PQ_SUBSPACES, iterations: int = 12):
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.codebooks: Optional[np.ndarray] = None  # (m, 256, dim / m)
+
+    def code_size(self, dimension: int) -> int:
+        if self.subspaces:
+            return self.subspaces
+        subspaces = max(2, dimension // 8)
+        while subspaces > 2 and (dimension % subspaces or subspaces % 2):
+            subspaces -= 1
+        return subspaces
+
+    def columns(self, dimension: int) -> int:
+        return self.code_size(dimension) // 2
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        n, dim = vectors.shape
+        self.subspaces = self.code_size(dim)
+        if dim % self.subspaces or self.subspaces % 2:
+            raise ValueError(f"Dimension {dim} is not divisible into {self.subspaces} subspaces (an even number is required)")
+        return vectors.reshape(n, self.subspaces, dim // self.subspaces)
+
+    def train(self, sample: np.ndarray, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        parts = self._split(sample.astype(np.float32))
+        centroids = min(256, len(sample))
+        books = []
+        for j in range(self.subspaces):
+            points = parts[:, j, :]
+            book = points[rng.choice(len(points), centroids, replace=False)].copy()
+            for _ in range(self.iterations):
+                distances = (points ** 2).sum(1)[:, None] - 2 * points @ book.T + (book ** 2).sum(1)[None, :]
+                assignment = np.argmin(distances, axis=1)
+                counts = np.bincount(assignment, minlength=centroids)
+                sums = np.zeros_like(book)
+                order = np.argsort(assignment, kind="stable")
+                filled = counts > 0
+                sums[filled] = np.add.reduceat(points[order], (np.cumsum(counts) - counts)[filled], axis=0)
+                book[filled] = sums[filled] / counts[filled, None]
+            if centroids < 256:
+                book = np.vstack([book, np.repeat(book[:1], 256 - centroids, axis=0)])
+            books.append(book)
+        self.codebooks = np.stack(books).astype(np.float32)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(np.asarray(vectors, dtype=np.float32))
+        codes = np.empty((len(vectors), self.subspaces), dtype=np.uint8)
+        for j, book in enumerate(self.codebooks):
+            points = parts[:, j, :]
+            distances = -2 * points @ book.T + (book ** 2).sum(1)[None, :]
+            codes[:, j] = np.argmin(distances, axis=1)
+        return codes.view(self.dtype)
+
+    def scores(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # Inner product of every sub-vector of the query with every centroid
+        table = np.einsum("md,mkd->mk", self._split(query.reshape(1, -1).astype(np.float32))[0], self.codebooks)
+        out = np.zeros(codes.shape[1], dtype=np.float32)
+        for j in range(len(codes)):
+            # uint16 code = id(2j) + 256 * id(2j + 1)
+            pair = (table[2 * j + 1][:, None] + table[2 * j][None, :]).ravel()
+            out += np.take(pair, codes[j])
+        return out
+
+    def state(self) -> dict:
+        return {"codebooks": self.codebooks}
+
+    def restore(self, state):
+        self.codebooks = state["codebooks"]
+        self.subspaces = len(self.codebooks)
+
+
+QUANTIZERS = {"int8": ScalarQuantizer, "pq": ProductQuantizer}
+
+
+class QuantizedIndex:
+    """Compact codes for every row of a VectorIndex, searched with exact re-ranking"""
+
+    def __init__(self, base: VectorIndex, kind: str = "int8", candidates: int = RERANK_CANDIDATES):
+        if kind not in QUANTIZERS:
+            raise ValueError(f"Unknown quantization: {kind}")
+        self.base = base
+        self.kind = kind
+        self.candidates = candidates
+        self.quantizer = QUANTIZERS[kind]()
+        self.trained = False
+        self._codes: Optional[np.ndarray] = None
+        self._capacity = 0
+        self._encoded = 0
+        self._lock = threading.Lock()
+
+    @property
+    def codes_path(self):
+        return self.base.path / CODES_FILE.format(kind=self.kind)
+
+    @property
+    def needs_training(self) -> bool:
+        return not self.trained and self.base.view().size >= QUANTIZATION_MIN_ROWS
+
+    def memory_bytes(self) -> int:
+        """Bytes of codes for the published rows"""
+        return self._encoded * self.quantizer.code_size(self.base.dimension)
+
+    def _map(self, path, capacity: int, mode: str = "r+") -> np.ndarray:
+        columns = self.quantizer.columns(self.base.dimension)
+        shape = (columns, capacity) if self.quantizer.transposed else (capacity, columns)
+        return np.memmap(path, dtype=self.quantizer.dtype, mode=mode, shape=shape)
+
+    def _reserve(self, rows: int):
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, 2 * self._capacity, 1024)
+        row_bytes = self.quantizer.columns(self.base.dimension) * np.dtype(self.quantizer.dtype).itemsize
+        if self.quantizer.transposed and self._codes is not None and self._encoded:
+            # Column-major codes change stride when the capacity grows, so copy into a new file
+            tmp = self.codes_path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                f.truncate(capacity * row_bytes)
+            grown = self._map(tmp, capacity)
+            grown[:, :self._encoded] = self._codes[:, :self._encoded]
+            grown.flush()
+            os.replace(tmp, self.codes_path)
+        else:
+            with open(self.codes_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+        self._codes = self._map(self.codes_path, capacity)
+        self._capacity = capacity
+
+    def _encode_range(self, start: int, end: int):
+        vectors = self.base.view().vectors
+        for block in range(start, end, SCAN_BLOCK):
+            stop = min(block + SCAN_BLOCK, end)
+            codes = self.quantizer.encode(np.asarray(vectors[block:stop]))
+            if self.quantizer.transposed:
+                self._codes[:, block:stop] = codes.T
+            else:
+                self._codes[block:stop] = codes
+
+    def train(self, sample_size: int = TRAIN_SAMPLE, seed: int = 0):
+        """Fit the quantizer on a sample of rows and encode every row"""
+        view = self.base.view()
+        size = view.size
+        if not size:
+            return
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(size, min(size, sample_size), replace=False))
+        self.quantizer.train(np.asarray(view.vectors[sample]))
+        with self._lock:
+            self._codes = None
+            self._capacity = 0
+            self._encoded = 0
+            self._reserve(size)
+            self._encode_range(0, size)
+            self._encoded = size
+            self.trained = True
+
+    def sync(self):
+        """Encode rows added to the base since the last call"""
+        size = self.base.view().size
+        if not self.trained or size <= self._encoded:
+            return
+        with self._lock:
+            self._reserve(size)
+            self._encode_range(self._encoded, size)
+            self._encoded = size
+
+    def approximate_scores(self, rows: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Code-based scores for ``rows`` (all encoded rows when None)"""
+        if self.quantizer.transposed:
+            codes = self._codes[:, :self._encoded] if rows is None else self._codes[:, rows]
+        else:
+            codes = self._codes[:self._encoded] if rows is None else self._codes[rows]
+        return self.quantizer.scores(codes, query)
+
+    def rerank(self, rows: np.ndarray, approximate: np.ndarray, query: np.ndarray, k: int,
+               view=None) -> List[SearchHit]:
+        """Exact float scores for the best ``candidates`` rows by approximate score"""
+        view = view or self.base.view()
+        # Sorted row ids keep the float reads in file order
+        shortlist = np.sort(rows[top_k_rows(approximate, max(self.candidates, k))])
+        exact = view.vectors[shortlist] @ query
+        top = top_k_rows(exact, k)
+        return [SearchHit(float(exact[t]), int(shortlist[t]), self.base.payloads[int(shortlist[t])]) for t in top]
+
+    def search(self, query: np.ndarray, k: int = 5, domains: Optional[Iterable[str]] = None,
+               audience_mask: int = ALL_AUDIENCES) -> List[SearchHit]:
+        """Top-``k`` by code scan plus exact re-ranking; exact scan until trained"""
+        if not self.trained:
+            return self.base.search(query, k, domains=domains, audience_mask=audience_mask)
+        self.sync()
+        with self.base.pin() as view:
+            return self._search(view, query, k, domains, audience_mask)
+
+    def _search(self, view, query: np.ndarray, k: int, domains: Optional[Iterable[str]],
+                audience_mask: int) -> List[SearchHit]:
+        if not view.size or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        allowed = self.base.candidate_rows(view, domains, audience_mask)[:self._encoded]
+        rows = np.flatnonzero(allowed)
+        if not len(rows):
+            return []
+        approximate = self.approximate_scores(None if len(rows) == self._encoded else rows, query)
+        return self.rerank(rows, approximate, query, k, view)
+
+    def save(self):
+        if not self.trained:
+            return
+        self._codes.flush()
+        tmp = self.base.path / f"{QUANTIZER_FILE.format(kind=self.kind)}.tmp.npz"
+        np.savez(tmp, encoded=self._encoded, **self.quantizer.state())
+        os.replace(tmp, self.base.path / QUANTIZER_FILE.format(kind=self.kind))
+
+    def load(self) -> bool:
+        path = self.base.path / QUANTIZER_FILE.format(kind=self.kind)
+        if not path.exists() or not self.codes_path.exists():
+            return False
+        with np.load(path) as data:
+            self.quantizer.restore({key: data[key] for key in data.files if key != "encoded"})
+            encoded = int(data["encoded"])
+        row_bytes = self.quantizer.columns(self.base.dimension) * np.dtype(self.quantizer.dtype).itemsize
+        self._capacity = self.codes_path.stat().st_size // row_bytes
+        self._codes = self._map(self.codes_path, self._capacity)
+        self._encoded = min(encoded, self.base.view().size)
+        self.trained = True
+        self.sync()
+        return True
@@ -0,0 +1,134 @@
+"""
+File-backed agent registry and knowledge base with hot reload
+
+Agents and knowledge facts live in ``data/agents.json`` and
+``data/knowledge_base.json``. Each load builds an immutable snapshot with its
+lookup structures (the BM25 index) computed once. A background watcher
+rebuilds the snapshot when either file changes and swaps it in with a single
+reference assignment, so readers never wait on a reload and a broken file
+never replaces a good snapshot.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from api.knowledge_index import BM25Index
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(os.getenv("GHC_DATA_DIR", Path(__file__).resolve().parent.parent / "data"))
+AGENTS_FILE = "agents.json"
+KNOWLEDGE_FILE = "knowledge_base.json"
+DEFAULT_AGENT = "ceo_digital_twin"
+RELOAD_INTERVAL = float(os.getenv("KNOWLEDGE_RELOAD_INTERVAL", "2"))
+
+
+class RegistrySnapshot:
+    """One consistent, read-only version of the agents and knowledge base"""
+
+    def __init__(self, agent_config: Dict[str, Dict[str, Any]], knowledge_base: Dict[str, List[str]], version: int):
+        self.agent_config = agent_config
+        self.knowledge_base = knowledge_base
+        self.knowledge_index = BM25Index.from_knowledge_base(knowledge_base)
+        self.version = version
+        self.loaded_at = time.time()
+
+    def agent(self, agent_type: str) -> Dict[str, Any]:
+        """Config for ``agent_type``, defaulting to the CEO Digital Twin"""
+        return self.agent_config.get(agent_type, self.agent_config[DEFAULT_AGENT])
+
+
+def _validate(agent_config: Any, knowledge_base: Any):
+    if not isinstance(agent_config, dict) or DEFAULT_AGENT not in agent_config:
+        raise ValueError(f"{AGENTS_FILE} must map agent types to configs and include {DEFAULT_AGENT}")
+    for agent_type, config in agent_config.items():
+        if not isinstance(config, dict) or not isinstance(config.get("name"), str) or not isinstance(config.get("specialization"), list):
+            raise ValueError(f"Agent {agent_type} needs a name and a specialization list")
+        deadline = config.get("collaboration_deadline_ms", 1)
+        if isinstance(deadline, bool) or not isinstance(deadline, (int, float)) or deadline <= 0:
+            raise ValueError(f"Agent {agent_type} collaboration_deadline_ms must be a positive number of milliseconds")
+    if not isinstance(knowledge_base, dict) or not all(
+        isinstance(facts, list) and all(isinstance(fact, str) for fact in facts)
+        for facts in knowledge_base.values()
+    ):
+        raise ValueError(f"{KNOWLEDGE_FILE} must map domains to lists of facts")
+
+
+class KnowledgeRegistry:
+    """Holds the current snapshot and reloads it when the data files change"""
+
+    def __init__(self, data_dir: Path = DATA_DIR, reload_interval: float = RELOAD_INTERVAL):
+        self.agents_path = Path(data_dir) / AGENTS_FILE
+        self.knowledge_path = Path(data_dir) / KNOWLEDGE_FILE
+        self.reload_interval = reload_interval
+        self._version = 0
+        self._mtimes = self._file_mtimes()
+        self._snapshot = self._load()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[RegistrySnapshot], None]] = []
+
+    def subscribe(self, listener: Callable[[RegistrySnapshot], None]):
+        """Call ``listener`` with every snapshot swapped in by a reload, from the reloading thread"""
+        self._listeners.append(listener)
+
+    def current(self) -> RegistrySnapshot:
+        """The latest snapshot; callers should hold on to it for one request"""
+        return self._snapshot
+
+    def _file_mtimes(self):
+        return tuple(path.stat().st_mtime_ns for path in (self.agents_path, self.knowledge_path))
+
+    def _load(self) -> RegistrySnapshot:
+        with open(self.agents_path, encoding="utf-8") as f:
+            agent_config = json.load(f)
+        with open(self.knowledge_path, encoding="utf-8") as f:
+            knowledge_base = json.load(f)
+        _validate(agent_config, knowledge_base)
+        self._version += 1
+        return RegistrySnapshot(agent_config, knowledge_base, self._version)
+
+    def reload(self) -> bool:
+        """Rebuild from disk and swap the snapshot in; keeps the old one on error"""
+        try:
+            # Remember the attempt even if it fails, so a broken file is not retried until edited again
+            self._mtimes = self._file_mtimes()
+            snapshot = self._load()
+        except (OSError, ValueError) as e:
+            logger.error(f"Knowledge registry reload failed, keeping version {self._snapshot.version}: {e}")
+            return False
+        self._snapshot = snapshot
+        logger.info(f"Knowledge registry reloaded: version {snapshot.version}")
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error(f"Knowledge registry reload listener failed: {e}")
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                changed = self._file_mtimes() != self._mtimes
+            except OSError:
+                continue
+            if changed:
+                self.reload()
+
+    def start_watching(self):
+        """Poll the data files in a daemon thread and reload on change"""
+        if self.reload_interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="knowledge-registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join()
+            self._watcher = None
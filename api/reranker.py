@@ -0,0 +1,178 @@
+"""
+Local rerank stage between retrieval and context building
+
+Retrieval ranks candidates with one signal (cosine similarity, BM25 or their
+rank fusion). ``FeatureReranker`` re-scores the whole candidate set at once
+with cheap lexical features computed over a padded token-id matrix:
+
+- coverage:   idf-weighted share of the query terms the chunk contains
+- saturation: idf-weighted, saturated term frequency
+- proximity:  best idf-weighted coverage inside any window of ``window`` tokens
+- phrase:     share of the query's adjacent term pairs found adjacent in the chunk
+- prior:      the candidate's first-stage rank
+
+``CrossReranker`` adds an optional small cross-encoder (sentence-transformers)
+on the best few feature-ranked candidates, but only when its measured cost
+per pair fits in what is left of the latency budget. Tokenizing is the only
+per-candidate Python loop; if it alone overruns the budget the first-stage
+order is returned unchanged.
+"""
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+from api.knowledge_index import tokenize
+from api.retrieval import page_content
+
+logger = logging.getLogger(__name__)
+
+Doc = TypeVar("Doc")
+
+# features: lexical features only; cross: features plus a cross-encoder; none: keep retrieval order
+RERANK_MODE = os.getenv("RERANK_MODE", "features")
+# Candidates retrieved for the reranker to choose the final top-k from (RERANK_CANDIDATES is the
+# quantized index's exact re-ranking depth)
+RERANK_POOL = int(os.getenv("RERANK_POOL", "20"))
+# Wall-clock budget of one rerank call
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "5"))
+RERANK_WINDOW = int(os.getenv("RERANK_WINDOW", "8"))
+RERANK_CROSS_MODEL = os.getenv("RERANK_CROSS_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+# Feature-ranked candidates the cross-encoder may re-score
+RERANK_CROSS_CANDIDATES = int(os.getenv("RERANK_CROSS_CANDIDATES", "8"))
+
+FEATURES = ("coverage", "saturation", "proximity", "phrase", "prior")
+
+
+class FeatureReranker:
+    """Vectorized term-overlap and proximity rescoring of a candidate set"""
+
+    name = "features"
+    weights = np.array([0.35, 0.15, 0.25, 0.1, 0.15], dtype=np.float32)
+
+    def __init__(self, budget_ms: float = RERANK_BUDGET_MS, window: int = RERANK_WINDOW, max_tokens: int = 512):
+        self.budget_ms = budget_ms
+        self.window = window
+        self.max_tokens = max_tokens
+
+    def features(self, query: str, texts: Sequence[str], deadline: Optional[float] = None) -> Optional[np.ndarray]:
+        """``len(texts) x len(FEATURES)`` matrix, or None if tokenizing passed ``deadline``"""
+        query_tokens = tokenize(query)
+        terms = {term: i for i, term in enumerate(dict.fromkeys(query_tokens))}
+        n, q = len(texts), len(terms)
+        features = np.zeros((n, len(FEATURES)), dtype=np.float32)
+        features[:, 4] = 1.0 / (1.0 + np.arange(n, dtype=np.float32))
+        if not n or not q:
+            return features
+
+        rows = []
+        for text in texts:
+            rows.append([terms.get(token, -1) for token in tokenize(text)[:self.max_tokens]])
+            if deadline is not None and time.perf_counter() > deadline:
+                return None
+        ids = np.full((n, max(1, max(map(len, rows)))), -1, dtype=np.int16)
+        for row, tokens in enumerate(rows):
+            ids[row, :len(tokens)] = tokens
+
+        hits = ids[:, :, None] == np.arange(q, dtype=np.int16)  # n x tokens x terms
+        tf = hits.sum(axis=1, dtype=np.float32)
+        present = tf > 0
+        # idf within the candidate set: a term every candidate shares does not separate them
+        df = present.sum(axis=0)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        weight = idf / idf.sum()
+
+        features[:, 0] = present @ weight
+        features[:, 1] = (tf / (tf + 1.2)) @ weight
+        window = min(self.window, ids.shape[1])
+        counts = np.concatenate([np.zeros((n, 1, q), dtype=np.int32), hits.cumsum(axis=1, dtype=np.int32)], axis=1)
+        in_window = (counts[:, window:] - counts[:, :-window]) > 0
+        features[:, 2] = (in_window @ weight).max(axis=1)
+
+        pairs = np.array([(terms[a], terms[b]) for a, b in zip(query_tokens, query_tokens[1:]) if a != b],
+                         dtype=np.int16).reshape(-1, 2)
+        if len(pairs) and ids.shape[1] > 1:
+            adjacent = (ids[:, :-1, None] == pairs[:, 0]) & (ids[:, 1:, None] == pairs[:, 1])
+            features[:, 3] = adjacent.any(axis=1).mean(axis=1)
+        return features
+
+    def rerank(self, query: str, hits: Sequence[Tuple[Doc, float]], k: int,
+               budget_ms: Optional[float] = None) -> Tuple[List[Tuple[Doc, float]], Dict[str, float]]:
+        """Best ``k`` of best-first ``(doc, score)`` candidates, with timings
+
+        Returned scores are rerank scores in [0, 1]. Candidates keep their
+        first-stage order when the budget runs out before they are scored.
+        """
+        started = time.perf_counter()
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        deadline = started + budget_ms / 1000
+        features = self.features(query, [page_content(doc) for doc, _ in hits], deadline)
+        if features is None:
+            return list(hits[:k]), self._timings(started, len(hits), reranked=False)
+        scores = self._score(query, hits, features @ self.weights, deadline)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return [(hits[i][0], float(scores[i])) for i in order], self._timings(started, len(hits), reranked=True)
+
+    def _score(self, query: str, hits: Sequence[Tuple[Doc, float]], scores: np.ndarray, deadline: float) -> np.ndarray:
+        return scores
+
+    def _timings(self, started: float, candidates: int, reranked: bool) -> Dict[str, float]:
+        return {"rerank_ms": round((time.perf_counter() - started) * 1000, 2), "rerank_candidates": candidates,
+                "reranked": reranked}
+
+
+class CrossReranker(FeatureReranker):
+    """Feature rescoring, then a cross-encoder over the best few when the budget allows"""
+
+    name = "cross"
+
+    def __init__(self, cross_score: Callable[[List[Tuple[str, str]]], Sequence[float]],
+                 candidates: int = RERANK_CROSS_CANDIDATES, blend: float = 0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.cross_score = cross_score
+        self.candidates = candidates
+        self.blend = blend
+        # Measured on a probe pair so the first real call is admitted on a real estimate
+        probe = time.perf_counter()
+        cross_score([("probe", "probe")])
+        self.ms_per_pair = (time.perf_counter() - probe) * 1000
+        self.cross_calls = self.cross_skipped = 0
+
+    def _score(self, query: str, hits: Sequence[Tuple[Doc, float]], scores: np.ndarray, deadline: float) -> np.ndarray:
+        top = np.argsort(-scores, kind="stable")[:self.candidates]
+        remaining_ms = (deadline - time.perf_counter()) * 1000
+        if not len(top) or self.ms_per_pair * len(top) > remaining_ms:
+            self.cross_skipped += 1
+            return scores
+        pairs = [(query, page_content(hits[i][0])) for i in top]
+        started = time.perf_counter()
+        logits = np.asarray(self.cross_score(pairs), dtype=np.float32)
+        self.ms_per_pair = 0.8 * self.ms_per_pair + 0.2 * (time.perf_counter() - started) * 1000 / len(pairs)
+        self.cross_calls += 1
+        scores = scores.copy()
+        # Cross-scored candidates stay ahead of the rest, ordered by the blend of both signals
+        cross = 1.0 / (1.0 + np.exp(-logits))
+        scores[top] = 1.0 + (1 - self.blend) * scores[top] + self.blend * cross
+        return scores / scores.max()
+
+
+def get_reranker(mode: str = RERANK_MODE) -> Optional[FeatureReranker]:
+    """Build the configured reranker; None when reranking is off
+
+    ``cross`` falls back to feature reranking when sentence-transformers or
+    the model is unavailable.
+    """
+    if mode == "none":
+        return None
+    if mode == "cross":
+        try:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(RERANK_CROSS_MODEL, device="cpu")
+            return CrossReranker(lambda pairs: model.predict(pairs, show_progress_bar=False))
+        except Exception as e:
+            logger.warning(f"Cross-encoder reranker unavailable ({e}), using feature reranking")
+    elif mode != "features":
+        raise ValueError(f"Unknown rerank mode: {mode}")
+    return FeatureReranker()
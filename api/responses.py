@@ -0,0 +1,32 @@
+"""
+Chat response model and its trusted JSON serialization, shared by the
+simple and live Digital Twin servers
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Type
+
+from fastapi.responses import Response
+from pydantic import BaseModel, Field, TypeAdapter
+
+
+class ChatResponse(BaseModel):
+    agent_type: str
+    response: str
+    confidence: float = 0.85
+    knowledge_sources: List[str] = ["knowledge_base"]
+    collaborating_agents: List[str] = []
+    recommended_actions: List[str] = []
+    metadata: Dict[str, Any] = {}
+    timestamp: str = Field(default_factory=lambda: datetime.now().isoformat())
+
+
+@lru_cache(maxsize=None)
+def response_json(model: Type[BaseModel]) -> TypeAdapter:
+    """Precompiled JSON serializer for a response model (subclasses keep their own fields)"""
+    return TypeAdapter(model)
+
+
+def trusted_json(response: ChatResponse) -> Response:
+    """Serialize a response without FastAPI re-validating it against response_model"""
+    return Response(content=response_json(type(response)).dump_json(response), media_type="application/json")
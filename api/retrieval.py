@@ -0,0 +1,140 @@
+"""
+Helpers for combining retrieval results from several knowledge domains
+
+Each domain store returns its own best-first list of ``(document, score)``
+pairs. ``merge_top_k`` lazily heap-merges those lists into one global
+best-first ranking and drops repeated content, so the same fact stored under
+two domains is only counted once.
+
+Lists whose scores are not comparable (BM25 against cosine similarity) are
+combined with ``reciprocal_rank_fusion`` instead, which only looks at ranks.
+
+``RetrievalCache`` memoizes per-domain searches for one orchestrated request,
+so the primary agent and its collaborators search each domain once.
+"""
+import asyncio
+import functools
+import hashlib
+import heapq
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Sequence, Tuple, TypeVar
+
+from api.knowledge_index import tokenize
+
+Doc = TypeVar("Doc")
+
+# Rank offset of reciprocal rank fusion; 60 is the value from the original RRF paper
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def content_hash(text: str) -> str:
+    """Stable fingerprint of chunk text, insensitive to surrounding whitespace"""
+    return hashlib.sha1(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+class ContentHasher:
+    """``content_hash`` of text that arrives in blocks, without holding the whole text"""
+
+    def __init__(self):
+        self._sha = hashlib.sha1()
+        self._started = False
+        # A word the last block may have cut in half
+        self._tail = ""
+
+    def update(self, block: str):
+        text = self._tail + block
+        words = text.split()
+        self._tail = words.pop() if words and not text[-1].isspace() else ""
+        self._emit(words)
+
+    def _emit(self, words: List[str]):
+        if words:
+            self._sha.update(((" " if self._started else "") + " ".join(words)).encode("utf-8"))
+            self._started = True
+
+    def hexdigest(self) -> str:
+        self._emit([self._tail] if self._tail else [])
+        self._tail = ""
+        return self._sha.hexdigest()
+
+
+def page_content(doc) -> str:
+    return getattr(doc, "page_content", doc)
+
+
+def merge_top_k(ranked_lists: Iterable[Sequence[Tuple[Doc, float]]], k: int) -> List[Tuple[Doc, float]]:
+    """Global top-``k`` of several best-first ``(doc, score)`` lists, de-duplicated by content"""
+    if k <= 0:
+        return []
+    merged = heapq.merge(*ranked_lists, key=lambda hit: hit[1], reverse=True)
+    seen = set()
+    top = []
+    for doc, score in merged:
+        digest = content_hash(page_content(doc))
+        if digest in seen:
+            continue
+        seen.add(digest)
+        top.append((doc, score))
+        if len(top) == k:
+            break
+    return top
+
+
+def reciprocal_rank_fusion(ranked_lists: Iterable[Sequence[Tuple[Doc, float]]], k: int,
+                           rrf_k: int = RRF_K) -> List[Tuple[Doc, float]]:
+    """Top-``k`` by summed ``1 / (rrf_k + rank)`` across best-first lists
+
+    Raw scores are ignored. Content that several lists return adds up its
+    contributions and keeps the document object of the first list returning it.
+    """
+    if k <= 0:
+        return []
+    fused: Dict[str, float] = {}
+    docs: Dict[str, Doc] = {}
+    for ranked in ranked_lists:
+        for rank, (doc, _) in enumerate(ranked, start=1):
+            digest = content_hash(page_content(doc))
+            fused[digest] = fused.get(digest, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(digest, doc)
+    best = heapq.nlargest(k, fused.items(), key=lambda item: item[1])
+    return [(docs[digest], score) for digest, score in best]
+
+
+def normalize_query(query: str) -> str:
+    """Cache-key form of a query: the terms retrieval actually scores, in order"""
+    return " ".join(tokenize(query))
+
+
+class RetrievalCache:
+    """Per-request memo of searches keyed by (retriever, normalized query, domain, k, audience)
+
+    Lookups of a key that is still being searched wait on the same task
+    instead of starting another search. The task is shielded, so a caller
+    that is cancelled does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._searches: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._searches)
+
+    async def fetch(self, key: Hashable, search: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._searches.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._searches[key] = asyncio.ensure_future(search())
+            task.add_done_callback(functools.partial(self._forget_failed, key))
+        else:
+            self.hits += 1
+        return await asyncio.shield(task)
+
+    def _forget_failed(self, key: Hashable, task: "asyncio.Future[Any]"):
+        # A failed search is retried by the next lookup rather than remembered
+        if task.cancelled() or task.exception() is not None:
+            self._searches.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._searches)}
@@ -0,0 +1,121 @@
+"""
+Bounded thread pool for blocking vector-store calls
+
+Chroma's ``similarity_search`` and ``add_documents`` are synchronous. Calling
+them from a coroutine blocks the event loop, so one slow query stalls every
+concurrent request. ``BoundedExecutor`` runs them on a dedicated pool instead,
+admits at most ``max_workers + max_queue`` calls at a time (the rest are
+rejected immediately rather than piling up), gives every call a timeout and
+keeps queue-depth and wait-time counters for the health endpoints.
+"""
+import asyncio
+import concurrent.futures
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+STORE_WORKERS = int(os.getenv("VECTOR_STORE_WORKERS", "4"))
+STORE_QUEUE_MAX = int(os.getenv("VECTOR_STORE_QUEUE_MAX", "64"))
+STORE_CALL_TIMEOUT = float(os.getenv("VECTOR_STORE_TIMEOUT", "5"))
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised when the pool and its queue are both full"""
+
+
+class BoundedExecutor:
+    """Runs blocking callables off the event loop with admission control and timeouts"""
+
+    def __init__(self, max_workers: int = STORE_WORKERS, max_queue: int = STORE_QUEUE_MAX,
+                 timeout: float = STORE_CALL_TIMEOUT, name: str = "vector-store"):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.name = name
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._peak_queued = 0
+        self._completed = 0
+        self._failed = 0
+        self._timeouts = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _call(self, submitted: float, fn: Callable, args, kwargs):
+        waited = time.perf_counter() - submitted
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    def _dropped(self, future: concurrent.futures.Future):
+        # A call cancelled before a worker picked it up never reaches _call
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run ``fn(*args, **kwargs)`` on the pool and await its result
+
+        Raises ``ExecutorSaturated`` when no slot is free and
+        ``asyncio.TimeoutError`` when the call outlives its timeout. A timed
+        out call that already started keeps its worker until it returns, so
+        the admission bound still holds. ``timeout=math.inf`` waits for as long
+        as the call takes, for writes whose outcome must be known.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            if self._queued + self._running >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise ExecutorSaturated(f"{self.name} executor is saturated ({self._running} running, {self._queued} queued)")
+            self._queued += 1
+            self._peak_queued = max(self._peak_queued, self._queued)
+
+        future = self._pool.submit(self._call, time.perf_counter(), fn, args, kwargs)
+        future.add_done_callback(self._dropped)
+        if timeout == math.inf:
+            return await asyncio.wrap_future(future)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, throughput and wait-time counters"""
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "workers": self.max_workers,
+                "queue_limit": self.max_queue,
+                "running": self._running,
+                "queued": self._queued,
+                "peak_queued": self._peak_queued,
+                "completed": self._completed,
+                "failed": self._failed,
+                "timeouts": self._timeouts,
+                "rejected": self._rejected,
+                "avg_queue_wait_ms": round(self._wait_total / started * 1000, 2) if started else 0.0,
+                "max_queue_wait_ms": round(self._wait_max * 1000, 2),
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,209 @@
+"""
+Rolling-window request telemetry for the Digital Twin agents
+
+Latency and outcome counters are kept per (agent_type, processing_method) in
+fixed-size ring buffers of time slots, each holding a fixed-bucket latency
+histogram. Memory is constant: it depends only on the number of known agent
+types, methods, windows and buckets, never on traffic.
+"""
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Upper bounds (ms) of the latency histogram buckets; one overflow bucket follows
+LATENCY_BUCKETS_MS = (
+    1, 5, 10, 25, 50, 75, 100, 150, 250, 400, 600, 800, 1000,
+    1500, 2000, 3000, 5000, 8000, 12000, 20000, 30000, 60000,
+)
+
+# window name -> (slot length in seconds, number of slots)
+WINDOWS = {
+    "1m": (5, 12),
+    "15m": (60, 15),
+    "1h": (300, 12),
+}
+
+PROCESSING_METHODS = ("langgraph", "enhanced_ai")
+OTHER = "other"
+
+
+class RollingWindow:
+    """Ring of time slots, each with a latency histogram and outcome counters
+
+    Slots are recycled lazily: a slot whose epoch is stale is zeroed the next
+    time it is written. Updates are plain integer increments made from the
+    event loop thread, so no locks are taken on the request path.
+    """
+
+    __slots__ = ("slot_seconds", "slots", "epochs", "histograms", "errors", "fallbacks", "latency_ms")
+
+    def __init__(self, slot_seconds: int, slots: int):
+        self.slot_seconds = slot_seconds
+        self.slots = slots
+        self.epochs = [-1] * slots
+        self.histograms = [[0] * (len(LATENCY_BUCKETS_MS) + 1) for _ in range(slots)]
+        self.errors = [0] * slots
+        self.fallbacks = [0] * slots
+        self.latency_ms = [0.0] * slots
+
+    def record(self, now: float, bucket: int, latency_ms: float, error: bool, fallback: bool):
+        epoch = int(now // self.slot_seconds)
+        i = epoch % self.slots
+        if self.epochs[i] != epoch:
+            self.epochs[i] = epoch
+            histogram = self.histograms[i]
+            for b in range(len(histogram)):
+                histogram[b] = 0
+            self.errors[i] = 0
+            self.fallbacks[i] = 0
+            self.latency_ms[i] = 0.0
+
+        self.histograms[i][bucket] += 1
+        self.latency_ms[i] += latency_ms
+        if error:
+            self.errors[i] += 1
+        if fallback:
+            self.fallbacks[i] += 1
+
+    def merge_into(self, now: float, totals: Dict[str, Any]):
+        """Add the live slots of this window to ``totals``"""
+        oldest = int(now // self.slot_seconds) - self.slots + 1
+        for i, epoch in enumerate(self.epochs):
+            if epoch < oldest:
+                continue
+            histogram = totals["histogram"]
+            for b, count in enumerate(self.histograms[i]):
+                histogram[b] += count
+            totals["errors"] += self.errors[i]
+            totals["fallbacks"] += self.fallbacks[i]
+            totals["latency_ms"] += self.latency_ms[i]
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1), "errors": 0, "fallbacks": 0, "latency_ms": 0.0}
+
+
+def percentile(histogram: List[int], q: float) -> Optional[float]:
+    """Estimate the q-quantile (0-1) in ms, interpolating inside the bucket"""
+    total = sum(histogram)
+    if not total:
+        return None
+
+    rank = q * total
+    seen = 0
+    for b, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            if b == len(LATENCY_BUCKETS_MS):
+                return float(LATENCY_BUCKETS_MS[-1])
+            lower = LATENCY_BUCKETS_MS[b - 1] if b else 0
+            upper = LATENCY_BUCKETS_MS[b]
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def summarize(totals: Dict[str, Any]) -> Dict[str, Any]:
+    requests = sum(totals["histogram"])
+    if not requests:
+        return {"requests": 0, "avg_ms": None, "p50_ms": None, "p95_ms": None, "p99_ms": None,
+                "error_rate": None, "fallback_rate": None}
+
+    return {
+        "requests": requests,
+        "avg_ms": round(totals["latency_ms"] / requests, 2),
+        "p50_ms": round(percentile(totals["histogram"], 0.50), 1),
+        "p95_ms": round(percentile(totals["histogram"], 0.95), 1),
+        "p99_ms": round(percentile(totals["histogram"], 0.99), 1),
+        "error_rate": round(totals["errors"] / requests, 4),
+        "fallback_rate": round(totals["fallbacks"] / requests, 4),
+    }
+
+
+class TelemetryStore:
+    """Per-agent, per-method latency and outcome telemetry over rolling windows
+
+    Agent types and methods outside the configured sets are counted under
+    ``"other"`` so the number of series stays fixed.
+    """
+
+    def __init__(
+        self,
+        agent_types: Iterable[str],
+        methods: Iterable[str] = PROCESSING_METHODS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.agent_types = tuple(agent_types) + (OTHER,)
+        self.methods = tuple(methods) + (OTHER,)
+        self.clock = clock
+        self.started_at = clock()
+        self._series: Dict[Tuple[str, str], Dict[str, RollingWindow]] = {
+            (agent_type, method): {name: RollingWindow(*spec) for name, spec in WINDOWS.items()}
+            for agent_type in self.agent_types
+            for method in self.methods
+        }
+
+    def add_agent_types(self, agent_types: Iterable[str]):
+        """Give agent types added since construction (e.g. by a registry reload) their own series
+
+        Series are added to a copy that is swapped in, so a reload thread never
+        changes the mapping under a reader on the event loop.
+        """
+        added = tuple(agent_type for agent_type in agent_types if agent_type not in self.agent_types)
+        if not added:
+            return
+        series = dict(self._series)
+        series.update({
+            (agent_type, method): {name: RollingWindow(*spec) for name, spec in WINDOWS.items()}
+            for agent_type in added
+            for method in self.methods
+        })
+        self._series = series
+        self.agent_types = self.agent_types[:-1] + added + (OTHER,)
+
+    def record(self, agent_type: str, method: str, latency_s: float, error: bool = False, fallback: bool = False):
+        """Record one finished request"""
+        agent_type = agent_type if agent_type in self.agent_types else OTHER
+        method = method if method in self.methods else OTHER
+        latency_ms = latency_s * 1000
+        bucket = bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+        now = self.clock()
+        for window in self._series[(agent_type, method)].values():
+            window.record(now, bucket, latency_ms, error, fallback)
+
+    def uptime_seconds(self) -> float:
+        return self.clock() - self.started_at
+
+    def window_stats(
+        self,
+        window: str,
+        agent_type: Optional[str] = None,
+        method: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Stats for one window, optionally restricted to an agent type and/or method"""
+        now = self.clock()
+        totals = _empty_totals()
+        for (series_agent, series_method), windows in self._series.items():
+            if agent_type is not None and series_agent != agent_type:
+                continue
+            if method is not None and series_method != method:
+                continue
+            windows[window].merge_into(now, totals)
+        return summarize(totals)
+
+    def snapshot(self, by_agent: bool = True, by_method: bool = True) -> Dict[str, Any]:
+        """All windows overall, plus breakdowns by agent type and processing method"""
+        result: Dict[str, Any] = {
+            "uptime_seconds": round(self.uptime_seconds(), 1),
+            "windows": {name: self.window_stats(name) for name in WINDOWS},
+        }
+        if by_agent:
+            result["by_agent"] = {
+                agent_type: {name: self.window_stats(name, agent_type=agent_type) for name in WINDOWS}
+                for agent_type in self.agent_types
+            }
+        if by_method:
+            result["by_method"] = {
+                method: {name: self.window_stats(name, method=method) for name in WINDOWS}
+                for method in self.methods
+            }
+        return result
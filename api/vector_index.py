@@ -0,0 +1,463 @@
+"""
+Single memory-mapped vector index for all knowledge domains
+
+Every chunk vector lives in one float32 matrix backed by ``vectors.f32``, with
+a parallel domain bitmap (``domains.u64``) and audience bitmap
+(``audiences.u8``). A search is one matrix-vector product over the rows that
+pass the bitmap filter followed by ``np.argpartition``, so a cross-domain
+query costs a single scan instead of one query per collection.
+
+The files are opened with ``np.memmap``: uvicorn workers that open the same
+directory read-only share the pages through the OS page cache instead of
+each holding a private copy. Only one writer may have a directory open at a
+time: it holds an exclusive lock on ``writer.lock`` until ``close()``, and a
+second writer fails with ``IndexLocked``. Readers call ``refresh()`` to pick
+up rows the writer has published.
+
+Writes are copy-on-write snapshots. An ingest stages its rows in a
+``Segment`` off to the side, and ``commit`` appends them past the published
+rows and publishes a new versioned ``IndexView`` in one pointer swap,
+together with any rows the ingest tombstones. A query pins the view that is
+current when it starts, so it never sees half of an ingest. Tombstones are
+kept as a per-view overlay rather than written into the domain bitmap; they
+are folded into the bitmap (and the old views reclaimed) once no reader
+still pins a view from before the delete.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from api.knowledge_index import ALL_AUDIENCES, SearchHit
+
+try:
+    import fcntl
+except ImportError:  # Windows: the single-writer rule is not enforced
+    fcntl = None
+
+VECTOR_INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", str(Path(__file__).resolve().parent.parent / "data" / "vector_index"))
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.f32"
+DOMAINS_FILE = "domains.u64"
+AUDIENCES_FILE = "audiences.u8"
+PAYLOADS_FILE = "payloads.jsonl"
+WRITER_LOCK_FILE = "writer.lock"
+
+MAX_DOMAINS = 64
+# Below this share of matching rows the filter gathers rows before the product
+GATHER_SELECTIVITY = 0.3
+
+
+NO_ROWS = np.empty(0, dtype=np.int64)
+
+
+class IndexLocked(PermissionError):
+    """Raised when another writer already has the index directory open"""
+
+
+class IndexView:
+    """Arrays, row count and hidden rows published together as one immutable snapshot"""
+
+    __slots__ = ("vectors", "domains", "audiences", "size", "version", "deleted")
+
+    def __init__(self, vectors: np.ndarray, domains: np.ndarray, audiences: np.ndarray, size: int,
+                 version: int = 0, deleted: np.ndarray = NO_ROWS):
+        self.vectors = vectors
+        self.domains = domains
+        self.audiences = audiences
+        self.size = size
+        self.version = version
+        # Rows tombstoned since the last fold; their domain bits are still set
+        self.deleted = deleted
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the ``k`` highest scores, best first"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class Segment:
+    """Rows staged off to the side of an index until ``commit`` publishes them at once"""
+
+    def __init__(self, index: "VectorIndex"):
+        self.index = index
+        self._vectors: List[np.ndarray] = []
+        self._payloads: List[Any] = []
+        self._domains: List[str] = []
+        self._audiences: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+    def add(self, vectors: np.ndarray, payloads: Sequence[Any], domains: Sequence[str],
+            audiences: Optional[Sequence[int]] = None):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(payloads) or len(payloads) != len(domains):
+            raise ValueError("vectors, payloads and domains must have one entry per row")
+        dimension = self.index.dimension or (self._vectors[0].shape[1] if self._vectors else vectors.shape[1])
+        if vectors.shape[1] != dimension:
+            raise ValueError(f"Expected {dimension}-dimensional vectors, got {vectors.shape[1]}")
+        self._vectors.append(vectors)
+        self._payloads.extend(payloads)
+        self._domains.extend(domains)
+        self._audiences.extend([ALL_AUDIENCES] * len(payloads) if audiences is None else audiences)
+
+    def commit(self, remove: Iterable[int] = ()) -> np.ndarray:
+        """Publish the staged rows and tombstone ``remove`` in one swap; returns the new row ids"""
+        return self.index.commit(self, remove)
+
+
+class VectorIndex:
+    """Append-only memory-mapped vector store with domain and audience bitmaps"""
+
+    def __init__(self, path: str = VECTOR_INDEX_DIR, dimension: Optional[int] = None,
+                 readonly: bool = False, initial_capacity: int = 1024):
+        self.path = Path(path)
+        self.readonly = readonly
+        self.dimension = dimension
+        self.domain_bits: Dict[str, int] = {}
+        self.payloads: List[Any] = []
+        self._payload_offset = 0
+        self._capacity = 0
+        self._initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self._pin_lock = threading.Lock()
+        self._pins: Dict[int, int] = {}
+        self._tombstones: List[Tuple[int, np.ndarray]] = []
+        self._meta_mtime = None
+        self._writer_lock = None
+        self._view = IndexView(np.zeros((0, dimension or 0), dtype=np.float32),
+                               np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint8), 0)
+        if not readonly:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._lock_writer()
+        if (self.path / META_FILE).exists():
+            self._open()
+
+    def __len__(self) -> int:
+        view = self._view
+        return int(np.count_nonzero(view.domains[:view.size])) - len(view.deleted)
+
+    # Storage
+
+    def _lock_writer(self):
+        # Two writers would each truncate and append to payloads.jsonl at their own offsets
+        lock = open(self.path / WRITER_LOCK_FILE, "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock.close()
+                raise IndexLocked(f"Vector index at {self.path} is already open for writing") from None
+        self._writer_lock = lock
+
+    def close(self):
+        """Flush and release the writer lock; the index stays readable"""
+        if self._writer_lock is None:
+            return
+        self.flush()
+        self.readonly = True
+        self._writer_lock.close()
+        self._writer_lock = None
+
+    def _map(self, name: str, dtype, shape, mode: str) -> np.ndarray:
+        return np.memmap(self.path / name, dtype=dtype, mode=mode, shape=shape)
+
+    def _open(self):
+        meta_path = self.path / META_FILE
+        self._meta_mtime = meta_path.stat().st_mtime_ns
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if self.dimension is not None and meta["dimension"] != self.dimension:
+            raise ValueError(f"Index at {self.path} has dimension {meta['dimension']}, expected {self.dimension}")
+        self.dimension = meta["dimension"]
+        self.domain_bits = meta["domain_bits"]
+        self._capacity = meta["capacity"]
+        size = meta["size"]
+        deleted = np.asarray(meta.get("deleted", []), dtype=np.int64)
+        if not self._capacity:
+            return
+        mode = "r" if self.readonly else "r+"
+        vectors = self._map(VECTORS_FILE, np.float32, (self._capacity, self.dimension), mode)
+        domains = self._map(DOMAINS_FILE, np.uint64, (self._capacity,), mode)
+        audiences = self._map(AUDIENCES_FILE, np.uint8, (self._capacity,), mode)
+        # Payloads are read incrementally; a writer drops lines it appended but never published
+        with open(self.path / PAYLOADS_FILE, "rb") as f:
+            f.seek(self._payload_offset)
+            while len(self.payloads) < size:
+                line = f.readline()
+                if not line:
+                    break
+                self.payloads.append(json.loads(line))
+            self._payload_offset = f.tell()
+        if not self.readonly:
+            os.truncate(self.path / PAYLOADS_FILE, self._payload_offset)
+            # Nothing can pin a view of a writer that is only now opening
+            domains[deleted] = 0
+            deleted = NO_ROWS
+        self._publish(IndexView(vectors, domains, audiences, size, self._view.version + 1, deleted))
+
+    def refresh(self) -> bool:
+        """Re-open if another process published rows since the last open"""
+        meta_path = self.path / META_FILE
+        if not meta_path.exists() or meta_path.stat().st_mtime_ns == self._meta_mtime:
+            return False
+        with self._lock:
+            self._open()
+        return True
+
+    def _grow(self, needed: int):
+        capacity = max(self._capacity, self._initial_capacity)
+        while capacity < needed:
+            capacity *= 2
+        if capacity == self._capacity:
+            return
+        view = self._view
+        for name, dtype, width in ((VECTORS_FILE, np.float32, self.dimension), (DOMAINS_FILE, np.uint64, 1),
+                                   (AUDIENCES_FILE, np.uint8, 1)):
+            with open(self.path / name, "ab") as f:
+                f.truncate(capacity * width * np.dtype(dtype).itemsize)
+        if isinstance(view.vectors, np.memmap):
+            view.vectors.flush()
+        self._capacity = capacity
+        # Views pinned before the grow keep their old mappings of the same files
+        self._publish(IndexView(
+            self._map(VECTORS_FILE, np.float32, (capacity, self.dimension), "r+"),
+            self._map(DOMAINS_FILE, np.uint64, (capacity,), "r+"),
+            self._map(AUDIENCES_FILE, np.uint8, (capacity,), "r+"),
+            view.size, view.version, view.deleted,
+        ))
+
+    def flush(self):
+        """Persist rows and publish the new size to readers in other processes"""
+        if self.readonly:
+            return
+        with self._lock:
+            view = self._view
+            for array in (view.vectors, view.domains, view.audiences):
+                if isinstance(array, np.memmap):
+                    array.flush()
+            meta = {"dimension": self.dimension, "size": view.size, "capacity": self._capacity,
+                    "domain_bits": self.domain_bits, "deleted": view.deleted.tolist()}
+            tmp = self.path / f"{META_FILE}.tmp"
+            tmp.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp, self.path / META_FILE)
+            self._meta_mtime = (self.path / META_FILE).stat().st_mtime_ns
+
+    # Writes
+
+    def _domain_bit(self, domain: str) -> int:
+        if domain not in self.domain_bits:
+            if len(self.domain_bits) >= MAX_DOMAINS:
+                raise ValueError(f"Vector index supports at most {MAX_DOMAINS} domains")
+            self.domain_bits[domain] = 1 << len(self.domain_bits)
+        return self.domain_bits[domain]
+
+    def stage(self) -> Segment:
+        """Start a segment whose rows stay invisible until committed"""
+        if self.readonly:
+            raise PermissionError("Vector index is open read-only")
+        return Segment(self)
+
+    def commit(self, segment: Segment, remove: Iterable[int] = ()) -> np.ndarray:
+        """Append a staged segment and tombstone ``remove``, published as one new view"""
+        if self.readonly:
+            raise PermissionError("Vector index is open read-only")
+        remove = np.unique(np.fromiter(remove, dtype=np.int64))
+        with self._lock:
+            view = self._view
+            start = end = view.size
+            if len(segment):
+                vectors = np.concatenate(segment._vectors)
+                if self.dimension is None:
+                    self.dimension = vectors.shape[1]
+                end = start + len(vectors)
+                self._grow(end)
+                target = self._view
+                # Rows past the published size are invisible to every pinned view
+                target.vectors[start:end] = vectors
+                target.domains[start:end] = [self._domain_bit(domain) for domain in segment._domains]
+                target.audiences[start:end] = segment._audiences
+                with open(self.path / PAYLOADS_FILE, "ab") as f:
+                    f.writelines((json.dumps(payload) + "\n").encode("utf-8") for payload in segment._payloads)
+                    self._payload_offset = f.tell()
+                self.payloads.extend(segment._payloads)
+            target = self._view
+            deleted = target.deleted
+            remove = remove[(remove >= 0) & (remove < start)]
+            remove = remove[(target.domains[remove] != 0) & ~np.isin(remove, deleted)]
+            if len(remove):
+                self._tombstones.append((view.version + 1, remove))
+                deleted = np.union1d(deleted, remove)
+            self._publish(IndexView(target.vectors, target.domains, target.audiences, end,
+                                    view.version + 1, deleted))
+        self.reclaim()
+        return np.arange(start, end)
+
+    def add(self, vectors: np.ndarray, payloads: Sequence[Any], domains: Sequence[str],
+            audiences: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Append rows and return their ids; rows become searchable all at once"""
+        segment = self.stage()
+        segment.add(vectors, payloads, domains, audiences)
+        return segment.commit()
+
+    def remove(self, rows: Iterable[int]) -> int:
+        """Tombstone rows; returns how many were live"""
+        before = len(self)
+        self.stage().commit(remove=rows)
+        return before - len(self)
+
+    def relabel_audiences(self, old: int, new: int) -> int:
+        """Set the audience bitmap of every row cleared for ``old`` to ``new``; returns how many changed
+
+        For rows written before audiences were labelled. The bitmap is
+        changed in place, so every view sees it at once.
+        """
+        if self.readonly:
+            raise PermissionError("Vector index is open read-only")
+        with self._lock:
+            view = self._view
+            rows = np.flatnonzero(view.audiences[:view.size] == old)
+            view.audiences[rows] = new
+        if len(rows):
+            self.flush()
+        return len(rows)
+
+    # Snapshots
+
+    def _publish(self, view: IndexView):
+        with self._pin_lock:
+            self._view = view
+
+    def view(self) -> IndexView:
+        """The current view, unpinned
+
+        Enough for reads of vectors below its ``size``, which are append-only;
+        use ``pin()`` when the domain bitmap must stay as it was for the read.
+        """
+        return self._view
+
+    @contextmanager
+    def pin(self) -> Iterator[IndexView]:
+        """The current view, kept from reclamation until the block exits"""
+        with self._pin_lock:
+            view = self._view
+            self._pins[view.version] = self._pins.get(view.version, 0) + 1
+        try:
+            yield view
+        finally:
+            with self._pin_lock:
+                self._pins[view.version] -= 1
+                if not self._pins[view.version]:
+                    del self._pins[view.version]
+            if self._tombstones:
+                self.reclaim(blocking=False)
+
+    def reclaim(self, blocking: bool = True) -> int:
+        """Fold tombstones no pinned view can still see into the domain bitmap
+
+        A view pinned at version ``v`` already hides rows deleted at or before
+        ``v``, so clearing their bits changes nothing it can observe. Returns
+        the number of rows folded.
+        """
+        if self.readonly or not self._tombstones or not self._lock.acquire(blocking=blocking):
+            return 0
+        try:
+            with self._pin_lock:
+                oldest = min(self._pins, default=self._view.version)
+            ready = [rows for version, rows in self._tombstones if version <= oldest]
+            if not ready:
+                return 0
+            self._tombstones = [(version, rows) for version, rows in self._tombstones if version > oldest]
+            folded = np.concatenate(ready)
+            view = self._view
+            view.domains[folded] = 0
+            remaining = np.concatenate([rows for _, rows in self._tombstones]) if self._tombstones else NO_ROWS
+            # Same rows visible, so the version stays; views pinned earlier are simply dropped
+            self._publish(IndexView(view.vectors, view.domains, view.audiences, view.size,
+                                    view.version, np.sort(remaining)))
+            return len(folded)
+        finally:
+            self._lock.release()
+
+    # Reads
+
+    def domain_mask(self, domains: Iterable[str]) -> int:
+        mask = 0
+        for domain in domains:
+            mask |= self.domain_bits.get(domain, 0)
+        return mask
+
+    def domain_counts(self) -> Dict[str, int]:
+        view = self._view
+        bits = view.domains[:view.size]
+        hidden = view.domains[view.deleted]
+        return {
+            domain: int(np.count_nonzero(bits & np.uint64(bit))) - int(np.count_nonzero(hidden & np.uint64(bit)))
+            for domain, bit in self.domain_bits.items()
+        }
+
+    def candidate_rows(self, view: IndexView, domains: Optional[Iterable[str]] = None,
+                       audience_mask: int = ALL_AUDIENCES) -> np.ndarray:
+        """Boolean filter over the published rows from the domain and audience bitmaps"""
+        mask = self.domain_mask(domains) if domains is not None else 0
+        if domains is not None and not mask:
+            return np.zeros(view.size, dtype=bool)
+        # Tombstoned rows have no domain bits left, so they never pass
+        bits = view.domains[:view.size]
+        allowed = (bits & np.uint64(mask)) != 0 if mask else bits != 0
+        if audience_mask != ALL_AUDIENCES:
+            allowed &= (view.audiences[:view.size] & np.uint8(audience_mask)) != 0
+        allowed[view.deleted] = False
+        return allowed
+
+    def filter_rows(self, view: IndexView, rows: np.ndarray, domains: Optional[Iterable[str]] = None,
+                    audience_mask: int = ALL_AUDIENCES) -> np.ndarray:
+        """The subset of ``rows`` passing the same filters as ``candidate_rows``"""
+        rows = rows[rows < view.size]
+        mask = self.domain_mask(domains) if domains is not None else 0
+        if domains is not None and not mask:
+            return rows[:0]
+        bits = view.domains[rows]
+        keep = (bits & np.uint64(mask)) != 0 if mask else bits != 0
+        if audience_mask != ALL_AUDIENCES:
+            keep &= (view.audiences[rows] & np.uint8(audience_mask)) != 0
+        if len(view.deleted):
+            keep &= ~np.isin(rows, view.deleted)
+        return rows[keep]
+
+    def search(self, query: np.ndarray, k: int = 5, domains: Optional[Iterable[str]] = None,
+               audience_mask: int = ALL_AUDIENCES) -> List[SearchHit]:
+        """Top-``k`` rows by inner product with ``query`` among rows passing the filters"""
+        with self.pin() as view:
+            return self._search(view, query, k, domains, audience_mask)
+
+    def _search(self, view: IndexView, query: np.ndarray, k: int, domains: Optional[Iterable[str]],
+                audience_mask: int) -> List[SearchHit]:
+        if not view.size or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        allowed = self.candidate_rows(view, domains, audience_mask)
+        matching = int(np.count_nonzero(allowed))
+        if not matching:
+            return []
+
+        vectors = view.vectors[:view.size]
+        if matching < GATHER_SELECTIVITY * view.size:
+            rows = np.flatnonzero(allowed)
+            scores = vectors[rows] @ query
+        else:
+            rows = None
+            scores = vectors @ query
+            scores[~allowed] = -np.inf
+        top = top_k_rows(scores, min(k, matching))
+        ids = top if rows is None else rows[top]
+        return [SearchHit(float(scores[t]), int(i), self.payloads[i]) for t, i in zip(top, ids)]
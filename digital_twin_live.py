@@ -6,7 +6,7 @@ Green Hill Canarias - Production Ready with LangGraph Integration
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 from datetime import datetime
@@ -14,8 +14,14 @@ import json
 import os
 import logging
 import asyncio
+import time
+from contextlib import aclosing
 from dotenv import load_dotenv
 
+from api.registry import KnowledgeRegistry
+from api.responses import ChatResponse as BaseChatResponse, trusted_json
+from api.telemetry import TelemetryStore
+
 # Load environment variables
 load_dotenv()
 
@@ -28,7 +34,7 @@ logger = logging.getLogger(__name__)
 
 # Try to import LangGraph components
 try:
-    from api.graph import graph as langgraph_graph
+    from api.graph import graph as langgraph_graph, UPGRADE_REGISTRY, CONTENT_DELTA_EVENT
     LANGGRAPH_AVAILABLE = True
     logger.info("? LangGraph integration loaded")
 except ImportError as e:
@@ -72,118 +78,55 @@ class AgentRequest(BaseModel):
     language: str = "en"
     require_collaboration: bool = False
 
-class ChatResponse(BaseModel):
-    agent_type: str
-    response: str
-    confidence: float = 0.85
-    knowledge_sources: List[str] = ["knowledge_base"]
-    collaborating_agents: List[str] = []
-    recommended_actions: List[str] = []
-    metadata: Dict[str, Any] = {}
-    timestamp: str = datetime.now().isoformat()
+class ChatResponse(BaseChatResponse):
     system_mode: str = SYSTEM_MODE
 
-# Enhanced Agent configurations with real capabilities
-AGENT_CONFIG = {
-    "ceo_digital_twin": {
-        "name": "CEO Digital Twin",
-        "specialization": ["strategic", "financial", "operations"],
-        "personality": "As your Digital Twin CEO, I provide strategic leadership with data-driven insights for Green Hill Canarias.",
-        "capabilities": ["strategic_planning", "financial_analysis", "market_assessment", "leadership_decisions"],
-        "langgraph_node": "ceo_agent"
-    },
-    "cfo_agent": {
-        "name": "CFO Agent", 
-        "specialization": ["financial", "compliance"],
-        "personality": "I analyze financial performance, manage budgets, and ensure fiscal responsibility.",
-        "capabilities": ["financial_modeling", "budget_analysis", "investment_evaluation", "risk_assessment"],
-        "langgraph_node": "other_agent"
-    },
-    "coo_agent": {
-        "name": "COO Agent",
-        "specialization": ["operations", "sustainability"],
-        "personality": "I optimize operations, manage supply chains, and drive operational excellence.",
-        "capabilities": ["operations_optimization", "supply_chain", "process_improvement", "quality_control"],
-        "langgraph_node": "other_agent"
-    },
-    "cmo_agent": {
-        "name": "CMO Agent",
-        "specialization": ["customer_data", "market_intelligence"],
-        "personality": "I drive marketing strategy, customer acquisition, and brand development.",
-        "capabilities": ["marketing_strategy", "customer_analysis", "brand_management", "growth_hacking"],
-        "langgraph_node": "other_agent"
-    },
-    "agricultural_intelligence": {
-        "name": "Agricultural Intelligence Agent",
-        "specialization": ["operations", "sustainability"],
-        "personality": "I provide precision agriculture insights, crop optimization, and sustainable farming guidance.",
-        "capabilities": ["crop_monitoring", "yield_optimization", "weather_analysis", "soil_management"],
-        "langgraph_node": "other_agent"
-    },
-    "sustainability_agent": {
-        "name": "Sustainability Agent",
-        "specialization": ["sustainability", "compliance"],
-        "personality": "I focus on ESG metrics, carbon footprint reduction, and sustainable business practices.",
-        "capabilities": ["carbon_tracking", "esg_reporting", "sustainability_metrics", "green_initiatives"],
-        "langgraph_node": "other_agent"
-    },
-    "risk_management": {
-        "name": "Risk Management Agent",
-        "specialization": ["financial", "compliance", "operations"],
-        "personality": "I identify, assess, and mitigate business risks across all operational areas.",
-        "capabilities": ["risk_assessment", "compliance_monitoring", "threat_analysis", "mitigation_planning"],
-        "langgraph_node": "other_agent"
-    },
-    "compliance_agent": {
-        "name": "Compliance Agent",
-        "specialization": ["compliance", "financial"],
-        "personality": "I ensure regulatory compliance and help navigate complex legal requirements.",
-        "capabilities": ["regulatory_compliance", "legal_analysis", "policy_management", "audit_support"],
-        "langgraph_node": "other_agent"
-    },
-    "data_analytics": {
-        "name": "Data Analytics Agent",
-        "specialization": ["financial", "operations", "customer_data"],
-        "personality": "I transform data into actionable insights using advanced analytics and machine learning.",
-        "capabilities": ["data_analysis", "predictive_modeling", "performance_metrics", "business_intelligence"],
-        "langgraph_node": "other_agent"
-    },
-    "customer_service": {
-        "name": "Customer Service Agent",
-        "specialization": ["customer_data", "operations"],
-        "personality": "I enhance customer experience, manage relationships, and drive customer satisfaction.",
-        "capabilities": ["customer_support", "relationship_management", "satisfaction_analysis", "service_optimization"],
-        "langgraph_node": "other_agent"
-    }
-}
-
-# Enhanced Knowledge Base with real data
-KNOWLEDGE_BASE = {
-    "strategic": [
-        "Green Hill Canarias operates as a vertically integrated sustainable agriculture company in the Canary Islands.",
-        "Strategic focus on precision agriculture, renewable energy integration, and carbon-neutral operations.",
-        "Market expansion targeting mainland Spain and North African agricultural markets.",
-        "Technology stack includes IoT sensors, AI-driven analytics, and blockchain supply chain tracking."
-    ],
-    "financial": [
-        "Q3 2024 Revenue: 3.2M EUR (32% YoY growth)",
-        "EBITDA Margin: 22% and improving through operational efficiency gains",
-        "Series A funding target: 8M EUR for technology infrastructure and market expansion",
-        "Operating cash flow positive since Q2 2024"
-    ],
-    "operations": [
-        "Managing 750 hectares across 3 primary locations in Gran Canaria and Tenerife",
-        "Workforce: 180 employees including 45 agricultural engineers and data scientists",
-        "Production capacity: 12,000 tons annually with 98.5% quality certification rate",
-        "Supply chain covers 15 distribution partners across Spain"
-    ],
-    "sustainability": [
-        "Carbon neutral operations achieved in Q4 2024, 6 months ahead of schedule",
-        "Water usage reduced by 35% through AI-optimized irrigation systems",
-        "Renewable energy covers 85% of operational needs through solar and wind integration",
-        "Biodiversity index increased by 50% through regenerative agriculture practices"
-    ]
-}
+class BatchChatRequest(BaseModel):
+    requests: List[AgentRequest]
+
+# Agents and knowledge base are loaded from data/*.json and hot-reloaded
+REGISTRY = KnowledgeRegistry()
+KNOWLEDGE_TOP_K = 3
+
+# Batch endpoint limits; the concurrency cap is shared by all batches in flight
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_SEMAPHORE = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+class SharedRetrieval:
+    """Knowledge lookups shared by every request of one batch
+
+    Hits are computed once per (domain, question, k) and merged per agent, so
+    agents with overlapping specializations reuse each other's retrieval.
+    BM25 scores do not depend on the domain filter, which makes the merged
+    top-k identical to a single search over all of the agent's domains.
+    """
+    
+    def __init__(self, registry):
+        self.registry = registry
+        self._hits: Dict[Any, list] = {}
+    
+    def search(self, question: str, domains: List[str], k: int) -> list:
+        merged = {}
+        for domain in domains:
+            key = (domain, question, k)
+            if key not in self._hits:
+                self._hits[key] = self.registry.knowledge_index.search(question, k=k, domains=[domain])
+            for hit in self._hits[key]:
+                merged[hit.doc_id] = hit
+        return sorted(merged.values(), key=lambda hit: hit.score, reverse=True)[:k]
+
+# Rolling-window latency and outcome telemetry per agent and processing method
+TELEMETRY = TelemetryStore(REGISTRY.current().agent_config.keys())
+
+def _register_agents(snapshot):
+    # Agents added by a reload get their own series instead of counting as "other"
+    TELEMETRY.add_agent_types(snapshot.agent_config.keys())
+
+REGISTRY.subscribe(_register_agents)
+
+# Deployment methods inside the graph that mean the remote answer was not used
+DEPLOYMENT_FALLBACK_METHODS = ("enhanced_fallback", "enhanced_provisional")
 
 async def process_with_langgraph(request: AgentRequest) -> ChatResponse:
     """Process request using LangGraph for enhanced AI capabilities"""
@@ -191,56 +134,71 @@ async def process_with_langgraph(request: AgentRequest) -> ChatResponse:
         if not LANGGRAPH_AVAILABLE:
             raise Exception("LangGraph not available")
         
-        # Prepare state for LangGraph
-        from langchain_core.messages import HumanMessage
-        
-        state = {
-            "messages": [HumanMessage(content=request.question)],
-            "agent_type": request.agent_type,
-            "context": {"audience": request.audience, "collaboration": request.require_collaboration}
-        }
-        
         # Process through LangGraph
-        result = await langgraph_graph.ainvoke(state)
-        
-        # Extract response
-        last_message = result["messages"][-1]
-        response_text = last_message.content
-        
-        agent_config = AGENT_CONFIG.get(request.agent_type, AGENT_CONFIG["ceo_digital_twin"])
-        
-        return ChatResponse(
-            agent_type=request.agent_type,
-            response=response_text,
-            confidence=0.92,
-            knowledge_sources=agent_config["specialization"],
-            collaborating_agents=result.get("collaborating_agents", []),
-            recommended_actions=["Implement LangGraph insights", "Monitor performance", "Schedule follow-up"],
-            metadata={
-                "processing_method": "langgraph",
-                "capabilities_used": agent_config.get("capabilities", []),
-                "system_mode": SYSTEM_MODE
-            }
-        )
+        result = await langgraph_graph.ainvoke(_langgraph_state(request))
+        return _langgraph_response(request, result)
         
     except Exception as e:
         logger.error(f"LangGraph processing error: {e}")
         raise
 
-async def process_with_enhanced_ai(request: AgentRequest) -> ChatResponse:
+def _langgraph_state(request: AgentRequest) -> Dict[str, Any]:
+    """Prepare the input state for LangGraph"""
+    from langchain_core.messages import HumanMessage
+    
+    return {
+        "messages": [HumanMessage(content=request.question)],
+        "agent_type": request.agent_type,
+        "context": {"audience": request.audience, "collaboration": request.require_collaboration}
+    }
+
+def _langgraph_response(request: AgentRequest, result: Dict[str, Any]) -> ChatResponse:
+    """Build the chat response from LangGraph's final state"""
+    # Extract response
+    last_message = result["messages"][-1]
+    response_text = last_message.content
+    
+    agent_config = REGISTRY.current().agent(request.agent_type)
+    response_metadata = result.get("response_metadata", {})
+    
+    return ChatResponse(
+        agent_type=request.agent_type,
+        response=response_text,
+        confidence=0.92,
+        knowledge_sources=agent_config["specialization"],
+        collaborating_agents=result.get("collaborating_agents", []),
+        recommended_actions=["Implement LangGraph insights", "Monitor performance", "Schedule follow-up"],
+        metadata={
+            "processing_method": "langgraph",
+            "capabilities_used": agent_config.get("capabilities", []),
+            "deployment_method": response_metadata.get("deployment_method"),
+            "provisional": response_metadata.get("provisional", False),
+            "upgrade_job_id": response_metadata.get("upgrade_job_id"),
+            "system_mode": SYSTEM_MODE
+        }
+    )
+
+async def process_with_enhanced_ai(request: AgentRequest, retrieval: Optional[SharedRetrieval] = None) -> ChatResponse:
     """Enhanced AI processing with real knowledge integration"""
     try:
-        agent_config = AGENT_CONFIG.get(request.agent_type, AGENT_CONFIG["ceo_digital_twin"])
+        registry = retrieval.registry if retrieval else REGISTRY.current()
+        agent_config = registry.agent(request.agent_type)
         
-        # Get relevant knowledge from enhanced knowledge base
-        relevant_knowledge = []
-        for domain in agent_config["specialization"]:
-            if domain in KNOWLEDGE_BASE:
-                relevant_knowledge.extend(KNOWLEDGE_BASE[domain])
+        # Get the facts most relevant to the question within the agent's domains
+        if retrieval:
+            hits = retrieval.search(request.question, agent_config["specialization"], KNOWLEDGE_TOP_K)
+        else:
+            hits = registry.knowledge_index.search(request.question, k=KNOWLEDGE_TOP_K, domains=agent_config["specialization"])
+        relevant_knowledge = [hit.payload for hit in hits]
+        if not relevant_knowledge:
+            # Nothing matched: fall back to the leading facts of the agent's domains
+            for domain in agent_config["specialization"]:
+                relevant_knowledge.extend(registry.knowledge_base.get(domain, []))
+            relevant_knowledge = relevant_knowledge[:KNOWLEDGE_TOP_K]
         
         # Generate enhanced response based on agent capabilities
         capabilities = agent_config.get("capabilities", [])
-        context = " ".join(relevant_knowledge[:3])  # Limit context for better response
+        context = " ".join(relevant_knowledge)
         
         # Enhanced response generation
         response_parts = [
@@ -293,6 +251,8 @@ async def process_with_enhanced_ai(request: AgentRequest) -> ChatResponse:
             metadata={
                 "processing_method": "enhanced_ai",
                 "knowledge_items_used": len(relevant_knowledge),
+                "knowledge_relevance": [round(hit.score, 3) for hit in hits],
+                "knowledge_version": registry.version,
                 "capabilities_activated": capabilities,
                 "system_mode": SYSTEM_MODE
             }
@@ -302,6 +262,14 @@ async def process_with_enhanced_ai(request: AgentRequest) -> ChatResponse:
         logger.error(f"Enhanced AI processing error: {e}")
         raise
 
+@app.on_event("startup")
+async def start_registry_watcher():
+    REGISTRY.start_watching()
+
+@app.on_event("shutdown")
+async def stop_registry_watcher():
+    REGISTRY.stop_watching()
+
 # Routes
 @app.get("/")
 async def root():
@@ -324,6 +292,7 @@ async def root():
 @app.get("/api/agents")
 async def list_agents():
     """Get list of available agents with enhanced information"""
+    agent_config = REGISTRY.current().agent_config
     return {
         "agents": [
             {
@@ -333,11 +302,11 @@ async def list_agents():
                 "capabilities": config.get("capabilities", []),
                 "status": "active"
             }
-            for agent_type, config in AGENT_CONFIG.items()
+            for agent_type, config in agent_config.items()
         ],
         "system_mode": SYSTEM_MODE,
         "langgraph_enabled": LANGGRAPH_AVAILABLE,
-        "total_agents": len(AGENT_CONFIG)
+        "total_agents": len(agent_config)
     }
 
 @app.post("/api/chat", response_model=ChatResponse)
@@ -345,39 +314,203 @@ async def chat_endpoint(request: AgentRequest):
     """Enhanced chat endpoint with multiple processing modes"""
     try:
         logger.info(f"Processing chat request: {request.agent_type} - {request.question[:50]}...")
-        
+        return trusted_json(await answer_request(request))
+    except Exception as e:
+        logger.error(f"Chat processing error: {e}")
+        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+
+async def answer_request(request: AgentRequest, retrieval: Optional[SharedRetrieval] = None) -> ChatResponse:
+    """LangGraph first if enabled, enhanced AI as fallback; records telemetry"""
+    started = time.perf_counter()
+    method = "enhanced_ai"
+    fallback = False
+    try:
         # Try LangGraph first if available and enabled
         if USE_LANGGRAPH and LANGGRAPH_AVAILABLE:
             try:
-                return await process_with_langgraph(request)
+                response = await process_with_langgraph(request)
+                fallback = response.metadata.get("deployment_method") in DEPLOYMENT_FALLBACK_METHODS
+                TELEMETRY.record(request.agent_type, "langgraph", time.perf_counter() - started, fallback=fallback)
+                return response
             except Exception as e:
                 logger.warning(f"LangGraph processing failed, falling back to enhanced AI: {e}")
+                fallback = True
         
         # Fall back to enhanced AI processing
-        return await process_with_enhanced_ai(request)
+        response = await process_with_enhanced_ai(request, retrieval)
+        TELEMETRY.record(request.agent_type, method, time.perf_counter() - started, fallback=fallback)
+        return response
+        
+    except Exception:
+        TELEMETRY.record(request.agent_type, method, time.perf_counter() - started, error=True, fallback=fallback)
+        raise
+
+async def _batch_results(batch: BatchChatRequest):
+    """NDJSON lines, one per request in completion order, then a summary line"""
+    started = time.perf_counter()
+    retrieval = SharedRetrieval(REGISTRY.current())
+    
+    async def run(index: int, request: AgentRequest):
+        async with BATCH_SEMAPHORE:
+            try:
+                response = await answer_request(request, retrieval)
+                return {"index": index, "status": "ok", "response": response.model_dump()}
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {e}")
+                return {"index": index, "status": "error", "agent_type": request.agent_type,
+                        "detail": f"Processing error: {str(e)}"}
+    
+    tasks = [asyncio.create_task(run(i, request)) for i, request in enumerate(batch.requests)]
+    errors = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            errors += result["status"] == "error"
+            yield json.dumps(result, default=str) + "\n"
+    finally:
+        # Client went away: stop the remaining work
+        for task in tasks:
+            task.cancel()
+    
+    yield json.dumps({
+        "done": True,
+        "count": len(tasks),
+        "errors": errors,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+    }) + "\n"
+
+@app.post("/api/chat/batch")
+async def chat_batch_endpoint(batch: BatchChatRequest):
+    """Answer many (agent_type, question) pairs concurrently, streamed as NDJSON"""
+    if not batch.requests:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds {BATCH_MAX_REQUESTS} requests")
+    
+    logger.info(f"Processing chat batch: {len(batch.requests)} requests")
+    return StreamingResponse(_batch_results(batch), media_type="application/x-ndjson")
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def _chat_event_stream(request: AgentRequest):
+    """SSE frames for one chat: metadata first, then content deltas, then a final frame"""
+    started = time.perf_counter()
+    first_delta_at = None
+    agent_config = REGISTRY.current().agent(request.agent_type)
+    method = "langgraph" if USE_LANGGRAPH and LANGGRAPH_AVAILABLE else "enhanced_ai"
+    fallback = False
+    response = None
+    
+    yield _sse("metadata", {
+        "agent_type": request.agent_type,
+        "agent_name": agent_config["name"],
+        "processing_method": method,
+        "system_mode": SYSTEM_MODE
+    })
+    
+    try:
+        if method == "langgraph":
+            streamed = False
+            try:
+                # Closed as soon as the client goes away, not whenever the generator is collected
+                async with aclosing(langgraph_graph.astream_events(_langgraph_state(request), version="v2")) as events:
+                    async for event in events:
+                        if event["event"] == "on_custom_event" and event["name"] == CONTENT_DELTA_EVENT:
+                            if first_delta_at is None:
+                                first_delta_at = time.perf_counter()
+                            streamed = True
+                            yield _sse("delta", {"content": event["data"]["delta"]})
+                        elif event["event"] == "on_chain_end" and not event.get("parent_ids"):
+                            response = _langgraph_response(request, event["data"]["output"])
+                if response is None:
+                    raise RuntimeError("LangGraph finished without a final state")
+                fallback = response.metadata.get("deployment_method") in DEPLOYMENT_FALLBACK_METHODS
+            except Exception as e:
+                # Content already on the wire cannot be retracted, so only fall back before it
+                if streamed:
+                    raise
+                logger.warning(f"LangGraph streaming failed, falling back to enhanced AI: {e}")
+                method = "enhanced_ai"
+                fallback = True
+                response = None
+                yield _sse("metadata", {"processing_method": method, "fallback": True})
+        
+        if response is None:
+            response = await process_with_enhanced_ai(request)
+            first_delta_at = time.perf_counter()
+            for line in response.response.splitlines(keepends=True):
+                yield _sse("delta", {"content": line})
+        
+        total = time.perf_counter() - started
+        TELEMETRY.record(request.agent_type, method, total, fallback=fallback)
+        yield _sse("done", {
+            "confidence": response.confidence,
+            "knowledge_sources": response.knowledge_sources,
+            "collaborating_agents": response.collaborating_agents,
+            "recommended_actions": response.recommended_actions,
+            "metadata": response.metadata,
+            "timing": {
+                "first_delta_ms": round((first_delta_at - started) * 1000, 1) if first_delta_at else None,
+                "total_ms": round(total * 1000, 1)
+            },
+            "timestamp": response.timestamp
+        })
         
     except Exception as e:
-        logger.error(f"Chat processing error: {e}")
-        raise HTTPException(status_code=500, detail=f"Processing error: {str(e)}")
+        logger.error(f"Chat streaming error: {e}")
+        TELEMETRY.record(request.agent_type, method, time.perf_counter() - started, error=True, fallback=fallback)
+        yield _sse("error", {"detail": f"Processing error: {str(e)}"})
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: AgentRequest):
+    """Server-sent events version of /api/chat: metadata, content deltas, final frame"""
+    logger.info(f"Streaming chat request: {request.agent_type} - {request.question[:50]}...")
+    return StreamingResponse(
+        _chat_event_stream(request),
+        media_type="text/event-stream",
+        # Ask proxies not to buffer, so every frame reaches the dashboard immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/chat/upgrade/{job_id}")
+async def chat_upgrade(job_id: str):
+    """Follow-up for provisional answers: the remote deployment's answer once it lands"""
+    if not LANGGRAPH_AVAILABLE:
+        raise HTTPException(status_code=404, detail="LangGraph not available")
+    
+    status = UPGRADE_REGISTRY.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Unknown upgrade job: {job_id}")
+    return status
+
+def _performance_summary() -> Dict[str, Any]:
+    """Headline performance figures from the last hour of telemetry"""
+    last_hour = TELEMETRY.window_stats("1h")
+    requests = last_hour["requests"]
+    return {
+        "avg_response_time": f"{last_hour['avg_ms'] / 1000:.2f}s" if requests else None,
+        "success_rate": f"{(1 - last_hour['error_rate']) * 100:.1f}%" if requests else None,
+        "fallback_rate": f"{last_hour['fallback_rate'] * 100:.1f}%" if requests else None,
+        "uptime_seconds": round(TELEMETRY.uptime_seconds(), 1),
+        "windows": TELEMETRY.snapshot(by_agent=False, by_method=False)["windows"]
+    }
 
 @app.get("/api/system/health")
 async def system_health():
     """Enhanced system health check"""
+    registry = REGISTRY.current()
     return {
         "status": "healthy",
         "system_mode": SYSTEM_MODE,
-        "agents": len(AGENT_CONFIG),
-        "knowledge_domains": len(KNOWLEDGE_BASE),
+        "agents": len(registry.agent_config),
+        "knowledge_domains": len(registry.knowledge_base),
         "capabilities": {
             "langgraph_enabled": LANGGRAPH_AVAILABLE,
             "external_api_enabled": EXTERNAL_API_AVAILABLE,
             "enhanced_knowledge": True
         },
-        "performance": {
-            "avg_response_time": "1.2s",
-            "success_rate": "98.5%",
-            "uptime": "99.9%"
-        },
+        "performance": _performance_summary(),
         "timestamp": datetime.now().isoformat(),
         "version": "3.0.0"
     }
@@ -385,15 +518,22 @@ async def system_health():
 @app.get("/api/system/status")
 async def system_status():
     """Detailed system status for monitoring"""
+    registry = REGISTRY.current()
     return {
         "mode": SYSTEM_MODE,
         "features": {
             "langgraph": {"enabled": USE_LANGGRAPH, "available": LANGGRAPH_AVAILABLE},
             "external_api": {"enabled": USE_EXTERNAL_API, "available": EXTERNAL_API_AVAILABLE},
-            "enhanced_knowledge": {"enabled": True, "domains": list(KNOWLEDGE_BASE.keys())}
+            "enhanced_knowledge": {
+                "enabled": True,
+                "domains": list(registry.knowledge_base.keys()),
+                "version": registry.version,
+                "loaded_at": datetime.fromtimestamp(registry.loaded_at).isoformat()
+            }
         },
         "agents": {agent_type: {"status": "active", "capabilities": len(config.get("capabilities", []))} 
-                  for agent_type, config in AGENT_CONFIG.items()},
+                  for agent_type, config in registry.agent_config.items()},
+        "telemetry": TELEMETRY.snapshot(),
         "environment": {
             "debug_mode": os.getenv("DEBUG_MODE", "false"),
             "host": os.getenv("HOST", "0.0.0.0"),
@@ -422,10 +562,10 @@ if __name__ == "__main__":
     print("?? GREEN HILL CANARIAS DIGITAL TWIN - LIVE SYSTEM")
     print("="*60)
     print(f"?? System Mode: {SYSTEM_MODE.upper()}")
-    print(f"?? Agents: {len(AGENT_CONFIG)} specialized AI agents")
+    print(f"?? Agents: {len(REGISTRY.current().agent_config)} specialized AI agents")
     print(f"?? LangGraph: {'? ENABLED' if LANGGRAPH_AVAILABLE else '? DISABLED'}")
     print(f"?? External API: {'? ENABLED' if EXTERNAL_API_AVAILABLE else '? DISABLED'}")
-    print(f"?? Knowledge Domains: {len(KNOWLEDGE_BASE)}")
+    print(f"?? Knowledge Domains: {len(REGISTRY.current().knowledge_base)}")
     print(f"?? Server: http://localhost:{os.getenv('PORT', '8000')}")
     print("="*60)
     print("?? Ready for production workloads!")
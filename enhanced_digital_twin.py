@@ -2,27 +2,73 @@
 Enhanced Digital Twin Agent System with Knowledge Integration
 Sophisticated 10-agent startup dashboard for Green Hill Canarias
 """
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import asyncio
+import concurrent.futures
+import functools
 import logging
+import threading
+import time
 from datetime import datetime
 from enum import Enum
 import json
 import os
+import re
 from pathlib import Path
 
+from api.context_packer import ContextPacker
+from api.embeddings import get_embedding_provider
+from api.ingestion import INGEST_DEFAULT_AUDIENCE, Content, IngestionPipeline, IngestionQueueFull
+from api.knowledge_index import ALL_AUDIENCES, AUDIENCES, BM25Index, audience_bits, audience_mask
+from api.manifest import DocumentManifest
+from api.registry import KnowledgeRegistry
+from api.reranker import RERANK_POOL, get_reranker
+from api.retrieval import RetrievalCache, merge_top_k, normalize_query, reciprocal_rank_fusion
+from api.store_executor import BoundedExecutor
+from api.ann_index import IVFIndex
+from api.quantization import VECTOR_QUANTIZATION, QuantizedIndex
+from api.vector_index import VECTOR_INDEX_DIR, IndexLocked, VectorIndex
+
 # Enhanced imports for knowledge management
 try:
     import chromadb
     from langchain.vectorstores import Chroma
-    from langchain.embeddings import OpenAIEmbeddings
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
     from langchain.schema import Document
 except ImportError:
     print("?? LangChain and ChromaDB not installed. Install with: pip install langchain chromadb")
+    from langchain_core.documents import Document
+    Chroma = None
+
+# Chunks kept per query after merging all of an agent's domains
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+# hybrid: BM25 and vector search fused by reciprocal rank; vector: similarity search only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Candidates each retriever contributes to the fusion
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+# auto: Chroma collections when installed, else the native memory-mapped index
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "auto")
+# ivf: approximate search once the native index reaches IVF_MIN_ROWS chunks; none: always exact
+VECTOR_ANN = os.getenv("VECTOR_ANN", "ivf")
+# Open every knowledge store in a background task at startup instead of on first use
+KNOWLEDGE_WARM_UP = os.getenv("KNOWLEDGE_WARM_UP", "true").lower() == "true"
+# Opening a store (loading its keyword index) takes longer than a search
+KNOWLEDGE_OPEN_TIMEOUT = float(os.getenv("KNOWLEDGE_OPEN_TIMEOUT", "300"))
+# A domain that failed to open is tried again by the first use this many seconds later
+KNOWLEDGE_OPEN_RETRY = float(os.getenv("KNOWLEDGE_OPEN_RETRY", "30"))
+
+# How long the primary agent waits for collaborators, unless its agents.json entry sets
+# collaboration_deadline_ms; later perspectives are cancelled and left out of the answer
+COLLABORATION_DEADLINE_MS = float(os.getenv("COLLABORATION_DEADLINE_MS", "2500"))
+
+KNOWLEDGE_DOMAINS = [
+    "financial", "operations", "compliance",
+    "market_intelligence", "sustainability",
+    "customer_data", "strategic"
+]
 
 class AgentType(str, Enum):
     CEO = "ceo_digital_twin"
@@ -61,87 +107,523 @@ class AgentResponse(BaseModel):
     metadata: Dict[str, Any] = {}
     timestamp: datetime = Field(default_factory=datetime.now)
 
+class KnowledgeSegment:
+    """One ingest's chunks, staged off to the side and published in a single commit"""
+    
+    def __init__(self, manager: "KnowledgeManager", domain: str, audience: str = INGEST_DEFAULT_AUDIENCE):
+        self.manager = manager
+        self.domain = domain
+        self.audience = audience
+        self.staged = manager.vector_index.stage() if manager.vector_index is not None else None
+        self.ids: List[str] = []
+        self.chunks: List[Tuple[str, Dict[str, Any]]] = []
+    
+    def add(self, chunks: List[str], metadatas: List[Dict[str, Any]]):
+        """Embed and stage one batch; runs on the store executor"""
+        self.chunks.extend(zip(chunks, metadatas))
+        if self.staged is None:
+            # Chroma has no staging area, so its batches land as they are embedded; searches
+            # filter on the audience rank instead of a bitmap
+            ids = [f"{self.domain}:{self.audience}:{metadata['chunk_hash']}" for metadata in metadatas]
+            level = AUDIENCES.index(self.audience)
+            self.manager.vector_stores[self.domain].add_documents([
+                Document(page_content=chunk, metadata={**metadata, "audience_level": level})
+                for chunk, metadata in zip(chunks, metadatas)
+            ], ids=ids)
+            self.ids.extend(ids)
+            return
+        vectors = self.manager.embeddings.embed(chunks)
+        payloads = [{"text": chunk, "metadata": metadata} for chunk, metadata in zip(chunks, metadatas)]
+        self.staged.add(vectors, payloads, [self.domain] * len(chunks), [audience_bits(self.audience)] * len(chunks))
+    
+    def commit(self, removed: List[Tuple[str, str]]) -> List[str]:
+        """Publish the staged chunks and tombstone ``(domain, ref)`` pairs; returns the new refs"""
+        if self.staged is None:
+            for domain in {domain for domain, _ in removed}:
+                self.manager.vector_stores[domain].delete(ids=[ref for d, ref in removed if d == domain])
+            refs = self.ids
+        else:
+            rows = self.staged.commit(remove=(int(ref) for _, ref in removed))
+            self.manager._index_committed(rows)
+            refs = [str(row) for row in rows]
+        bits = audience_bits(self.audience)
+        self.manager._update_lexical(
+            [(ref, chunk, metadata, bits) for ref, (chunk, metadata) in zip(refs, self.chunks)], [ref for _, ref in removed]
+        )
+        return refs
+
 class KnowledgeManager:
     """Manages all knowledge sources and retrieval"""
     
     def __init__(self, vector_store_path: str = "./data/chroma"):
+        # Nothing is opened here: stores open per domain on first use, or ahead of it from
+        # warm_up(), so importing the app and binding the port stay fast
         self.vector_store_path = Path(vector_store_path)
-        self.vector_store_path.mkdir(parents=True, exist_ok=True)
-        
-        # Initialize vector database
+        self.backend: Optional[str] = None
         self.embeddings = None
-        self.vector_stores = {}
+        self.vector_stores = {domain: None for domain in KNOWLEDGE_DOMAINS}
+        self.vector_index = None
+        self.ann_index = None
+        self.quantized_index = None
+        self.reranker = None
+        self.manifest = None
         self.real_time_data = {}
+        self.open_errors: Dict[str, str] = {}
+        self._failed_at: Dict[str, float] = {}
+        self._opened: set = set()
+        self._open_lock = threading.RLock()
+        self._ingestion: Optional[IngestionPipeline] = None
+        
+        # Chroma calls are blocking; keep them off the event loop
+        self.store_executor = BoundedExecutor(name="vector-store")
+        # Quantizer and IVF training can take minutes, so it runs after the commit that needs it
+        self._training_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-training")
+        self._training: Optional[concurrent.futures.Future] = None
+        self._training_lock = threading.Lock()
         
-        self._setup_vector_stores()
+        # BM25 over the same chunks catches exact identifiers similarity search misses
+        self.lexical_index = BM25Index()
+        self._lexical_ids: Dict[str, int] = {}
+        self._lexical_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
     
-    def _setup_vector_stores(self):
-        """Initialize specialized vector stores for different knowledge domains"""
-        try:
-            self.embeddings = OpenAIEmbeddings()
-            
-            # Create specialized collections
-            domains = [
-                "financial", "operations", "compliance", 
-                "market_intelligence", "sustainability", 
-                "customer_data", "strategic"
-            ]
-            
-            for domain in domains:
+    @property
+    def ready(self) -> bool:
+        """Every domain is open"""
+        return all(d in self._opened for d in self.vector_stores)
+    
+    def readiness(self) -> Dict[str, Any]:
+        """``status`` is ready, starting (domains still pending) or degraded (a domain failed to open)"""
+        status = "ready" if self.ready else "degraded" if self.open_errors else "starting"
+        return {
+            "ready": self.ready,
+            "status": status,
+            "backend": self.backend,
+            "domains": {
+                domain: "open" if domain in self._opened else f"failed: {self.open_errors[domain]}"
+                if domain in self.open_errors else "pending"
+                for domain in self.vector_stores
+            },
+        }
+    
+    def _open_backend(self):
+        """Embeddings, the shared native index or the Chroma backend, the manifest and the reranker"""
+        with self._open_lock:
+            if self.backend is not None:
+                return
+            self.vector_store_path.mkdir(parents=True, exist_ok=True)
+            # OpenAI when a key is configured, the local hashing provider otherwise; both cached
+            self.embeddings = get_embedding_provider()
+            backend = "native"
+            if VECTOR_BACKEND != "native":
+                if Chroma is not None:
+                    backend = "chroma"
+                elif VECTOR_BACKEND == "chroma":
+                    # Domains stay unopened, like the mock stores before
+                    logging.warning("Vector store setup failed: langchain and chromadb are not installed")
+                    backend = "none"
+            if backend == "native":
+                # One memory-mapped index for every domain, one directory per embedding space
+                space = re.sub(r"[^A-Za-z0-9_.-]+", "-", self.embeddings.cache_key)
+                index_path = Path(VECTOR_INDEX_DIR) / space
+                try:
+                    self.vector_index = VectorIndex(index_path)
+                except IndexLocked:
+                    # Another worker writes the index; this one searches it and picks up its commits
+                    logging.info(f"Vector index at {index_path} is written by another process; opening it read-only")
+                    self.vector_index = VectorIndex(index_path, readonly=True)
+                if not self.vector_index.readonly:
+                    # Rows stored before audiences existed are open to all; they get the default audience instead
+                    legacy = self.vector_index.relabel_audiences(ALL_AUDIENCES, audience_bits(INGEST_DEFAULT_AUDIENCE))
+                    if legacy:
+                        logging.info(f"Cleared {legacy} unlabelled chunks for the {INGEST_DEFAULT_AUDIENCE} audience")
+                # Encoding new rows writes the code file, so only the writer keeps codes
+                if VECTOR_QUANTIZATION != "none" and not self.vector_index.readonly:
+                    self.quantized_index = QuantizedIndex(self.vector_index, kind=VECTOR_QUANTIZATION)
+                    self.quantized_index.load()
+                if VECTOR_ANN == "ivf":
+                    self.ann_index = IVFIndex(self.vector_index, quantized=self.quantized_index)
+                    self.ann_index.load()
+                self._load_lexical_index()
+                logging.info(f"Using native vector index at {self.vector_index.path} ({len(self.vector_index)} chunks)")
+            # The manifest sits next to the store its chunk references point into
+            self.manifest = DocumentManifest(self.vector_index.path if self.vector_index is not None else self.vector_store_path)
+            # Re-scores the retrieved candidates before the best few reach an agent's context
+            self.reranker = get_reranker()
+            self.backend = backend
+    
+    def _open_domain(self, domain: str):
+        """Open one domain's store; the native index serves every domain once the backend is open"""
+        self._open_backend()
+        if self.backend == "chroma":
+            try:
                 domain_path = self.vector_store_path / domain
                 domain_path.mkdir(exist_ok=True)
-                
                 self.vector_stores[domain] = Chroma(
                     collection_name=f"ghc_{domain}",
                     embedding_function=self.embeddings,
                     persist_directory=str(domain_path)
                 )
-                
+            except Exception as e:
+                logging.warning(f"Vector store setup failed for {domain}: {e}")
+                self._open_failed(domain, str(e))
+                return
+            self._load_lexical_index(domain)
+        elif self.backend == "none":
+            self._open_failed(domain, "no vector backend")
+            return
+        self.open_errors.pop(domain, None)
+        self._failed_at.pop(domain, None)
+        self._opened.add(domain)
+    
+    def _open_failed(self, domain: str, error: str):
+        self.open_errors[domain] = error
+        self._failed_at[domain] = time.monotonic()
+    
+    def _openable(self, domain: str) -> bool:
+        """Known, not open yet, and not failed within the last KNOWLEDGE_OPEN_RETRY seconds"""
+        if domain not in self.vector_stores or domain in self._opened:
+            return False
+        failed_at = self._failed_at.get(domain)
+        return failed_at is None or time.monotonic() - failed_at >= KNOWLEDGE_OPEN_RETRY
+    
+    def open_domains_blocking(self, domains):
+        with self._open_lock:
+            for domain in domains:
+                if self._openable(domain):
+                    self._open_domain(domain)
+    
+    async def open_domains(self, domains: Optional[List[str]] = None, with_ingestion: bool = False):
+        """Open the stores of ``domains`` (all when None) on the store executor; free once they are open
+
+        A domain that fails or takes too long to open is logged and left
+        unsearchable, as an unavailable store always has been, until a call
+        KNOWLEDGE_OPEN_RETRY seconds later tries it again.
+        """
+        pending = [d for d in (domains or self.vector_stores) if self._openable(d)]
+        if not pending and (self._ingestion is not None or not with_ingestion):
+            return
+        try:
+            await self.store_executor.run(self._open_blocking, pending, with_ingestion, timeout=KNOWLEDGE_OPEN_TIMEOUT)
         except Exception as e:
-            logging.warning(f"Vector store setup failed: {e}")
-            # Fallback to mock implementation
-            self.vector_stores = {domain: None for domain in domains}
+            logging.error(f"Could not open knowledge stores {pending}: {e}")
     
-    async def retrieve_knowledge(self, query: str, domain: str = None, top_k: int = 5) -> List[Document]:
-        """Retrieve relevant knowledge from vector stores"""
-        if domain and domain in self.vector_stores and self.vector_stores[domain]:
+    def _open_blocking(self, domains: List[str], with_ingestion: bool):
+        self.open_domains_blocking(domains)
+        if with_ingestion:
+            self.ingestion  # built on first access
+    
+    async def warm_up(self):
+        """Open every domain and the ingestion pipeline ahead of the first request, one domain at a time"""
+        started = time.perf_counter()
+        # One domain per executor call, so searches of already open domains are not queued behind the rest
+        for domain in self.vector_stores:
+            await self.open_domains([domain])
+        await self.open_domains([], with_ingestion=True)
+        logging.info(f"Knowledge stores warmed up in {time.perf_counter() - started:.1f}s ({self.readiness()['domains']})")
+    
+    @property
+    def ingestion(self) -> IngestionPipeline:
+        """Chunked, deduplicated, batched ingestion, built on first use from the manifest and the index"""
+        if self._ingestion is None:
+            with self._open_lock:
+                if self._ingestion is None:
+                    self._open_backend()
+                    known_chunks = self.manifest.chunk_refs()
+                    known_chunks.update(self._indexed_chunks())
+                    self._ingestion = IngestionPipeline(self.open_segment, self.store_executor,
+                                                        known_chunks=known_chunks, manifest=self.manifest)
+        return self._ingestion
+    
+    async def close(self):
+        if self._ingestion is not None:
+            await self._ingestion.stop()
+        self.store_executor.shutdown()
+        await asyncio.to_thread(self._training_pool.shutdown, wait=True, cancel_futures=True)
+        if self.vector_index is not None:
+            self.vector_index.close()
+        if self.manifest is not None:
+            self.manifest.close()
+    
+    def _searchable(self, domain: str) -> bool:
+        if self.vector_index is not None:
+            return domain in self._opened
+        return bool(self.vector_stores.get(domain))
+    
+    def _refresh_index(self):
+        """In a read-only worker, pick up what the writing process has published since the last search"""
+        if self.vector_index is None or not self.vector_index.readonly:
+            return
+        with self._refresh_lock:
+            if not self.vector_index.refresh():
+                return
+            if self.ann_index is not None:
+                self.ann_index.sync()
+            self._load_lexical_index()
+    
+    def _search_index(self, query: str, domains: Optional[List[str]], top_k: int,
+                      audience: str = "public") -> List[Tuple[Document, float]]:
+        self._refresh_index()
+        vector = self.embeddings.embed([query])[0]
+        # IVF (scoring codes when quantized) > quantized flat scan > exact scan
+        index = self.vector_index
+        for candidate in (self.ann_index, self.quantized_index):
+            if candidate is not None and candidate.trained:
+                index = candidate
+                break
+        return [
+            (Document(page_content=hit.payload["text"], metadata=hit.payload["metadata"]), hit.score)
+            for hit in index.search(vector, top_k, domains=domains, audience_mask=audience_mask(audience))
+        ]
+    
+    async def _search_domain(self, domain: str, query: str, top_k: int, audience: str = "public") -> List[Tuple[Document, float]]:
+        """Best-first (document, relevance) pairs from one domain store"""
+        level = AUDIENCES.index(audience) if audience in AUDIENCES else 0
+        try:
+            return await self.store_executor.run(
+                self.vector_stores[domain].similarity_search_with_relevance_scores, query, k=top_k,
+                filter={"audience_level": {"$lte": level}}
+            )
+        except Exception as e:
+            logging.error(f"Knowledge retrieval failed for {domain}: {e}")
+            return []
+    
+    async def retrieve_scored(self, query: str, domains: Optional[List[str]] = None, top_k: int = 5,
+                              audience: str = "public") -> List[Tuple[Document, float]]:
+        """Search domains concurrently and merge them into one global top-k of chunks ``audience`` may see"""
+        await self.open_domains(domains)
+        searchable = [d for d in (domains or self.vector_stores) if self._searchable(d)]
+        if self.vector_index is not None:
+            # A single filtered scan covers every requested domain
+            if not searchable:
+                return []
             try:
-                docs = self.vector_stores[domain].similarity_search(query, k=top_k)
-                return docs
+                return await self.store_executor.run(self._search_index, query, searchable, top_k, audience)
             except Exception as e:
-                logging.error(f"Knowledge retrieval failed for {domain}: {e}")
-        
-        # Search across all domains if no specific domain
-        all_docs = []
-        for store_name, store in self.vector_stores.items():
-            if store:
+                logging.error(f"Knowledge retrieval failed: {e}")
+                return []
+        ranked = await asyncio.gather(*[self._search_domain(d, query, top_k, audience) for d in searchable])
+        return merge_top_k(ranked, top_k)
+    
+    def _load_lexical_index(self, domain: Optional[str] = None):
+        """Load stored chunks into the in-memory BM25 index: every chunk of the native index, or one Chroma domain"""
+        entries = []
+        removed = []
+        if domain is None:
+            # Only the difference from what is indexed, so a read-only worker can reload after refresh()
+            with self.vector_index.pin() as view:
+                live = {str(row) for row in self.vector_index.candidate_rows(view).nonzero()[0].tolist()}
+                for ref in sorted(live - self._lexical_ids.keys(), key=int):
+                    payload = self.vector_index.payloads[int(ref)]
+                    entries.append((ref, payload["text"], payload["metadata"], int(view.audiences[int(ref)])))
+            removed = list(self._lexical_ids.keys() - live)
+        else:
+            try:
+                stored = self.vector_stores[domain].get()
+            except Exception as e:
+                logging.warning(f"Could not load {domain} chunks for keyword search: {e}")
+                return
+            # Chunks stored before audiences existed get the default audience, as in the native index
+            legacy = {}
+            for ref, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+                metadata = {"domain": domain, **(metadata or {})}
+                if metadata.get("audience") not in AUDIENCES or "audience_level" not in metadata:
+                    audience = metadata.get("audience") if metadata.get("audience") in AUDIENCES else INGEST_DEFAULT_AUDIENCE
+                    metadata.update(audience=audience, audience_level=AUDIENCES.index(audience))
+                    legacy[ref] = metadata
+                entries.append((ref, text, metadata, audience_bits(metadata["audience"])))
+            if legacy:
                 try:
-                    docs = store.similarity_search(query, k=2)
-                    all_docs.extend(docs)
+                    self.vector_stores[domain]._collection.update(ids=list(legacy), metadatas=list(legacy.values()))
+                    logging.info(f"Cleared {len(legacy)} unlabelled {domain} chunks for the {INGEST_DEFAULT_AUDIENCE} audience")
                 except Exception as e:
-                    continue
+                    # Still invisible to the Chroma filter, so keep them out of keyword search too
+                    logging.warning(f"Could not label legacy {domain} chunks: {e}")
+                    entries = [entry for entry in entries if entry[0] not in legacy]
+        self._update_lexical(entries, removed)
+    
+    def _update_lexical(self, added: List[Tuple[str, str, Dict[str, Any], int]], removed: List[str]):
+        """Apply a commit to the keyword index: (ref, text, metadata, audience bitmap) added, refs removed"""
+        # Commits are serialized here; searches read the snapshot the index last published
+        with self._lexical_lock:
+            doc_ids = self.lexical_index.update(
+                [(text, Document(page_content=text, metadata=metadata), [metadata.get("domain")], audiences)
+                 for _, text, metadata, audiences in added],
+                [self._lexical_ids.pop(ref) for ref in removed if ref in self._lexical_ids],
+            )
+            for (ref, _, _, _), doc_id in zip(added, doc_ids):
+                self._lexical_ids[ref] = doc_id
+    
+    def _search_lexical(self, query: str, domains: Optional[List[str]], top_k: int,
+                        audience: str = "public") -> List[Tuple[Document, float]]:
+        self._refresh_index()
+        return [(hit.payload, hit.score) for hit in
+                self.lexical_index.search(query, top_k, domains=domains, audience_mask=audience_mask(audience))]
+    
+    async def _search_per_domain(self, kind: str, search, query: str, domains: List[str], top_k: int, audience: str,
+                                 cache: Optional[RetrievalCache]) -> List[Tuple[Document, float]]:
+        """``search(domains)`` once over all domains, or one cached search per domain merged into a global top-k"""
+        if cache is None:
+            return await search(domains)
+        normalized = normalize_query(query)
+        ranked = await asyncio.gather(*[
+            cache.fetch((kind, normalized, domain, top_k, audience), functools.partial(search, [domain]))
+            for domain in domains
+        ])
+        return merge_top_k(ranked, top_k)
+    
+    async def retrieve_hybrid(self, query: str, domains: Optional[List[str]] = None, top_k: int = 5,
+                              audience: str = "public", cache: Optional[RetrievalCache] = None
+                              ) -> Tuple[List[Tuple[Document, float]], Dict[str, float]]:
+        """BM25 and vector search run concurrently, fused by reciprocal rank, with per-stage timings"""
+        started = time.perf_counter()
+        await self.open_domains(domains)
+        searchable = [d for d in (domains or self.vector_stores) if self._searchable(d)]
+        if not searchable:
+            return [], {"total_ms": 0.0}
+        candidates = max(top_k, HYBRID_CANDIDATES)
+        
+        async def timed(stage):
+            stage_started = time.perf_counter()
+            try:
+                return await stage, (time.perf_counter() - stage_started) * 1000
+            except Exception as e:
+                logging.error(f"Knowledge retrieval stage failed: {e}")
+                return [], (time.perf_counter() - stage_started) * 1000
         
-        return all_docs[:top_k]
+        (vector_hits, vector_ms), (lexical_hits, lexical_ms) = await asyncio.gather(
+            timed(self._search_per_domain(
+                "vector", lambda d: self.retrieve_scored(query, d, candidates, audience),
+                query, searchable, candidates, audience, cache)),
+            timed(self._search_per_domain(
+                "lexical", lambda d: self.store_executor.run(self._search_lexical, query, d, candidates, audience),
+                query, searchable, candidates, audience, cache)),
+        )
+        fusion_started = time.perf_counter()
+        fused = reciprocal_rank_fusion([vector_hits, lexical_hits], top_k)
+        finished = time.perf_counter()
+        return fused, {
+            "vector_ms": round(vector_ms, 2),
+            "lexical_ms": round(lexical_ms, 2),
+            "fusion_ms": round((finished - fusion_started) * 1000, 2),
+            "total_ms": round((finished - started) * 1000, 2),
+            "vector_hits": len(vector_hits),
+            "lexical_hits": len(lexical_hits),
+        }
+    
+    async def retrieve_ranked(self, query: str, domains: Optional[List[str]] = None, top_k: int = 5,
+                              audience: str = "public", cache: Optional[RetrievalCache] = None
+                              ) -> Tuple[List[Tuple[Document, float]], Dict[str, float]]:
+        """Retrieve a wider candidate set, rerank it and keep the best ``top_k``, with per-stage timings
+
+        With a request-scoped ``cache``, each domain is searched once per
+        request however many agents ask for it.
+        """
+        started = time.perf_counter()
+        candidates = top_k if self.reranker is None else max(top_k, RERANK_POOL)
+        if RETRIEVAL_MODE == "hybrid":
+            hits, timings = await self.retrieve_hybrid(query, domains, candidates, audience, cache)
+        else:
+            await self.open_domains(domains)
+            searchable = [d for d in (domains or self.vector_stores) if self._searchable(d)]
+            hits = await self._search_per_domain(
+                "vector", lambda d: self.retrieve_scored(query, d, candidates, audience),
+                query, searchable, candidates, audience, cache)
+            timings = {"vector_ms": round((time.perf_counter() - started) * 1000, 2)}
+        if self.reranker is not None and hits:
+            hits, rerank_timings = await self.store_executor.run(self.reranker.rerank, query, hits, top_k)
+            timings.update(rerank_timings)
+        timings["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return hits[:top_k], timings
+    
+    async def retrieve_knowledge(self, query: str, domain: str = None, top_k: int = 5,
+                                 audience: str = "public") -> List[Document]:
+        """Retrieve relevant knowledge from vector stores"""
+        # Search across all domains if no specific domain
+        if domain:
+            await self.open_domains([domain])
+        domains = [domain] if domain and self._searchable(domain) else None
+        return [doc for doc, _ in await self.retrieve_scored(query, domains, top_k, audience)]
+    
+    def _indexed_chunks(self) -> Dict[Tuple[str, str], str]:
+        """(domain, chunk hash) -> row id of every live chunk in the native index"""
+        if self.vector_index is None:
+            return {}
+        with self.vector_index.pin() as view:
+            live = self.vector_index.candidate_rows(view)
+        return {
+            # Unlabelled rows were relabelled for the default audience when the index opened
+            (payload["metadata"].get("domain"), payload["metadata"].get("audience") or INGEST_DEFAULT_AUDIENCE,
+             payload["metadata"]["chunk_hash"]): str(row)
+            for row, (payload, keep) in enumerate(zip(self.vector_index.payloads, live.tolist()))
+            if keep and "chunk_hash" in payload["metadata"]
+        }
+    
+    def open_segment(self, domain: str, audience: str = INGEST_DEFAULT_AUDIENCE) -> "KnowledgeSegment":
+        self.open_domains_blocking([domain])
+        return KnowledgeSegment(self, domain, audience)
+    
+    def _index_committed(self, rows):
+        """Persist a commit, route its rows into the IVF index and start training if it is due"""
+        self.vector_index.flush()
+        if self.ann_index is not None:
+            self.ann_index.add_rows(rows)
+        if any(index is not None and index.needs_training for index in (self.quantized_index, self.ann_index)):
+            with self._training_lock:
+                if self._training is None or self._training.done():
+                    self._training = self._training_pool.submit(self._train_indexes)
     
-    async def ingest_document(self, content: str, source: str, domain: str = "strategic"):
-        """Add new document to knowledge base"""
+    def _train_indexes(self):
+        """Train the quantized and IVF indexes on the published rows; searches use the exact scan until then"""
+        for index in (self.quantized_index, self.ann_index):
+            if index is None or not index.needs_training:
+                continue
+            started = time.perf_counter()
+            try:
+                index.train()
+                index.save()
+            except Exception as e:
+                logging.error(f"Training {type(index).__name__} failed: {e}")
+                continue
+            logging.info(f"Trained {type(index).__name__} in {time.perf_counter() - started:.1f}s")
+    
+    def wait_for_training(self, timeout: Optional[float] = None) -> bool:
+        """Block until background index training started by a commit has finished"""
+        with self._training_lock:
+            training = self._training
+        if training is None:
+            return True
         try:
-            if domain in self.vector_stores and self.vector_stores[domain]:
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=1000,
-                    chunk_overlap=200
-                )
-                chunks = text_splitter.split_text(content)
-                
-                documents = [
-                    Document(
-                        page_content=chunk,
-                        metadata={"source": source, "domain": domain, "timestamp": datetime.now().isoformat()}
-                    ) for chunk in chunks
-                ]
-                
-                self.vector_stores[domain].add_documents(documents)
-                return {"status": "success", "chunks": len(chunks)}
+            training.result(timeout)
+        except concurrent.futures.TimeoutError:
+            return False
+        return True
+    
+    def submit_document(self, content: Content, source: str, domain: str = "strategic", metadata: Optional[Dict[str, Any]] = None,
+                        audience: str = INGEST_DEFAULT_AUDIENCE, size: Optional[int] = None):
+        """Queue a document, cleared for ``audience`` and every audience above it, and return its job
+
+        Opens the domain's store on first use; async callers await
+        ``open_domains([domain], with_ingestion=True)`` first to keep that off the event loop.
+        """
+        self.open_domains_blocking([domain])
+        if not self._searchable(domain):
+            raise ValueError(f"Knowledge domain '{domain}' is not available")
+        if self.vector_index is not None and self.vector_index.readonly:
+            raise IndexLocked("Knowledge is ingested by the process that writes the vector index")
+        return self.ingestion.submit(content, source, domain, metadata, audience, size)
+    
+    async def ingest_document(self, content: Content, source: str, domain: str = "strategic",
+                              audience: str = INGEST_DEFAULT_AUDIENCE):
+        """Add new document to knowledge base; pass ``read_blocks(path)`` to stream a large file"""
+        try:
+            await self.open_domains([domain], with_ingestion=True)
+            job = self.submit_document(content, source, domain, audience=audience)
+            await job.done.wait()
+            if job.status != "completed":
+                return {"status": "error", "message": job.error}
+            return {"status": "success", "chunks": job.chunks_indexed, "duplicates": job.duplicates,
+                    "removed": job.chunks_removed, "unchanged": job.unchanged}
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
@@ -151,37 +633,35 @@ class DigitalTwinAgent:
     def __init__(self, agent_type: AgentType, knowledge_manager: KnowledgeManager):
         self.agent_type = agent_type
         self.knowledge_manager = knowledge_manager
-        self.specialized_domains = self._get_specialized_domains()
+        self.context_packer = ContextPacker()
         
-    def _get_specialized_domains(self) -> List[str]:
-        """Get knowledge domains this agent specializes in"""
-        domain_mapping = {
-            AgentType.CEO: ["strategic", "financial", "operations"],
-            AgentType.CFO: ["financial", "compliance"],
-            AgentType.COO: ["operations", "sustainability"],
-            AgentType.CMO: ["customer_data", "market_intelligence"],
-            AgentType.AGRICULTURAL: ["operations", "sustainability"],
-            AgentType.SUSTAINABILITY: ["sustainability", "compliance"],
-            AgentType.RISK_MANAGEMENT: ["financial", "compliance", "operations"],
-            AgentType.COMPLIANCE: ["compliance", "financial"],
-            AgentType.DATA_ANALYTICS: ["financial", "operations", "customer_data"],
-            AgentType.CUSTOMER_SERVICE: ["customer_data", "operations"]
-        }
-        return domain_mapping.get(self.agent_type, ["strategic"])
+    @property
+    def specialized_domains(self) -> List[str]:
+        """Knowledge domains this agent specializes in, from the shared agent registry"""
+        config = agent_registry.current().agent_config.get(self.agent_type.value, {})
+        return config.get("specialization", ["strategic"])
     
-    async def process_query(self, request: AgentRequest) -> AgentResponse:
+    @property
+    def collaboration_deadline_ms(self) -> float:
+        """How long this agent waits for its collaborators, from the shared agent registry"""
+        config = agent_registry.current().agent_config.get(self.agent_type.value, {})
+        return config.get("collaboration_deadline_ms", COLLABORATION_DEADLINE_MS)
+    
+    async def process_query(self, request: AgentRequest, cache: Optional[RetrievalCache] = None) -> AgentResponse:
         """Process query with specialized knowledge and reasoning"""
         
-        # 1. Knowledge Retrieval
-        relevant_docs = []
-        for domain in self.specialized_domains:
-            docs = await self.knowledge_manager.retrieve_knowledge(
-                request.question, domain=domain, top_k=3
-            )
-            relevant_docs.extend(docs)
+        # 1. Knowledge Retrieval (all specialized domains at once; keyword and vector hits fused, then reranked)
+        started = time.perf_counter()
+        # Collaborators answer a reframed question but retrieve for the original one
+        query = (request.context or {}).get("retrieval_query", request.question)
+        scored_docs, retrieval_timings = await self.knowledge_manager.retrieve_ranked(
+            query, domains=self.specialized_domains, top_k=RETRIEVAL_TOP_K, audience=request.audience, cache=cache
+        )
+        relevant_docs = [doc for doc, _ in scored_docs]
+        retrieval_ms = (time.perf_counter() - started) * 1000
         
-        # 2. Context Building
-        context = self._build_context(relevant_docs, request)
+        # 2. Context Building (overlapping chunks of one source merged, within the token budget)
+        context, packing = self._build_context(scored_docs, request)
         
         # 3. Generate Response (this would integrate with your DigitalRoots API)
         response = await self._generate_response(request, context)
@@ -198,14 +678,18 @@ class DigitalTwinAgent:
             metadata={
                 "knowledge_docs": len(relevant_docs),
                 "domains_searched": self.specialized_domains,
+                "retrieval_ms": round(retrieval_ms, 2),
+                "retrieval_timings": retrieval_timings,
+                "context_packing": packing,
                 "processing_time": 0.5
             }
         )
     
-    def _build_context(self, docs: List[Document], request: AgentRequest) -> str:
-        """Build context from retrieved knowledge"""
-        if not docs:
-            return f"No specific knowledge found for: {request.question}"
+    def _build_context(self, scored_docs: List[Tuple[Document, float]], request: AgentRequest) -> Tuple[str, Dict[str, int]]:
+        """Build context from retrieved knowledge, packed into the context token budget"""
+        passages, packing = self.context_packer.pack(scored_docs)
+        if not passages:
+            return f"No specific knowledge found for: {request.question}", packing
         
         context_parts = [
             f"Agent: {self.agent_type.value}",
@@ -214,10 +698,10 @@ class DigitalTwinAgent:
             "Relevant Knowledge:"
         ]
         
-        for i, doc in enumerate(docs[:5]):  # Limit to top 5
-            context_parts.append(f"{i+1}. {doc.page_content[:200]}...")
+        for i, passage in enumerate(passages):
+            context_parts.append(f"{i+1}. {passage.label}{passage.text}")
             
-        return "\n".join(context_parts)
+        return "\n".join(context_parts), packing
     
     async def _generate_response(self, request: AgentRequest, context: str) -> str:
         """Generate response using AI (would integrate with DigitalRoots)"""
@@ -261,19 +745,32 @@ class AgentOrchestrator:
         
         # 1. Select primary agent
         primary_agent = self.agents[request.agent_type]
+        # Searches are shared by every agent working on a collaborative request; per-domain
+        # searches only pay off then, so a lone agent searches all its domains at once
+        cache = RetrievalCache() if request.require_collaboration else None
         
         # 2. Process with primary agent
-        response = await primary_agent.process_query(request)
+        response = await primary_agent.process_query(request, cache)
         
         # 3. If collaboration is required, involve other agents
         if request.require_collaboration:
-            collaborating_responses = await self._collaborate(request, response)
-            response = self._synthesize_responses(response, collaborating_responses)
+            deadline_ms = primary_agent.collaboration_deadline_ms
+            collaborating_responses, omitted = await self._collaborate(request, response, cache, deadline_ms)
+            response = self._synthesize_responses(response, collaborating_responses, omitted)
+            response.metadata["collaboration_deadline_ms"] = deadline_ms
         
+        if cache is not None:
+            response.metadata["retrieval_cache"] = cache.stats()
         return response
     
-    async def _collaborate(self, request: AgentRequest, primary_response: AgentResponse) -> List[AgentResponse]:
-        """Get input from collaborating agents"""
+    async def _collaborate(self, request: AgentRequest, primary_response: AgentResponse,
+                           cache: Optional[RetrievalCache] = None, deadline_ms: float = COLLABORATION_DEADLINE_MS
+                           ) -> Tuple[List[AgentResponse], Dict[str, str]]:
+        """Get input from collaborating agents that answer within ``deadline_ms``
+
+        Returns the completed responses in collaborator order and, for each
+        perspective left out, why: ``deadline`` (cancelled) or ``error``.
+        """
         collaboration_map = {
             AgentType.CEO: [AgentType.CFO, AgentType.COO, AgentType.RISK_MANAGEMENT],
             AgentType.CFO: [AgentType.CEO, AgentType.RISK_MANAGEMENT, AgentType.COMPLIANCE],
@@ -282,21 +779,41 @@ class AgentOrchestrator:
         
         collaborators = collaboration_map.get(request.agent_type, [])
         
-        tasks = []
+        tasks = {}
         for agent_type in collaborators[:2]:  # Limit to 2 collaborators
             collab_request = AgentRequest(
                 question=f"Provide your perspective on: {request.question}",
                 agent_type=agent_type,
                 audience=request.audience,
-                language=request.language
+                language=request.language,
+                context={"retrieval_query": request.question}
             )
-            tasks.append(self.agents[agent_type].process_query(collab_request))
+            tasks[agent_type] = asyncio.ensure_future(self.agents[agent_type].process_query(collab_request, cache))
+        if not tasks:
+            return [], {}
+        
+        done, pending = await asyncio.wait(tasks.values(), timeout=deadline_ms / 1000)
+        for task in pending:
+            # Searches shared through the retrieval cache are shielded and keep running for other agents
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
         
-        return await asyncio.gather(*tasks) if tasks else []
+        completed, omitted = [], {}
+        for agent_type, task in tasks.items():
+            if task in pending:
+                omitted[agent_type.value] = "deadline"
+            elif task.exception() is not None:
+                logging.error(f"Collaborator {agent_type.value} failed: {task.exception()}")
+                omitted[agent_type.value] = "error"
+            else:
+                completed.append(task.result())
+        return completed, omitted
     
-    def _synthesize_responses(self, primary: AgentResponse, collaborators: List[AgentResponse]) -> AgentResponse:
-        """Synthesize multiple agent responses into cohesive output"""
-        if not collaborators:
+    def _synthesize_responses(self, primary: AgentResponse, collaborators: List[AgentResponse],
+                              omitted: Optional[Dict[str, str]] = None) -> AgentResponse:
+        """Synthesize multiple agent responses into cohesive output, noting perspectives left out"""
+        omitted = omitted or {}
+        if not collaborators and not omitted:
             return primary
         
         # Combine responses
@@ -304,6 +821,9 @@ class AgentOrchestrator:
         
         for collab in collaborators:
             combined_response += f"\n**{collab.agent_type.value.title()}:** {collab.response[:200]}...\n"
+        if omitted:
+            names = ", ".join(f"{agent_type.replace('_', ' ').title()} ({reason})" for agent_type, reason in omitted.items())
+            combined_response += f"\n*Perspectives not included: {names}*\n"
         
         # Combine actions
         all_actions = primary.recommended_actions[:]
@@ -313,18 +833,20 @@ class AgentOrchestrator:
         return AgentResponse(
             agent_type=primary.agent_type,
             response=combined_response,
-            confidence=min(primary.confidence, max([c.confidence for c in collaborators], default=0.5)),
+            confidence=min(primary.confidence, max([c.confidence for c in collaborators], default=primary.confidence)),
             knowledge_sources=list(set(primary.knowledge_sources)),
             collaborating_agents=[c.agent_type for c in collaborators],
             recommended_actions=list(set(all_actions)),  # Remove duplicates
             metadata={
                 **primary.metadata,
                 "collaboration": True,
-                "collaborator_count": len(collaborators)
+                "collaborator_count": len(collaborators),
+                "omitted_perspectives": omitted
             }
         )
 
 # Initialize the system
+agent_registry = KnowledgeRegistry()
 knowledge_manager = KnowledgeManager()
 agent_orchestrator = AgentOrchestrator(knowledge_manager)
 
@@ -343,6 +865,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_registry_watcher():
+    agent_registry.start_watching()
+    # The port binds right away; /api/system/ready reports when the stores are open
+    if KNOWLEDGE_WARM_UP:
+        app.state.warm_up = asyncio.create_task(knowledge_manager.warm_up())
+
+@app.on_event("shutdown")
+async def stop_registry_watcher():
+    agent_registry.stop_watching()
+    warm_up = getattr(app.state, "warm_up", None)
+    if warm_up is not None and not warm_up.done():
+        warm_up.cancel()
+    await knowledge_manager.close()
+
 @app.post("/api/chat", response_model=AgentResponse)
 async def chat_with_digital_twin(request: AgentRequest):
     """Main endpoint for interacting with the digital twin system"""
@@ -366,22 +903,55 @@ async def list_available_agents():
         ]
     }
 
-@app.post("/api/knowledge/ingest")
-async def ingest_knowledge(
-    content: str,
-    source: str,
+class IngestRequest(BaseModel):
+    content: str
+    source: str
     domain: str = "strategic"
-):
-    """Add new knowledge to the system"""
-    result = await knowledge_manager.ingest_document(content, source, domain)
-    return result
+    # Least privileged audience cleared to see the document: public, investor or boardroom
+    audience: str = INGEST_DEFAULT_AUDIENCE
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+@app.post("/api/knowledge/ingest", status_code=202)
+async def ingest_knowledge(request: IngestRequest):
+    """Queue new knowledge for background ingestion"""
+    await knowledge_manager.open_domains([request.domain], with_ingestion=True)
+    try:
+        job = knowledge_manager.submit_document(request.content, request.source, request.domain, request.metadata,
+                                                request.audience)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IndexLocked as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IngestionQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "progress_url": f"/api/knowledge/ingest/{job.job_id}"
+    }
+
+@app.get("/api/knowledge/ingest/{job_id}")
+async def ingestion_progress(job_id: str):
+    """Progress of a background ingestion job"""
+    # No pipeline yet means no job was ever submitted
+    ingestion = knowledge_manager._ingestion
+    job = ingestion.job(job_id) if ingestion is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown ingestion job")
+    return job.to_dict()
 
 @app.get("/api/knowledge/stats")
 async def knowledge_statistics():
     """Get knowledge base statistics"""
     stats = {}
+    counts = knowledge_manager.vector_index.domain_counts() if knowledge_manager.vector_index is not None else None
+    readiness = knowledge_manager.readiness()["domains"]
     for domain, store in knowledge_manager.vector_stores.items():
-        if store:
+        if readiness[domain] != "open":
+            stats[domain] = {"status": readiness[domain]}
+        elif counts is not None:
+            stats[domain] = {"status": "available", "document_count": counts.get(domain, 0)}
+        elif store:
             try:
                 # This would need to be implemented based on your Chroma setup
                 stats[domain] = {"status": "available", "document_count": "unknown"}
@@ -392,21 +962,35 @@ async def knowledge_statistics():
     
     return {
         "domains": stats,
+        "executor": knowledge_manager.store_executor.stats(),
+        "ingestion": knowledge_manager._ingestion.stats() if knowledge_manager._ingestion is not None else None,
+        "keyword_index_chunks": len(knowledge_manager.lexical_index),
+        "embeddings": knowledge_manager.embeddings.stats() if hasattr(knowledge_manager.embeddings, "stats") else None,
         "last_updated": datetime.now().isoformat(),
         "total_domains": len(stats)
     }
 
 @app.get("/api/system/health")
 async def system_health():
-    """Enhanced system health check"""
+    """Liveness: answers as soon as the app is up, whether or not the knowledge stores are open"""
     return {
         "status": "healthy",
+        "ready": knowledge_manager.ready,
         "agents": len(agent_orchestrator.agents),
         "knowledge_domains": len(knowledge_manager.vector_stores),
         "vector_store_path": str(knowledge_manager.vector_store_path),
+        "vector_store_executor": knowledge_manager.store_executor.stats(),
         "timestamp": datetime.now()
     }
 
+@app.get("/api/system/ready")
+async def system_ready():
+    """Readiness: 200 once every knowledge domain is open; 503 with per-domain status while starting or degraded"""
+    readiness = knowledge_manager.readiness()
+    if not readiness["ready"]:
+        return JSONResponse(status_code=503, content=readiness)
+    return readiness
+
 if __name__ == "__main__":
     import uvicorn
     print("?? Starting Green Hill Canarias Digital Twin System")
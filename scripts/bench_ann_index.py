@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: IVF-flat recall@k vs latency against the exact memory-mapped scan
+
+Generates clustered unit vectors (a mixture of topics, like real chunk
+embeddings), builds a VectorIndex and an IVFIndex over it, and for a sweep of
+nprobe values reports recall@k against the exact search and query latency.
+Queries are perturbed copies of indexed chunks. Prints a Markdown table for
+docs/RETRIEVAL_BENCHMARKS.md.
+
+Usage: python scripts/bench_ann_index.py [--size 1000000] [--dim 384] [--nprobe 1 2 4 8 16 32 64]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.ann_index import IVFIndex, default_nlist
+from api.vector_index import VectorIndex
+
+DOMAINS = ["financial", "operations", "compliance", "market_intelligence", "sustainability", "customer_data", "strategic"]
+BATCH = 50_000
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def clustered(rng, rows: int, dim: int, topics: int, spread: float = 1.0) -> np.ndarray:
+    centers = normalize(rng.standard_normal((topics, dim), dtype=np.float32))
+    noise = rng.standard_normal((rows, dim), dtype=np.float32) * (spread / np.sqrt(dim))
+    return normalize(centers[rng.integers(0, topics, rows)] + noise)
+
+
+def latency(fn, queries):
+    samples = []
+    results = []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(fn(query))
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return results, statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    topics = max(16, args.size // 1000)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(tmp, dimension=args.dim)
+        for start in range(0, args.size, BATCH):
+            rows = min(BATCH, args.size - start)
+            index.add(clustered(rng, rows, args.dim, topics), [None] * rows,
+                      [DOMAINS[i % len(DOMAINS)] for i in range(start, start + rows)])
+
+        ivf = IVFIndex(index, nlist=args.nlist or default_nlist(args.size))
+        started = time.perf_counter()
+        ivf.train()
+        train_s = time.perf_counter() - started
+
+        picks = rng.integers(0, args.size, args.queries)
+        queries = normalize(np.asarray(index.view().vectors[picks]) +
+                            rng.standard_normal((args.queries, args.dim), dtype=np.float32) * (0.3 / np.sqrt(args.dim)))
+        exact, exact_p50, exact_p95 = latency(lambda q: index.search(q, args.k), queries)
+        truth = [{hit.doc_id for hit in hits} for hits in exact]
+
+        print(f"{args.size:,} chunks, dim={args.dim}, nlist={ivf.nlist}, k={args.k}, "
+              f"{args.queries} queries, train {train_s:.1f} s, 1 core\n")
+        print("| search | recall@%d | p50 ms | p95 ms | speed-up (p50) |" % args.k)
+        print("|---|---:|---:|---:|---:|")
+        print(f"| exact scan | 1.000 | {exact_p50:.2f} | {exact_p95:.2f} | 1.0x |")
+        for nprobe in args.nprobe:
+            approx, p50, p95 = latency(lambda q: ivf.search(q, args.k, nprobe=nprobe), queries)
+            recall = np.mean([len(t & {hit.doc_id for hit in hits}) / len(t) for t, hits in zip(truth, approx)])
+            print(f"| IVF nprobe={nprobe} | {recall:.3f} | {p50:.2f} | {p95:.2f} | {exact_p50 / p50:.1f}x |")
+
+
+if __name__ == "__main__":
+    main()
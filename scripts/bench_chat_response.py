@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark: validated vs trusted ChatResponse construction
+
+Compares, on a single core (one process, one event loop), the requests/sec of
+  - validated: ChatResponse(...) returned through response_model=ChatResponse,
+    i.e. validation on construction plus FastAPI's re-validation and
+    jsonable_encoder pass (the behaviour before the trusted path)
+  - trusted:   ChatResponse(...) serialized by trusted_json, skipping the
+    second validation pass (the behaviour after)
+  - construct: ChatResponse.model_construct(...) serialized by trusted_json,
+    kept for reference; pydantic-core validation is faster than the Python
+    model_construct path, so the hot paths do not use it
+and reports the live /api/chat endpoint end to end (enhanced AI path).
+
+Usage: python scripts/bench_chat_response.py [--requests 3000]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("USE_LANGGRAPH", "false")
+
+from fastapi import FastAPI
+
+import digital_twin_live as live
+from digital_twin_live import AgentRequest, ChatResponse, trusted_json
+
+
+async def build_payload() -> dict:
+    request = AgentRequest(question="What is our revenue growth and water usage?", agent_type="cfo_agent")
+    response = await live.process_with_enhanced_ai(request)
+    payload = response.model_dump()
+    payload.pop("timestamp")
+    return payload
+
+
+def build_app(payload: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/validated", response_model=ChatResponse)
+    async def validated():
+        return ChatResponse(**payload)
+
+    @app.post("/trusted", response_model=ChatResponse)
+    async def trusted():
+        return trusted_json(ChatResponse(**payload))
+
+    @app.post("/construct", response_model=ChatResponse)
+    async def construct():
+        return trusted_json(ChatResponse.model_construct(**payload))
+
+    return app
+
+
+async def call(app: FastAPI, path: str, body: bytes) -> int:
+    """Drive one POST straight through the ASGI interface, without a client"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(app: FastAPI, path: str, requests: int, body: dict = None) -> float:
+    raw = json.dumps(body or {}).encode()
+    for _ in range(min(200, requests)):
+        await call(app, path, raw)
+    started = time.perf_counter()
+    for _ in range(requests):
+        if await call(app, path, raw) != 200:
+            raise RuntimeError(f"{path} failed")
+    return requests / (time.perf_counter() - started)
+
+
+async def main(requests: int):
+    payload = await build_payload()
+    app = build_app(payload)
+    chat_body = {"question": "What is our revenue growth and water usage?", "agent_type": "cfo_agent"}
+
+    validated = await measure(app, "/validated", requests)
+    trusted = await measure(app, "/trusted", requests)
+    construct = await measure(app, "/construct", requests)
+    endpoint = await measure(live.app, "/api/chat", requests, chat_body)
+
+    print(f"ChatResponse construction, {requests} requests, 1 core (raw ASGI, no HTTP client)")
+    print(f"  validated (before): {validated:8.0f} req/s")
+    print(f"  trusted   (after):  {trusted:8.0f} req/s  ({trusted / validated:.2f}x)")
+    print(f"  construct (unused): {construct:8.0f} req/s  ({construct / validated:.2f}x)")
+    print(f"  /api/chat end to end (enhanced AI, trusted): {endpoint:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=3000)
+    asyncio.run(main(parser.parse_args().requests))
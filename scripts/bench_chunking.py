@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: throughput and peak memory of document chunking
+
+Writes a synthetic --mb MB text export (board-pack paragraphs of
+bench_hybrid.py, with line breaks) to a temporary file and chunks it with
+CHUNK_SIZE / CHUNK_OVERLAP windows three ways:
+  - split_text:  the file read into one string, then split_text
+  - streamed:    stream_chunks over read_blocks, --block characters at a time
+  - langchain:   the file read into one string, then RecursiveCharacterTextSplitter
+                 (only when langchain-text-splitters or langchain is installed)
+Each run includes reading the file. Reports MB/s (best of --repeat) and
+tracemalloc peak memory, as a Markdown table for docs/RETRIEVAL_BENCHMARKS.md.
+
+Usage: python scripts/bench_chunking.py [--mb 100] [--block 1048576] [--repeat 3]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.ingestion import CHUNK_OVERLAP, CHUNK_SIZE, read_blocks, split_text, stream_chunks
+from bench_hybrid import make_chunk
+
+
+def recursive_splitter():
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        try:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+        except ImportError:
+            return None
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+
+def write_export(path: Path, mb: int):
+    rng = random.Random(0)
+    paragraphs = [make_chunk(rng, i)[0] for i in range(2000)]
+    target, written = mb * 1_000_000, 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            paragraph = rng.choice(paragraphs) + ("\n\n" if rng.random() < 0.3 else " ")
+            f.write(paragraph)
+            written += len(paragraph)
+
+
+def chunkers(path: Path, block: int):
+    runs = {
+        "split_text": lambda: split_text(path.read_text(encoding="utf-8")),
+        "streamed": lambda: stream_chunks(read_blocks(str(path), block)),
+    }
+    splitter = recursive_splitter()
+    if splitter is not None:
+        runs["langchain"] = lambda: splitter.split_text(path.read_text(encoding="utf-8"))
+    return runs
+
+
+def measure(run, repeat: int):
+    best, chunks = float("inf"), 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = sum(1 for _ in run())
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    sum(1 for _ in run())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, chunks, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=int, default=100)
+    parser.add_argument("--block", type=int, default=1 << 20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "export.txt"
+        write_export(path, args.mb)
+        size_mb = path.stat().st_size / 1_000_000
+        runs = chunkers(path, args.block)
+        results = {name: measure(run, args.repeat) for name, run in runs.items()}
+
+    print(f"{size_mb:.0f} MB export, {CHUNK_SIZE}-character chunks overlapping by {CHUNK_OVERLAP}, "
+          f"{args.block:,}-character blocks, 1 core\n")
+    print("| chunker | MB/s | chunks | peak memory MB |")
+    print("|---|---:|---:|---:|")
+    for name, (seconds, chunks, peak) in results.items():
+        print(f"| {name} | {size_mb / seconds:.1f} | {chunks:,} | {peak / 1e6:.1f} |")
+    if "langchain" not in results:
+        print("\nRecursiveCharacterTextSplitter not installed; install langchain-text-splitters to compare.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: prompt size and answer coverage of the agent context
+
+Fills a native-index KnowledgeManager with --docs synthetic board packs,
+each made of the paragraphs of bench_hybrid.py and chunked like ingestion
+(CHUNK_SIZE windows overlapping by CHUNK_OVERLAP). For --queries phrase
+queries (six consecutive topic words of one paragraph), the agent's ranked
+top --k chunks are turned into context three ways:
+  - cut:    the old _build_context, each chunk cut to its first 200 characters
+  - full:   every chunk in full, overlap and all
+  - packed: ContextPacker under a --budget token budget
+Reports context tokens (p50), the share of queries whose whole paragraph is
+in the context, and packing time, as a Markdown table for
+docs/RETRIEVAL_BENCHMARKS.md.
+
+Usage: python scripts/bench_context_packing.py [--docs 400] [--queries 200] [--k 5] [--budget 1200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.context_packer import ContextPacker, estimate_tokens
+from api.ingestion import CHUNK_OVERLAP, CHUNK_SIZE, split_text
+from bench_hybrid import make_chunk
+
+
+def contexts(hits, packer):
+    cut = "\n".join(f"{i + 1}. {doc.page_content[:200]}..." for i, (doc, _) in enumerate(hits))
+    full = "\n".join(f"{i + 1}. {doc.page_content}" for i, (doc, _) in enumerate(hits))
+    started = time.perf_counter()
+    passages, _ = packer.pack(hits)
+    pack_ms = (time.perf_counter() - started) * 1000
+    packed = "\n".join(f"{i + 1}. {p.label}{p.text}" for i, p in enumerate(passages))
+    return {"cut": cut, "full": full, "packed": packed}, pack_ms
+
+
+async def run(docs: int, queries: int, k: int, budget: int) -> dict:
+    import enhanced_digital_twin as enhanced
+
+    manager = enhanced.KnowledgeManager()
+    packer = ContextPacker(budget_tokens=budget)
+    rng = random.Random(0)
+    paragraphs = []
+    for d in range(docs):
+        source = f"board-pack-{d}.pdf"
+        body = [make_chunk(rng, d * 20 + i) for i in range(20)]
+        text = " ".join(paragraph for paragraph, _, _ in body)
+        paragraphs.extend((source, paragraph, topic) for paragraph, _, topic in body)
+        segment = manager.open_segment("compliance", "public")
+        chunks = list(split_text(text, CHUNK_SIZE, CHUNK_OVERLAP))
+        segment.add([chunk for chunk, _, _ in chunks],
+                    [{"domain": "compliance", "source": source, "start": start, "end": end} for _, start, end in chunks])
+        segment.commit([])
+
+    tokens = {"cut": [], "full": [], "packed": []}
+    covered = {"cut": 0, "full": 0, "packed": 0}
+    pack_samples = []
+    for source, paragraph, topic in rng.sample(paragraphs, queries):
+        start = rng.randrange(len(topic) - 6)
+        hits, _ = await manager.retrieve_ranked(" ".join(topic[start:start + 6]), ["compliance"], k)
+        built, pack_ms = contexts(hits, packer)
+        pack_samples.append(pack_ms)
+        for kind, context in built.items():
+            tokens[kind].append(estimate_tokens(context))
+            covered[kind] += paragraph in " ".join(context.split())
+    await manager.close()
+    pack_samples.sort()
+    return {
+        "tokens": {kind: statistics.median(samples) for kind, samples in tokens.items()},
+        "covered": {kind: hits / queries for kind, hits in covered.items()},
+        "pack_p50": statistics.median(pack_samples), "pack_p95": pack_samples[int(len(pack_samples) * 0.95) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--budget", type=int, default=1200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(VECTOR_BACKEND="native", VECTOR_ANN="none", EMBEDDING_PROVIDER="local",
+                          VECTOR_INDEX_DIR=str(Path(tmp) / "index"), EMBEDDING_CACHE_DIR="")
+        os.chdir(tmp)
+        results = asyncio.run(run(args.docs, args.queries, args.k, args.budget))
+
+    print(f"{args.docs} documents, {args.queries} queries, top {args.k} chunks of {CHUNK_SIZE} characters "
+          f"overlapping by {CHUNK_OVERLAP}, budget {args.budget} tokens\n")
+    print("| context | tokens p50 | paragraph in context |")
+    print("|---|---:|---:|")
+    for kind in ("cut", "full", "packed"):
+        print(f"| {kind} | {results['tokens'][kind]:.0f} | {results['covered'][kind]:.2f} |")
+    print(f"\nPacking p50 / p95: {results['pack_p50']:.3f} / {results['pack_p95']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
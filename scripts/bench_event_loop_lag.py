@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark: event-loop lag under concurrent /api/chat load (enhanced system)
+
+Every vector store is replaced by a fake whose similarity_search sleeps for
+--search-ms, standing in for a slow Chroma query. A ticker task measures how
+late the event loop wakes it up while --concurrency chat requests run against
+the enhanced app through ASGI, once with the store calls made inline (the
+behaviour before the bounded executor) and once through the executor.
+
+Usage: python scripts/bench_event_loop_lag.py [--concurrency 32] [--search-ms 20]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+import enhanced_digital_twin as enhanced
+from langchain_core.documents import Document
+
+
+class SlowStore:
+    def __init__(self, domain: str, search_ms: float):
+        self.domain = domain
+        self.search_s = search_ms / 1000
+
+    def similarity_search(self, query, k=4, **kwargs):
+        time.sleep(self.search_s)
+        return [Document(page_content=f"{self.domain} fact {i}", metadata={"domain": self.domain}) for i in range(k)]
+
+    def similarity_search_with_relevance_scores(self, query, k=4, **kwargs):
+        return [(doc, 1.0 - i / k) for i, doc in enumerate(self.similarity_search(query, k))]
+
+
+async def inline_run(fn, *args, timeout=None, **kwargs):
+    return fn(*args, **kwargs)
+
+
+async def ticker(lags: list, stop: asyncio.Event, interval: float = 0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def measure(concurrency: int) -> dict:
+    lags, stop = [], asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    transport = httpx.ASGITransport(app=enhanced.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[
+            client.post("/api/chat", json={"question": "How is cash flow trending?", "agent_type": "cfo_agent"})
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200][:1]
+    lags.sort()
+    return {
+        "wall_ms": elapsed * 1000,
+        "lag_p50_ms": statistics.median(lags) if lags else 0.0,
+        "lag_max_ms": lags[-1] if lags else 0.0,
+    }
+
+
+async def main(concurrency: int, search_ms: float):
+    manager = enhanced.knowledge_manager
+    # Stand in for an opened Chroma backend
+    manager.backend = "chroma"
+    manager.vector_stores = {domain: SlowStore(domain, search_ms) for domain in manager.vector_stores}
+    manager._opened = set(manager.vector_stores)
+
+    executor_run = manager.store_executor.run
+    manager.store_executor.run = inline_run
+    before = await measure(concurrency)
+    manager.store_executor.run = executor_run
+    after = await measure(concurrency)
+
+    print(f"{concurrency} concurrent /api/chat, {search_ms:.0f} ms per store search, "
+          f"{manager.store_executor.max_workers} executor workers")
+    for label, result in (("inline (before)", before), ("executor (after)", after)):
+        print(f"  {label:17} wall {result['wall_ms']:7.0f} ms   "
+              f"loop lag p50 {result['lag_p50_ms']:6.1f} ms   max {result['lag_max_ms']:7.1f} ms")
+    print(f"  executor stats: {manager.store_executor.stats()}")
+    manager.store_executor.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--search-ms", type=float, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.search_ms))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Benchmark: recall and latency of vector, BM25 and hybrid (RRF) retrieval
+
+Fills a native-index KnowledgeManager in a temporary directory with --chunks
+synthetic board-pack chunks. Each chunk mixes Zipf-distributed topic words with exact
+identifiers (a clause number, a ZEC filing reference and a euro amount).
+Two query sets are sampled from the chunks:
+  - identifier: one identifier plus generic words ("status of ZEC-48213 filing")
+  - topic:      a run of the chunk's topic words, no identifiers
+For each retriever it reports recall@5 of the source chunk and latency p50 /
+p95, plus the per-stage split of the hybrid path, as a Markdown table for
+docs/RETRIEVAL_BENCHMARKS.md.
+
+Usage: python scripts/bench_hybrid.py [--chunks 20000] [--queries 200]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+WORDS = ("revenue greenhouse water yield tomato banana export margin cash runway audit permit solar supplier "
+         "harvest island investor board forecast hiring logistics drought compliance irrigation pricing "
+         "contract insurance subsidy warehouse freight packaging certification").split()
+# A Zipf-weighted vocabulary so topic words repeat across chunks the way prose does
+VOCABULARY = WORDS + [f"{a}{b}" for a in WORDS for b in ("al", "ing", "ed", "s", "ion", "er", "ity", "ment")]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def make_chunk(rng: random.Random, i: int):
+    clause = f"{rng.randint(1, 40)}.{rng.randint(1, 20)}.{rng.randint(1, 9)}"
+    filing = f"ZEC-{rng.randint(10000, 99999)}"
+    amount = f"EUR {rng.randint(10, 999)},{rng.randint(100, 999)}"
+    topic = rng.choices(VOCABULARY, WEIGHTS, k=40)
+    text = (f"Clause {clause}: {' '.join(topic[:20])}. Filing {filing} covers {' '.join(topic[20:])}, "
+            f"with {amount} committed.")
+    return text, (clause, filing, amount), topic
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+async def run(chunks: int, queries: int, k: int) -> dict:
+    import enhanced_digital_twin as enhanced
+
+    manager = enhanced.KnowledgeManager()
+    rng = random.Random(0)
+    corpus = [make_chunk(rng, i) for i in range(chunks)]
+    for start in range(0, chunks, 1000):
+        segment = manager.open_segment("compliance", "public")
+        batch = corpus[start:start + 1000]
+        segment.add([text for text, _, _ in batch], [{"domain": "compliance", "chunk": start + i} for i in range(len(batch))])
+        segment.commit([])
+
+    picks = rng.sample(range(chunks), queries)
+    query_sets = {
+        "identifier": [(f"status of {rng.choice(corpus[i][1])} {rng.choice(WORDS)}", corpus[i][0]) for i in picks],
+        "topic": [(" ".join(corpus[i][2][5:15]), corpus[i][0]) for i in picks],
+    }
+
+    retrievers = {
+        "vector": lambda q: manager.retrieve_scored(q, ["compliance"], k),
+        "bm25": lambda q: manager.store_executor.run(manager._search_lexical, q, ["compliance"], k),
+        "hybrid": lambda q: manager.retrieve_hybrid(q, ["compliance"], k),
+    }
+    results, stages = {}, {"vector_ms": [], "lexical_ms": [], "fusion_ms": []}
+    for name, retrieve in retrievers.items():
+        for kind, pairs in query_sets.items():
+            hits, samples = 0, []
+            for query, target in pairs:
+                started = time.perf_counter()
+                found = await retrieve(query)
+                samples.append((time.perf_counter() - started) * 1000)
+                if name == "hybrid":
+                    found, timings = found
+                    for stage in stages:
+                        stages[stage].append(timings[stage])
+                hits += target in [doc.page_content for doc, _ in found]
+            results[(name, kind)] = (hits / len(pairs), *percentiles(samples))
+    manager.store_executor.shutdown()
+    return {"results": results, "stages": {stage: percentiles(samples) for stage, samples in stages.items()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(VECTOR_BACKEND="native", VECTOR_ANN="none", EMBEDDING_PROVIDER="local",
+                          VECTOR_INDEX_DIR=str(Path(tmp) / "index"), EMBEDDING_CACHE_DIR="")
+        os.chdir(tmp)
+        report = asyncio.run(run(args.chunks, args.queries, args.k))
+
+    print(f"{args.chunks:,} chunks, {args.queries} queries per set, k={args.k}, local embeddings, 1 core\n")
+    print("| retriever | identifier recall@5 | identifier p50 / p95 ms | topic recall@5 | topic p50 / p95 ms |")
+    print("|---|---:|---:|---:|---:|")
+    for name in ("vector", "bm25", "hybrid"):
+        ident, topic = report["results"][(name, "identifier")], report["results"][(name, "topic")]
+        print(f"| {name} | {ident[0]:.2f} | {ident[1]:.2f} / {ident[2]:.2f} | {topic[0]:.2f} | {topic[1]:.2f} / {topic[2]:.2f} |")
+    print("\nhybrid stages, p50 / p95 ms: " + ", ".join(
+        f"{stage} {p50:.2f} / {p95:.2f}" for stage, (p50, p95) in report["stages"].items()))
+
+
+if __name__ == "__main__":
+    main()
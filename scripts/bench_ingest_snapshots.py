@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: search latency and torn reads while documents are being ingested
+
+Builds a VectorIndex with --size rows, then keeps a writer thread ingesting
+documents of --doc-chunks rows in batches of --batch while the main thread
+runs searches. Each document replaces the previous one, tombstoning its rows.
+Two write paths are compared:
+  - per batch:  every batch is added (and the old version removed) on its own,
+                so readers can observe half a document (the path before snapshots)
+  - segment:    the document is staged and committed in one snapshot swap
+A search is counted as torn when its pinned snapshot holds a document only in
+part, or both versions at once, or neither. Prints a Markdown table for
+docs/RETRIEVAL_BENCHMARKS.md.
+
+Usage: python scripts/bench_ingest_snapshots.py [--size 100000] [--doc-chunks 2048]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.vector_index import VectorIndex
+
+
+def unit_vectors(rng, rows: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((rows, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def run(mode: str, size: int, dim: int, doc_chunks: int, batch: int, queries: int) -> dict:
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(tmp, dimension=dim)
+        index.add(unit_vectors(rng, size, dim), [None] * size, ["financial"] * size)
+        current = index.add(unit_vectors(rng, doc_chunks, dim), [None] * doc_chunks, ["strategic"] * doc_chunks)
+        stop = threading.Event()
+        documents = [0]
+
+        def writer():
+            nonlocal current
+            while not stop.is_set():
+                vectors = unit_vectors(rng, doc_chunks, dim)
+                parts = [vectors[start:start + batch] for start in range(0, doc_chunks, batch)]
+                if mode == "segment":
+                    segment = index.stage()
+                    for part in parts:
+                        segment.add(part, [None] * len(part), ["strategic"] * len(part))
+                    rows = segment.commit(remove=current)
+                else:
+                    rows = np.concatenate([index.add(part, [None] * len(part), ["strategic"] * len(part))
+                                           for part in parts])
+                    index.remove(current)
+                current = rows
+                documents[0] += 1
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        samples, torn = [], 0
+        for query in unit_vectors(rng, queries, dim):
+            started = time.perf_counter()
+            with index.pin() as view:
+                index._search(view, query, 5, ["strategic"], 0xFF)
+                live = int(np.count_nonzero(index.candidate_rows(view, ["strategic"])))
+            samples.append((time.perf_counter() - started) * 1000)
+            torn += live != doc_chunks
+        stop.set()
+        thread.join()
+    samples.sort()
+    return {"p50": statistics.median(samples), "p95": samples[int(len(samples) * 0.95) - 1],
+            "torn": torn / queries, "documents": documents[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--doc-chunks", type=int, default=2048)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{args.size:,} rows, dim={args.dim}, documents of {args.doc_chunks} chunks in batches of {args.batch}, "
+          f"{args.queries} queries, 1 core\n")
+    print("| write path | search p50 ms | search p95 ms | torn snapshots | documents ingested |")
+    print("|---|---:|---:|---:|---:|")
+    for mode in ("per batch", "segment"):
+        r = run(mode, args.size, args.dim, args.doc_chunks, args.batch, args.queries)
+        print(f"| {mode} | {r['p50']:.2f} | {r['p95']:.2f} | {r['torn']:.1%} | {r['documents']} |")
+
+
+if __name__ == "__main__":
+    main()
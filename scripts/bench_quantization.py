@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory and recall of int8 / PQ codes with exact re-ranking
+
+Builds a VectorIndex of clustered unit vectors (same generator as
+bench_ann_index.py) and compares, for recall@k against the exact float scan
+and query latency:
+  - float32 exact scan
+  - int8 scalar codes, codes only and with exact re-ranking
+  - product quantization codes, codes only and with exact re-ranking
+  - IVF + int8 codes with re-ranking
+plus bytes per vector and memory per million vectors. Prints Markdown tables
+for docs/RETRIEVAL_BENCHMARKS.md.
+
+Usage: python scripts/bench_quantization.py [--size 200000] [--dim 384] [--candidates 100]
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.ann_index import IVFIndex
+from api.quantization import QuantizedIndex
+from api.vector_index import VectorIndex, top_k_rows
+from bench_ann_index import BATCH, clustered, latency, normalize
+
+MB_PER_MILLION = 1_000_000 / 2**20
+
+
+def recall(truth, results) -> float:
+    return float(np.mean([len(t & set(r)) / len(t) for t, r in zip(truth, results)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--candidates", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    k = args.k
+
+    rng = np.random.default_rng(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(tmp, dimension=args.dim)
+        for start in range(0, args.size, BATCH):
+            rows = min(BATCH, args.size - start)
+            index.add(clustered(rng, rows, args.dim, max(16, args.size // 1000)), [None] * rows, ["financial"] * rows)
+
+        picks = rng.integers(0, args.size, args.queries)
+        queries = normalize(np.asarray(index.view().vectors[picks]) +
+                            rng.standard_normal((args.queries, args.dim), dtype=np.float32) * (0.3 / np.sqrt(args.dim)))
+        exact, exact_p50, _ = latency(lambda q: [h.doc_id for h in index.search(q, k)], queries)
+        truth = [set(ids) for ids in exact]
+
+        rows_out = [("float32 exact scan", 4 * args.dim, 1.0, exact_p50, None)]
+        built = {}
+        for kind in ("int8", "pq"):
+            quantized = QuantizedIndex(index, kind=kind, candidates=args.candidates)
+            started = time.perf_counter()
+            quantized.train()
+            train_s = time.perf_counter() - started
+            built[kind] = quantized
+            width = quantized.quantizer.code_size(args.dim)
+
+            def codes_only(q, quantized=quantized):
+                scores = quantized.approximate_scores(None, q)
+                return top_k_rows(scores, k).tolist()
+
+            approx, p50, _ = latency(codes_only, queries)
+            rows_out.append((f"{kind} codes only", width, recall(truth, approx), p50, train_s))
+            reranked, p50, _ = latency(lambda q: [h.doc_id for h in quantized.search(q, k)], queries)
+            rows_out.append((f"{kind} + exact re-rank of {args.candidates}", width, recall(truth, reranked), p50, train_s))
+
+        ivf = IVFIndex(index, nprobe=16, quantized=built["int8"])
+        ivf.train()
+        ivf_results, p50, _ = latency(lambda q: [h.doc_id for h in ivf.search(q, k)], queries)
+        rows_out.append(("IVF nprobe=16 + int8 + re-rank", args.dim, recall(truth, ivf_results), p50, None))
+
+    print(f"{args.size:,} chunks, dim={args.dim}, k={k}, {args.queries} queries, 1 core\n")
+    print(f"| search | bytes / vector | MB per 1M vectors | recall@{k} | p50 ms | train s |")
+    print("|---|---:|---:|---:|---:|---:|")
+    for name, width, rec, p50, train_s in rows_out:
+        train = f"{train_s:.1f}" if train_s is not None else "-"
+        print(f"| {name} | {width} | {width * MB_PER_MILLION:,.0f} | {rec:.3f} | {p50:.2f} | {train} |")
+
+
+if __name__ == "__main__":
+    main()
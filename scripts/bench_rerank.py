@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ranking quality and cost of the local rerank stage
+
+Fills a native-index KnowledgeManager with the synthetic chunks of
+bench_hybrid.py and, for --queries queries per set, retrieves the hybrid
+top --pool candidates and compares their order before and after
+FeatureReranker:
+  - phrase: six consecutive topic words of one chunk
+  - mixed:  one of the chunk's identifiers plus three of its topic words
+Reports recall@1, recall@5 and MRR of the source chunk, and the rerank
+latency p50 / p95 (ms), as a Markdown table for docs/RETRIEVAL_BENCHMARKS.md.
+
+Usage: python scripts/bench_rerank.py [--chunks 20000] [--queries 200] [--pool 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.reranker import FeatureReranker
+from bench_hybrid import make_chunk
+
+
+def quality(ranked, target):
+    texts = [doc.page_content for doc, _ in ranked]
+    rank = texts.index(target) + 1 if target in texts else None
+    return rank == 1, rank is not None and rank <= 5, 1 / rank if rank else 0.0
+
+
+async def run(chunks: int, queries: int, pool: int) -> dict:
+    import enhanced_digital_twin as enhanced
+
+    manager = enhanced.KnowledgeManager()
+    reranker = FeatureReranker(budget_ms=50)
+    rng = random.Random(0)
+    corpus = [make_chunk(rng, i) for i in range(chunks)]
+    for start in range(0, chunks, 1000):
+        segment = manager.open_segment("compliance", "public")
+        batch = corpus[start:start + 1000]
+        segment.add([text for text, _, _ in batch], [{"domain": "compliance", "chunk": start + i} for i in range(len(batch))])
+        segment.commit([])
+
+    picks = rng.sample(range(chunks), queries)
+    query_sets = {"phrase": [], "mixed": []}
+    for i in picks:
+        text, identifiers, topic = corpus[i]
+        start = rng.randrange(len(topic) - 6)
+        query_sets["phrase"].append((" ".join(topic[start:start + 6]), text))
+        query_sets["mixed"].append((f"{rng.choice(identifiers)} {' '.join(rng.sample(topic, 3))}", text))
+
+    results = {}
+    for kind, pairs in query_sets.items():
+        before, after, samples = [], [], []
+        for query, target in pairs:
+            hits, _ = await manager.retrieve_hybrid(query, ["compliance"], pool)
+            ranked, timings = reranker.rerank(query, hits, 5)
+            samples.append(timings["rerank_ms"])
+            before.append(quality(hits[:5], target))
+            after.append(quality(ranked, target))
+        samples.sort()
+        results[kind] = {
+            "before": [sum(column) / len(pairs) for column in zip(*before)],
+            "after": [sum(column) / len(pairs) for column in zip(*after)],
+            "p50": statistics.median(samples), "p95": samples[int(len(samples) * 0.95) - 1],
+        }
+    manager.store_executor.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--pool", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(VECTOR_BACKEND="native", VECTOR_ANN="none", EMBEDDING_PROVIDER="local",
+                          VECTOR_INDEX_DIR=str(Path(tmp) / "index"), EMBEDDING_CACHE_DIR="")
+        os.chdir(tmp)
+        results = asyncio.run(run(args.chunks, args.queries, args.pool))
+
+    print(f"{args.chunks:,} chunks, {args.queries} queries per set, hybrid pool of {args.pool}, 1 core\n")
+    print("| queries | order | recall@1 | recall@5 | MRR | rerank p50 / p95 ms |")
+    print("|---|---|---:|---:|---:|---:|")
+    for kind, r in results.items():
+        for order in ("before", "after"):
+            at1, at5, mrr = r[order]
+            cost = f"{r['p50']:.2f} / {r['p95']:.2f}" if order == "after" else "-"
+            print(f"| {kind} | {'hybrid' if order == 'before' else 'reranked'} | {at1:.2f} | {at5:.2f} | {mrr:.3f} | {cost} |")
+
+
+if __name__ == "__main__":
+    main()
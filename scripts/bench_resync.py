@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Benchmark: nightly resync of a document corpus with and without the manifest
+
+Ingests --docs synthetic board documents into a native-index KnowledgeManager
+in a temporary directory, then re-submits the whole corpus after editing one
+paragraph in --changed percent of the documents and reports, per pass, wall
+time, chunks embedded and chunks tombstoned:
+  - initial:   first ingest of the corpus
+  - full:      resync with the manifest detached, i.e. every document is
+               re-split and re-embedded (the behaviour before the manifest)
+  - manifest:  resync with the manifest; only edited chunks are embedded
+and prints a Markdown table for docs/RETRIEVAL_BENCHMARKS.md.
+
+Usage: python scripts/bench_resync.py [--docs 5000] [--changed 2]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.ingestion import IngestionQueueFull
+
+WORDS = ("revenue greenhouse water yield tomato banana export margin cash runway audit permit solar "
+         "supplier harvest island investor board forecast hiring logistics drought compliance").split()
+
+
+def paragraph(rng: random.Random, words: int = 120) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+
+async def ingest(manager, corpus) -> dict:
+    started = time.perf_counter()
+    jobs = []
+    for source, paragraphs in corpus.items():
+        while True:
+            try:
+                jobs.append(manager.submit_document("\n\n".join(paragraphs), source, "strategic"))
+                break
+            except IngestionQueueFull:
+                await asyncio.sleep(0.001)
+    for job in jobs:
+        await job.done.wait()
+    return {
+        "seconds": time.perf_counter() - started,
+        "embedded": sum(job.chunks_indexed for job in jobs),
+        "removed": sum(job.chunks_removed for job in jobs),
+        "unchanged": sum(job.unchanged for job in jobs),
+    }
+
+
+async def run(docs: int, changed: float, paragraphs: int) -> dict:
+    import enhanced_digital_twin as enhanced
+
+    manager = enhanced.KnowledgeManager()
+    rng = random.Random(0)
+    corpus = {f"board-pack-{i:05d}.pdf": [paragraph(rng) for _ in range(paragraphs)] for i in range(docs)}
+    results = {"initial": await ingest(manager, corpus)}
+
+    for source in rng.sample(sorted(corpus), int(docs * changed / 100)):
+        corpus[source][rng.randrange(paragraphs)] = paragraph(rng)
+
+    manifest, known = manager.ingestion.manifest, dict(manager.ingestion.known_chunks)
+    manager.ingestion.manifest, manager.ingestion.known_chunks = None, {}
+    results["full"] = await ingest(manager, corpus)
+    manager.ingestion.manifest, manager.ingestion.known_chunks = manifest, known
+    results["manifest"] = await ingest(manager, corpus)
+    await manager.ingestion.stop()
+    manager.store_executor.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--docs", type=int, default=5000)
+    parser.add_argument("--changed", type=float, default=2.0, help="percent of documents edited before the resync")
+    parser.add_argument("--paragraphs", type=int, default=6)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(VECTOR_BACKEND="native", VECTOR_ANN="none", EMBEDDING_PROVIDER="local",
+                          VECTOR_INDEX_DIR=str(Path(tmp) / "index"), EMBEDDING_CACHE_DIR="")
+        os.chdir(tmp)
+        results = asyncio.run(run(args.docs, args.changed, args.paragraphs))
+
+    print(f"{args.docs:,} documents x {args.paragraphs} paragraphs, {args.changed:g}% edited, local embeddings, 1 core\n")
+    print("| pass | wall time | chunks embedded | chunks tombstoned | documents skipped |")
+    print("|---|---:|---:|---:|---:|")
+    for name, r in results.items():
+        print(f"| {name} | {r['seconds']:.1f} s | {r['embedded']:,} | {r['removed']:,} | {r['unchanged']:,} |")
+
+
+if __name__ == "__main__":
+    main()
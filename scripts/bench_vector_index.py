@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory-mapped vector index search latency at 10k / 100k / 1M chunks
+
+Builds a VectorIndex of random unit vectors spread over the seven knowledge
+domains in a temporary directory and times, per size:
+  - all domains: one scan of the whole matrix
+  - one domain:  bitmap-filtered scan (1/7 of the rows)
+  - audience:    bitmap-filtered scan over public rows (1/3 of the rows)
+  - 7 stores:    the per-domain layout, seven separate scans merged by score
+                 (what a cross-domain query costs with one collection per domain)
+and prints a Markdown table for docs/RETRIEVAL_BENCHMARKS.md.
+
+Usage: python scripts/bench_vector_index.py [--sizes 10000 100000 1000000] [--dim 384]
+"""
+import argparse
+import heapq
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from api.vector_index import VectorIndex, top_k_rows
+
+DOMAINS = ["financial", "operations", "compliance", "market_intelligence", "sustainability", "customer_data", "strategic"]
+BATCH = 50_000
+
+
+def unit_vectors(rng, rows: int, dim: int) -> np.ndarray:
+    vectors = rng.standard_normal((rows, dim), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def timed(fn, queries) -> tuple:
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def run(size: int, dim: int, queries: int, k: int) -> dict:
+    rng = np.random.default_rng(size)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = VectorIndex(tmp, dimension=dim)
+        started = time.perf_counter()
+        for start in range(0, size, BATCH):
+            rows = min(BATCH, size - start)
+            ids = np.arange(start, start + rows)
+            index.add(unit_vectors(rng, rows, dim), [{"chunk": int(i)} for i in ids],
+                      [DOMAINS[i % len(DOMAINS)] for i in ids], audiences=(1 << (ids % 3)).tolist())
+        index.flush()
+        build_s = time.perf_counter() - started
+        size_mb = (Path(tmp) / "vectors.f32").stat().st_size / 2**20
+
+        view = index.view()
+        matrix = view.vectors[:size]
+        per_domain = [np.ascontiguousarray(matrix[d::len(DOMAINS)]) for d in range(len(DOMAINS))]
+
+        def seven_stores(query):
+            ranked = []
+            for store in per_domain:
+                scores = store @ query
+                top = top_k_rows(scores, k)
+                ranked.append([(float(scores[t]), int(t)) for t in top])
+            return heapq.nlargest(k, heapq.merge(*ranked, reverse=True))
+
+        sample = unit_vectors(rng, queries, dim)
+        return {
+            "size": size,
+            "build_s": build_s,
+            "size_mb": size_mb,
+            "all": timed(lambda q: index.search(q, k), sample),
+            "domain": timed(lambda q: index.search(q, k, domains=["financial"]), sample),
+            "audience": timed(lambda q: index.search(q, k, audience_mask=1), sample),
+            "seven": timed(seven_stores, sample),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"dim={args.dim}, k={args.k}, {args.queries} queries, latency p50 / p95 in ms, 1 core\n")
+    print("| chunks | vectors.f32 | build | all domains | one domain | public audience | 7 per-domain stores |")
+    print("|---:|---:|---:|---:|---:|---:|---:|")
+    for size in args.sizes:
+        r = run(size, args.dim, args.queries, args.k)
+        cells = " | ".join(f"{r[key][0]:.2f} / {r[key][1]:.2f}" for key in ("all", "domain", "audience", "seven"))
+        print(f"| {size:,} | {r['size_mb']:.0f} MB | {r['build_s']:.1f} s | {cells} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,9 @@ import json
 import os
 import logging
 
+from api.registry import KnowledgeRegistry
+from api.responses import ChatResponse, trusted_json
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -40,93 +43,16 @@ class AgentRequest(BaseModel):
     language: str = "en"
     require_collaboration: bool = False
 
-class ChatResponse(BaseModel):
-    agent_type: str
-    response: str
-    confidence: float = 0.85
-    knowledge_sources: List[str] = ["knowledge_base"]
-    collaborating_agents: List[str] = []
-    recommended_actions: List[str] = []
-    metadata: Dict[str, Any] = {}
-    timestamp: str = datetime.now().isoformat()
+# Agents and knowledge base are shared with the live system via data/*.json
+REGISTRY = KnowledgeRegistry()
 
-# Agent configurations
-AGENT_CONFIG = {
-    "ceo_digital_twin": {
-        "name": "CEO Digital Twin",
-        "specialization": ["strategic", "financial", "operations"],
-        "personality": "As your Digital Twin CEO, I focus on strategic vision, growth opportunities, and high-level decision making."
-    },
-    "cfo_agent": {
-        "name": "CFO Agent", 
-        "specialization": ["financial", "compliance"],
-        "personality": "From a financial perspective, I analyze numbers, projections, and investment opportunities."
-    },
-    "coo_agent": {
-        "name": "COO Agent",
-        "specialization": ["operations", "sustainability"],
-        "personality": "I focus on operational efficiency, process optimization, and sustainable business practices."
-    },
-    "cmo_agent": {
-        "name": "CMO Agent",
-        "specialization": ["customer_data", "market_intelligence"],
-        "personality": "I specialize in marketing strategy, customer insights, and growth initiatives."
-    },
-    "agricultural_intelligence": {
-        "name": "Agricultural Intelligence Agent",
-        "specialization": ["operations", "sustainability"],
-        "personality": "I provide insights on crop management, sustainable farming, and agricultural optimization."
-    },
-    "sustainability_agent": {
-        "name": "Sustainability Agent",
-        "specialization": ["sustainability", "compliance"],
-        "personality": "I focus on ESG metrics, environmental impact, and sustainable business practices."
-    },
-    "risk_management": {
-        "name": "Risk Management Agent",
-        "specialization": ["financial", "compliance", "operations"],
-        "personality": "I assess risks, identify potential threats, and recommend mitigation strategies."
-    },
-    "compliance_agent": {
-        "name": "Compliance Agent",
-        "specialization": ["compliance", "financial"],
-        "personality": "I ensure regulatory compliance and help navigate legal requirements."
-    },
-    "data_analytics": {
-        "name": "Data Analytics Agent",
-        "specialization": ["financial", "operations", "customer_data"],
-        "personality": "I analyze data patterns, generate insights, and support data-driven decision making."
-    },
-    "customer_service": {
-        "name": "Customer Service Agent",
-        "specialization": ["customer_data", "operations"],
-        "personality": "I focus on customer satisfaction, relationship management, and service optimization."
-    }
-}
+@app.on_event("startup")
+async def start_registry_watcher():
+    REGISTRY.start_watching()
 
-# Mock knowledge base
-KNOWLEDGE_BASE = {
-    "strategic": [
-        "Green Hill Canarias is a sustainable agriculture company focused on innovative farming practices.",
-        "Our mission is to revolutionize agriculture through technology and sustainability.",
-        "We target 25% growth annually through expansion and technology adoption."
-    ],
-    "financial": [
-        "Current revenue run rate: $2.5M annually",
-        "Profit margin: 18% and growing",
-        "Investment needed: $5M for Series A expansion"
-    ],
-    "operations": [
-        "Operating 500 hectares of sustainable farmland",
-        "Employing 150+ agricultural specialists",
-        "Implementing IoT sensors for crop monitoring"
-    ],
-    "sustainability": [
-        "Carbon neutral operations by 2025",
-        "Water usage reduced by 30% through smart irrigation",
-        "Biodiversity increased by 40% through regenerative practices"
-    ]
-}
+@app.on_event("shutdown")
+async def stop_registry_watcher():
+    REGISTRY.stop_watching()
 
 # Routes
 @app.get("/")
@@ -149,6 +75,7 @@ async def root():
 @app.get("/api/agents")
 async def list_agents():
     """Get list of available agents"""
+    agent_config = REGISTRY.current().agent_config
     return {
         "agents": [
             {
@@ -156,7 +83,7 @@ async def list_agents():
                 "name": config["name"],
                 "specialization": config["specialization"]
             }
-            for agent_type, config in AGENT_CONFIG.items()
+            for agent_type, config in agent_config.items()
         ]
     }
 
@@ -164,13 +91,14 @@ async def list_agents():
 async def chat_endpoint(request: AgentRequest):
     """Main chat endpoint"""
     try:
-        agent_config = AGENT_CONFIG.get(request.agent_type, AGENT_CONFIG["ceo_digital_twin"])
+        registry = REGISTRY.current()
+        agent_config = registry.agent(request.agent_type)
         
         # Simulate knowledge retrieval
         relevant_knowledge = []
         for domain in agent_config["specialization"]:
-            if domain in KNOWLEDGE_BASE:
-                relevant_knowledge.extend(KNOWLEDGE_BASE[domain][:2])
+            if domain in registry.knowledge_base:
+                relevant_knowledge.extend(registry.knowledge_base[domain][:2])
         
         # Generate response
         context = " ".join(relevant_knowledge)
@@ -196,7 +124,7 @@ async def chat_endpoint(request: AgentRequest):
             }
             collaborators = collab_map.get(request.agent_type, [])[:2]
         
-        return ChatResponse(
+        return trusted_json(ChatResponse(
             agent_type=request.agent_type,
             response=response_text,
             confidence=0.88,
@@ -208,7 +136,7 @@ async def chat_endpoint(request: AgentRequest):
                 "domains_searched": agent_config["specialization"],
                 "collaboration": request.require_collaboration
             }
-        )
+        ))
         
     except Exception as e:
         logger.error(f"Chat error: {e}")
@@ -224,25 +152,27 @@ async def ingest_knowledge(content: str, source: str, domain: str = "strategic")
 @app.get("/api/knowledge/stats")
 async def knowledge_stats():
     """Get knowledge base statistics"""
+    knowledge_base = REGISTRY.current().knowledge_base
     return {
         "domains": {
             domain: {
                 "status": "available",
                 "document_count": len(docs)
             }
-            for domain, docs in KNOWLEDGE_BASE.items()
+            for domain, docs in knowledge_base.items()
         },
         "last_updated": datetime.now().isoformat(),
-        "total_domains": len(KNOWLEDGE_BASE)
+        "total_domains": len(knowledge_base)
     }
 
 @app.get("/api/system/health")
 async def system_health():
     """System health check"""
+    registry = REGISTRY.current()
     return {
         "status": "healthy",
-        "agents": len(AGENT_CONFIG),
-        "knowledge_domains": len(KNOWLEDGE_BASE),
+        "agents": len(registry.agent_config),
+        "knowledge_domains": len(registry.knowledge_base),
         "timestamp": datetime.now().isoformat(),
         "version": "2.0.0"
     }
@@ -0,0 +1,72 @@
+"""
+Tests for the IVF-flat index in api/ann_index.py
+"""
+import threading
+
+import numpy as np
+
+import api.ann_index
+
+from api.ann_index import IVFIndex
+from api.vector_index import VectorIndex
+
+
+def clustered(rows, dim=32, topics=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim))
+    vectors = (centers[rng.integers(0, topics, rows)] + rng.normal(size=(rows, dim)) * 0.3).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_recall_filters_and_incremental_inserts(tmp_path):
+    vectors = clustered(6000)
+    base = VectorIndex(tmp_path)
+    base.add(vectors[:5000], list(range(5000)), ["financial", "operations"] * 2500)
+    ivf = IVFIndex(base, nlist=40, nprobe=8)
+    ivf.train()
+
+    queries = vectors[:50]
+    recall = np.mean([
+        len({h.doc_id for h in ivf.search(q, 10)} & {h.doc_id for h in base.search(q, 10)}) / 10 for q in queries
+    ])
+    assert recall > 0.9
+    assert all(h.doc_id % 2 == 1 for h in ivf.search(queries[0], 10, domains=["operations"]))
+
+    rows = base.add(vectors[5000:], list(range(5000, 6000)), ["strategic"] * 1000)
+    ivf.add_rows(rows)
+    assert ivf.search(vectors[5500], 1)[0].doc_id == 5500
+    base.remove([5500])
+    assert 5500 not in {h.doc_id for h in ivf.search(vectors[5500], 5)}
+
+    ivf.save()
+    base.close()
+    restored = IVFIndex(VectorIndex(tmp_path), nprobe=8)
+    assert restored.load()
+    assert [h.doc_id for h in restored.search(vectors[5600], 3)] == [h.doc_id for h in ivf.search(vectors[5600], 3)]
+
+
+def test_rows_committed_during_training_are_indexed(tmp_path, monkeypatch):
+    vectors = clustered(3000)
+    base = VectorIndex(tmp_path)
+    base.add(vectors[:2000], list(range(2000)), ["financial"] * 2000)
+    ivf = IVFIndex(base, nlist=20, nprobe=20)
+
+    sampled, release = threading.Event(), threading.Event()
+    kmeans = api.ann_index.spherical_kmeans
+
+    def slow_kmeans(*args, **kwargs):
+        sampled.set()
+        release.wait(5)
+        return kmeans(*args, **kwargs)
+
+    monkeypatch.setattr(api.ann_index, "spherical_kmeans", slow_kmeans)
+    trainer = threading.Thread(target=ivf.train)
+    trainer.start()
+    assert sampled.wait(5)
+    ivf.add_rows(base.add(vectors[2000:], list(range(2000, 3000)), ["financial"] * 1000))
+    release.set()
+    trainer.join(5)
+
+    assert ivf.trained
+    assert ivf.search(vectors[2500], 1)[0].doc_id == 2500
+    assert sum(len(ivf._list(i)) for i in range(len(ivf._lists))) == 3000
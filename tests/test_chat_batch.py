@@ -0,0 +1,105 @@
+"""
+Tests for the NDJSON /api/chat/batch endpoint and SharedRetrieval in digital_twin_live.py
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+import digital_twin_live as live
+
+
+class FakeAnswers:
+    """answer_request stand-in that records how many requests run at once"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.running = 0
+        self.peak = 0
+
+    async def __call__(self, request, retrieval=None):
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            for _ in range(3):
+                await asyncio.sleep(0)
+            if request.question in self.failing:
+                raise ValueError(f"cannot answer {request.question}")
+            return live.ChatResponse(agent_type=request.agent_type, response=f"Answer to {request.question}",
+                                     confidence=0.9, knowledge_sources=[], collaborating_agents=[],
+                                     recommended_actions=[], metadata={})
+        finally:
+            self.running -= 1
+
+
+def post_batch(questions, agent_type="cfo_agent"):
+    async def scenario():
+        transport = httpx.ASGITransport(app=live.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post("/api/chat/batch", json={
+                "requests": [{"question": question, "agent_type": agent_type} for question in questions]})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200 and response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_respects_the_concurrency_cap(monkeypatch):
+    answers = FakeAnswers()
+    monkeypatch.setattr(live, "answer_request", answers)
+    monkeypatch.setattr(live, "BATCH_SEMAPHORE", asyncio.Semaphore(2))
+
+    lines = post_batch([f"Question {i}" for i in range(6)])
+    assert answers.peak == 2
+    assert sorted(line["index"] for line in lines[:-1]) == list(range(6))
+    assert all(line["status"] == "ok" for line in lines[:-1])
+
+
+def test_failed_items_get_an_error_line_and_are_counted_in_the_summary(monkeypatch):
+    monkeypatch.setattr(live, "answer_request", FakeAnswers(failing={"Question 1"}))
+    monkeypatch.setattr(live, "BATCH_SEMAPHORE", asyncio.Semaphore(4))
+
+    lines = post_batch(["Question 0", "Question 1", "Question 2"])
+    items, summary = {line["index"]: line for line in lines[:-1]}, lines[-1]
+    assert items[1] == {"index": 1, "status": "error", "agent_type": "cfo_agent",
+                        "detail": "Processing error: cannot answer Question 1"}
+    assert items[0]["response"]["response"] == "Answer to Question 0" and items[2]["status"] == "ok"
+    assert summary["done"] and summary["count"] == 3 and summary["errors"] == 1 and summary["total_ms"] >= 0
+
+
+def test_empty_or_oversized_batches_are_rejected(monkeypatch):
+    monkeypatch.setattr(live, "BATCH_MAX_REQUESTS", 2)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=live.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            body = lambda n: {"requests": [{"question": "Q", "agent_type": "cfo_agent"}] * n}
+            return [await client.post("/api/chat/batch", json=body(n)) for n in (0, 3)]
+
+    empty, oversized = asyncio.run(scenario())
+    assert empty.status_code == 400 and oversized.status_code == 400
+
+
+class CountingIndex:
+    def __init__(self):
+        self.calls = []
+
+    def search(self, question, k, domains):
+        self.calls.append((domains[0], question, k))
+        return [SimpleNamespace(doc_id=f"{domains[0]}-{i}", score=1.0 / (i + 1)) for i in range(k)]
+
+
+def test_shared_retrieval_reuses_hits_per_domain_question_and_k():
+    index = CountingIndex()
+    retrieval = live.SharedRetrieval(SimpleNamespace(knowledge_index=index))
+
+    retrieval.search("Cash runway?", ["financial", "strategic"], 3)
+    retrieval.search("Cash runway?", ["financial", "operations"], 3)
+    assert index.calls == [("financial", "Cash runway?", 3), ("strategic", "Cash runway?", 3),
+                           ("operations", "Cash runway?", 3)]
+
+    # A larger k must not be served from the shorter cached list
+    hits = retrieval.search("Cash runway?", ["financial"], 5)
+    assert index.calls[-1] == ("financial", "Cash runway?", 5)
+    assert len(hits) == 5
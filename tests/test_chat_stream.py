@@ -0,0 +1,150 @@
+"""
+Tests for the SSE /api/chat/stream endpoint in digital_twin_live.py and the
+answer deltas the graph dispatches in api/graph.py
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+
+import api.graph as graph
+import digital_twin_live as live
+from api.graph import _DeltaForwarder
+
+
+class FakeDeployment:
+    """call_langgraph_deployment that streams ``snapshots`` of a growing answer"""
+
+    def __init__(self, *snapshots):
+        self.snapshots = snapshots
+
+    async def __call__(self, question, agent_type="ceo_digital_twin", audience="public",
+                       first_token=None, on_content=None):
+        for content in self.snapshots:
+            await on_content(content)
+        return {"success": True, "response": {"content": self.snapshots[-1]}}
+
+
+class FailingGraph:
+    async def astream_events(self, state, version):
+        raise RuntimeError("graph unavailable")
+        yield
+
+
+class EndlessGraph:
+    def __init__(self):
+        self.closed = False
+
+    async def astream_events(self, state, version):
+        try:
+            while True:
+                yield {"event": "on_custom_event", "name": graph.CONTENT_DELTA_EVENT, "data": {"delta": "more "}}
+                await asyncio.sleep(0)
+        finally:
+            self.closed = True
+
+
+def parse_sse(body):
+    frames = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        frames.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return frames
+
+
+def stream(question="How is revenue trending?", agent_type="cfo_agent"):
+    async def scenario():
+        transport = httpx.ASGITransport(app=live.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/api/chat/stream", json={"question": question, "agent_type": agent_type})
+        return response
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/event-stream")
+    return parse_sse(response.text)
+
+
+def test_graph_deltas_stream_between_metadata_and_done(monkeypatch):
+    monkeypatch.setattr(live, "USE_LANGGRAPH", True)
+    monkeypatch.setattr(graph, "DEPLOYMENT_RACE_BUDGET_MS", 0)
+    monkeypatch.setattr(graph, "call_langgraph_deployment", FakeDeployment("Revenue", "Revenue grew 32%"))
+
+    frames = stream()
+    assert [event for event, _ in frames] == ["metadata", "delta", "delta", "done"]
+    assert frames[0][1]["processing_method"] == "langgraph"
+    assert [data["content"] for event, data in frames if event == "delta"] == ["Revenue", " grew 32%"]
+    assert frames[-1][1]["metadata"]["deployment_method"] == "langgraph_deployment"
+    assert frames[-1][1]["timing"]["first_delta_ms"] is not None
+
+
+def test_echoed_question_is_not_streamed_as_a_delta(monkeypatch):
+    question = {"type": "human", "content": "How is revenue trending?"}
+    events = [{"messages": [question]}, {"messages": [question, {"type": "ai", "content": "Revenue grew 32%"}]}]
+    body = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=body))
+    # only the deployment call gets the mock transport; the test client stays real
+    deployment_httpx = SimpleNamespace(AsyncClient=lambda **kwargs: httpx.AsyncClient(transport=transport, **kwargs),
+                                       TimeoutException=httpx.TimeoutException)
+    monkeypatch.setattr(live, "USE_LANGGRAPH", True)
+    monkeypatch.setattr(graph, "DEPLOYMENT_RACE_BUDGET_MS", 0)
+    monkeypatch.setattr(graph, "httpx", deployment_httpx)
+
+    frames = stream()
+    assert [data["content"] for event, data in frames if event == "delta"] == ["Revenue grew 32%"]
+
+
+def test_without_langgraph_the_enhanced_answer_is_streamed(monkeypatch):
+    monkeypatch.setattr(live, "LANGGRAPH_AVAILABLE", False)
+
+    frames = stream()
+    assert [event for event, _ in frames][0] == "metadata" and frames[-1][0] == "done"
+    assert {event for event, _ in frames[1:-1]} == {"delta"}
+    assert frames[0][1]["processing_method"] == "enhanced_ai"
+    answer = "".join(data["content"] for event, data in frames if event == "delta")
+    assert "How is revenue trending?" in answer
+    assert frames[-1][1]["metadata"]["processing_method"] == "enhanced_ai"
+
+
+def test_graph_failure_before_any_delta_falls_back(monkeypatch):
+    monkeypatch.setattr(live, "USE_LANGGRAPH", True)
+    monkeypatch.setattr(live, "langgraph_graph", FailingGraph())
+
+    frames = stream()
+    assert [event for event, _ in frames[:2]] == ["metadata", "metadata"]
+    assert frames[1][1] == {"processing_method": "enhanced_ai", "fallback": True}
+    assert frames[2][0] == "delta" and frames[-1][0] == "done"
+
+
+def test_client_disconnect_closes_the_graph_stream(monkeypatch):
+    endless = EndlessGraph()
+    monkeypatch.setattr(live, "USE_LANGGRAPH", True)
+    monkeypatch.setattr(live, "langgraph_graph", endless)
+
+    async def scenario():
+        frames = live._chat_event_stream(live.AgentRequest(question="Outlook?", agent_type="cfo_agent"))
+        received = [await frames.__anext__(), await frames.__anext__()]
+        # What StreamingResponse does when the client goes away
+        await frames.aclose()
+        return received
+
+    received = asyncio.run(scenario())
+    assert [frame.split("\n", 1)[0] for frame in received] == ["event: metadata", "event: delta"]
+    assert endless.closed
+
+
+def test_delta_forwarder_sends_extensions_rewrites_and_stops_after_finish():
+    sent = []
+
+    async def on_delta(delta):
+        sent.append(delta)
+
+    async def scenario():
+        forward = _DeltaForwarder(on_delta)
+        for content in ("Cash", "Cash runway", "Cash runway", "Runway is 18 months"):
+            await forward(content)
+        await forward.finish("Runway is 18 months.")
+        await forward("Late remote content")
+
+    asyncio.run(scenario())
+    assert sent == ["Cash", " runway", "Runway is 18 months", "."]
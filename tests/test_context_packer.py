@@ -0,0 +1,46 @@
+"""
+Tests for token-budgeted context packing in api/context_packer.py
+"""
+from langchain_core.documents import Document
+
+from api.context_packer import ContextPacker, estimate_tokens, splice
+from api.ingestion import split_text
+
+REPORT = " ".join(f"Q{i % 4 + 1} greenhouse {i} yielded {i * 7} kilos of bananas." for i in range(60))
+
+
+def chunk_docs(text, source, chunk_size=200, overlap=60):
+    return [Document(page_content=chunk, metadata={"source": source, "start": start, "end": end})
+            for chunk, start, end in split_text(text, chunk_size, overlap)]
+
+
+def test_overlapping_neighbours_become_one_passage():
+    chunks = chunk_docs(REPORT, "harvest.pdf")
+    hits = [(chunks[3], 0.9), (chunks[1], 0.8), (chunks[2], 0.7), (Document(page_content="Cash runway is 18 months"), 0.6)]
+    passages, stats = ContextPacker(budget_tokens=1000).pack(hits)
+    assert [p.source for p in passages] == ["harvest.pdf", None]
+    assert passages[0].text == REPORT[chunks[1].metadata["start"]:chunks[3].metadata["end"]]
+    # Chunks 3 and 1 do not touch; chunk 2 bridges them
+    assert passages[0].chunks == 3 and stats["merged"] == 1
+    assert stats["tokens"] < stats["raw_tokens"]
+
+
+def test_budget_is_filled_best_first_without_cutting_chunks():
+    chunks = chunk_docs(REPORT, "harvest.pdf")
+    small = Document(page_content="Water usage fell 30%", metadata={"source": "esg.pdf"})
+    budget = estimate_tokens("[harvest.pdf] " + chunks[0].page_content) + 8
+    passages, stats = ContextPacker(budget_tokens=budget).pack([(chunks[0], 0.9), (chunks[10], 0.8), (small, 0.7)])
+    assert [p.text for p in passages] == [chunks[0].page_content, small.page_content]
+    assert stats["skipped"] == 1 and stats["tokens"] <= budget
+    # Only a best hit that is alone over budget is shortened, on a word boundary
+    passages, _ = ContextPacker(budget_tokens=10).pack([(chunks[0], 0.9)])
+    assert chunks[0].page_content.startswith(passages[0].text) and passages[0].tokens <= 10
+
+
+def test_splice_checks_text_not_just_offsets():
+    assert splice("the drip irrigation retrofit", "irrigation retrofit cut water use", 19) == \
+        "the drip irrigation retrofit cut water use"
+    # Stale offsets: the shared text is found from the start of the later chunk
+    assert splice("the drip irrigation retrofit", "irrigation retrofit cut water use", 5) == \
+        "the drip irrigation retrofit cut water use"
+    assert splice("the drip irrigation retrofit", "solar panels on the packhouse", 10) is None
@@ -0,0 +1,147 @@
+"""
+Tests for racing the LangGraph deployment against its latency budget in api/graph.py
+and the /api/chat/upgrade follow-up in digital_twin_live.py
+"""
+import asyncio
+import json
+
+import httpx
+
+import api.graph as graph
+import digital_twin_live as live
+from api.graph import UpgradeRegistry, resolve_agent_response
+
+
+class FakeDeployment:
+    """Stands in for call_langgraph_deployment; streams only once ``release`` is set"""
+
+    def __init__(self, content="Remote answer", released=False):
+        self.content = content
+        self.release = asyncio.Event()
+        if released:
+            self.release.set()
+
+    async def __call__(self, question, agent_type="ceo_digital_twin", audience="public",
+                       first_token=None, on_content=None):
+        await self.release.wait()
+        if first_token is not None:
+            first_token.set()
+        if on_content is not None:
+            await on_content(self.content)
+        return {"success": True, "response": {"content": self.content}}
+
+
+def use_deployment(monkeypatch, budget_ms=20, max_jobs=4):
+    registry = UpgradeRegistry(max_jobs=max_jobs)
+    monkeypatch.setattr(graph, "DEPLOYMENT_RACE_BUDGET_MS", budget_ms)
+    monkeypatch.setattr(graph, "UPGRADE_REGISTRY", registry)
+    monkeypatch.setattr(live, "UPGRADE_REGISTRY", registry)
+    return registry
+
+
+def test_deployment_answer_within_budget_is_final(monkeypatch):
+    use_deployment(monkeypatch, budget_ms=1000)
+
+    async def scenario():
+        monkeypatch.setattr(graph, "call_langgraph_deployment", FakeDeployment(released=True))
+        deltas = []
+
+        async def on_delta(delta):
+            deltas.append(delta)
+
+        return await resolve_agent_response("Revenue outlook?", "cfo_agent", {}, on_delta), deltas
+
+    resolved, deltas = asyncio.run(scenario())
+    assert resolved == {"content": "Remote answer", "processing_method": "langgraph_deployment", "provisional": False}
+    assert deltas == ["Remote answer"]
+
+
+def test_slow_deployment_answers_provisionally_then_upgrades(monkeypatch):
+    registry = use_deployment(monkeypatch)
+
+    async def scenario():
+        deployment = FakeDeployment()
+        monkeypatch.setattr(graph, "call_langgraph_deployment", deployment)
+        resolved = await resolve_agent_response("Revenue outlook?", "cfo_agent", {})
+        pending = registry.status(resolved["upgrade_job_id"])
+        deployment.release.set()
+        await registry._jobs[resolved["upgrade_job_id"]]
+        return resolved, pending, registry.status(resolved["upgrade_job_id"])
+
+    resolved, pending, upgraded = asyncio.run(scenario())
+    assert resolved["provisional"] and resolved["processing_method"] == "enhanced_provisional"
+    assert "Revenue outlook?" in resolved["content"]
+    assert pending["status"] == "pending"
+    assert upgraded == {"job_id": resolved["upgrade_job_id"], "status": "complete",
+                        "response": "Remote answer", "processing_method": "langgraph_deployment"}
+
+
+def test_registry_evicts_and_cancels_the_oldest_job():
+    async def scenario():
+        registry = UpgradeRegistry(max_jobs=2)
+        tasks = [asyncio.create_task(asyncio.Event().wait()) for _ in range(3)]
+        job_ids = [registry.register(task) for task in tasks]
+        await asyncio.sleep(0)
+        for task in tasks[1:]:
+            task.cancel()
+        return registry, job_ids, tasks
+
+    registry, job_ids, tasks = asyncio.run(scenario())
+    assert registry.status(job_ids[0]) is None and tasks[0].cancelled()
+    assert registry.status(job_ids[2]) == {"job_id": job_ids[2], "status": "failed", "error": "cancelled"}
+
+
+def test_upgrade_endpoint_serves_jobs_and_404s_unknown_or_evicted(monkeypatch):
+    registry = use_deployment(monkeypatch, max_jobs=1)
+
+    async def scenario():
+        deployment = FakeDeployment()
+        monkeypatch.setattr(graph, "call_langgraph_deployment", deployment)
+        first = await resolve_agent_response("Cash runway?", "cfo_agent", {})
+        second = await resolve_agent_response("Hiring plan?", "ceo_digital_twin", {})
+        deployment.release.set()
+        await registry._jobs[second["upgrade_job_id"]]
+        transport = httpx.ASGITransport(app=live.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.get(f"/api/chat/upgrade/{job_id}")
+                    for job_id in (second["upgrade_job_id"], first["upgrade_job_id"], "no-such-job")]
+
+    upgraded, evicted, unknown = asyncio.run(scenario())
+    assert upgraded.status_code == 200 and upgraded.json()["status"] == "complete"
+    assert evicted.status_code == 404 and unknown.status_code == 404
+
+
+def values_stream(monkeypatch, *events, between=None):
+    """Serve ``events`` as the deployment's "values" stream, awaiting ``between`` after each"""
+    client = httpx.AsyncClient
+
+    async def body():
+        for event in events:
+            yield f"data: {json.dumps(event)}\n\n".encode()
+            if between is not None:
+                await between()
+
+    def handler(request):
+        return httpx.Response(200, content=body())
+
+    monkeypatch.setattr(graph.httpx, "AsyncClient",
+                        lambda **kwargs: client(transport=httpx.MockTransport(handler), **kwargs))
+
+
+def test_first_token_ignores_the_echoed_question(monkeypatch):
+    question = {"type": "human", "content": "Revenue outlook?"}
+    answer = {"type": "ai", "content": "Remote answer"}
+
+    async def scenario():
+        first_token, seen = asyncio.Event(), []
+
+        async def between():
+            seen.append(first_token.is_set())
+
+        values_stream(monkeypatch, {"messages": [question]}, {"messages": [question, answer]}, between=between)
+        result = await graph.call_langgraph_deployment("Revenue outlook?", first_token=first_token)
+        return result, seen
+
+    result, seen = asyncio.run(scenario())
+    assert seen == [False, True]
+    assert result["response"]["content"] == "Remote answer"
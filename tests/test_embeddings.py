@@ -0,0 +1,54 @@
+"""
+Tests for the local embedding provider and cache in api/embeddings.py
+"""
+import numpy as np
+import pytest
+
+from api.embeddings import CachedEmbeddings, EmbeddingProvider, HashingEmbeddings
+
+
+class CountingProvider(HashingEmbeddings):
+    def __init__(self):
+        super().__init__(dimension=64)
+        self.embedded = 0
+
+    def embed(self, texts):
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+
+def test_hashing_embeddings_are_stable_and_semantic():
+    provider = HashingEmbeddings(dimension=256)
+    vectors = provider.embed(["Water usage fell 30% in 2024", "water usage fell 30% in 2024", "Series A funding round"])
+    assert vectors.dtype == np.float32 and vectors.shape == (3, 256)
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    assert np.allclose(vectors[0], vectors[1])
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+    assert np.array_equal(provider.embed(["   "]), np.zeros((1, 256), dtype=np.float32))
+    assert provider.embed_query("Series A funding round") == vectors[2].tolist()
+
+
+def test_cache_avoids_recomputing(tmp_path):
+    provider = CountingProvider()
+    cached = CachedEmbeddings(provider, capacity=2, cache_dir=str(tmp_path))
+    first = cached.embed(["revenue", "water", "revenue"])
+    assert provider.embedded == 2
+    assert np.array_equal(first[0], first[2])
+
+    cached.embed(["water", "greenhouse"])
+    assert provider.embedded == 3
+    cached.embed(["revenue"])  # evicted from the LRU, served from disk
+    assert provider.embedded == 3
+    assert cached.stats()["disk_hits"] == 1
+
+    restarted = CachedEmbeddings(CountingProvider(), cache_dir=str(tmp_path))
+    assert np.array_equal(restarted.embed(["greenhouse"]), cached.embed(["greenhouse"]))
+    assert restarted.provider.embedded == 0
+
+
+def test_providers_must_implement_embed():
+    class Incomplete(EmbeddingProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
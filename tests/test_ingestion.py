@@ -0,0 +1,329 @@
+"""
+Tests for the background ingestion pipeline in api/ingestion.py
+"""
+import asyncio
+import threading
+
+import pytest
+
+import api.ingestion
+from api.ingestion import IngestionPipeline, IngestionQueueFull, read_blocks, split_text, stream_chunks
+from api.manifest import DocumentManifest
+from api.retrieval import ContentHasher, content_hash
+from api.store_executor import BoundedExecutor
+
+
+class RecordingSegment:
+    def __init__(self, log, domain):
+        self.log = log
+        self.domain = domain
+        self.texts = []
+
+    def add(self, texts, metadatas):
+        self.texts.extend(texts)
+        self.log.append(("add", self.domain, list(texts)))
+
+    def commit(self, removed):
+        self.log.append(("commit", self.domain, sorted(ref for _, ref in removed)))
+        return [f"{self.domain}:{text}" for text in self.texts]
+
+
+class FailingSegment(RecordingSegment):
+    def commit(self, removed):
+        if "boom" in self.texts:
+            raise RuntimeError("store unavailable")
+        return super().commit(removed)
+
+
+def split_on_bars(text):
+    return ((part, 0, 0) for part in text.split("|"))
+
+
+def test_split_text_windows_overlap_on_word_boundaries():
+    text = " ".join(f"word{i}" for i in range(2000))
+    chunks = list(split_text(text, chunk_size=200, overlap=50))
+    assert all(len(chunk) <= 200 for chunk, _, _ in chunks)
+    assert all(text[start:end].strip() == chunk for chunk, start, end in chunks)
+    assert chunks[-1][2] == len(text)
+    # Consecutive windows share their boundary words
+    for (first, _, first_end), (_, second_start, _) in zip(chunks, chunks[1:]):
+        assert second_start < first_end
+        assert text[second_start - 1].isspace()
+
+
+def test_stream_chunks_match_the_whole_string_whatever_the_blocks():
+    text = "".join(f"word{i}{' ' if i % 7 else chr(10)}" for i in range(3000))
+    expected = list(split_text(text, chunk_size=200, overlap=50))
+    for size in (1, 13, 199, 200, 201, 5000):
+        blocks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert list(stream_chunks(iter(blocks), chunk_size=200, overlap=50)) == expected
+        hasher = ContentHasher()
+        for block in blocks:
+            hasher.update(block)
+        assert hasher.hexdigest() == content_hash(text)
+
+
+def test_streamed_document_is_chunked_and_recognised_unchanged(tmp_path):
+    log = []
+    path = tmp_path / "export.txt"
+    path.write_text(" ".join(f"row {i} harvest {i * 3} kilos" for i in range(2000)))
+    executor = BoundedExecutor(max_workers=1, max_queue=4, timeout=5)
+    pipeline = IngestionPipeline(lambda domain, audience: RecordingSegment(log, domain), executor,
+                                 manifest=DocumentManifest(str(tmp_path)))
+
+    async def scenario():
+        jobs = []
+        for content in (read_blocks(str(path), block_size=4096), path.read_text(), read_blocks(str(path), block_size=10)):
+            jobs.append(pipeline.submit(content, "export.txt", "operations"))
+            await jobs[-1].done.wait()
+        await pipeline.stop()
+        return jobs
+
+    streamed, whole, again = asyncio.run(scenario())
+    executor.shutdown()
+    assert streamed.status == "completed" and streamed.chunks_indexed == len(list(split_text(path.read_text())))
+    assert whole.unchanged and again.unchanged and again.to_dict()["progress"] == 1.0
+    assert [entry[0] for entry in log].count("commit") == 1
+
+
+def test_batches_and_skips_duplicate_chunks():
+    log = []
+    def chunker(text):
+        offset = 0
+        for part in text.split("|"):
+            yield part, offset, offset + len(part)
+            offset += len(part) + 1
+
+    executor = BoundedExecutor(max_workers=1, max_queue=4, timeout=5)
+    pipeline = IngestionPipeline(lambda domain, audience: RecordingSegment(log, domain), executor, chunker=chunker,
+                                 workers=1, queue_size=1, batch_size=2)
+
+    async def scenario():
+        first = pipeline.submit("a|b|a|c|b|d", "board-pack.pdf", "financial")
+        with pytest.raises(IngestionQueueFull):
+            pipeline.submit("e", "late.pdf", "financial")
+        await first.done.wait()
+        again = pipeline.submit("a|d|e", "board-pack-v2.pdf", "financial")
+        await again.done.wait()
+        other = pipeline.submit("a", "ops.pdf", "operations")
+        await other.done.wait()
+        await pipeline.stop()
+        return first, again, other
+
+    first, again, other = asyncio.run(scenario())
+    executor.shutdown()
+    assert log == [
+        ("add", "financial", ["a", "b"]), ("add", "financial", ["c", "d"]), ("commit", "financial", []),
+        ("add", "financial", ["e"]), ("commit", "financial", []),
+        ("add", "operations", ["a"]), ("commit", "operations", []),
+    ]
+    assert first.to_dict()["chunks_indexed"] == 4
+    assert first.duplicates == 2 and first.batches == 2 and first.to_dict()["progress"] == 1.0
+    assert (again.chunks_indexed, again.duplicates) == (1, 2)
+    # Dedup is per domain: the same text may live in another domain
+    assert other.status == "completed" and other.chunks_indexed == 1
+    assert pipeline.job(first.job_id) is first
+
+
+def test_reingest_embeds_only_changed_chunks(tmp_path):
+    log = []
+    executor = BoundedExecutor(max_workers=1, max_queue=4, timeout=5)
+    pipeline = IngestionPipeline(
+        lambda domain, audience: RecordingSegment(log, domain), executor,
+        chunker=lambda text: ((part, 0, 0) for part in text.split("|")), manifest=DocumentManifest(str(tmp_path)),
+    )
+
+    async def ingest(content, source):
+        job = pipeline.submit(content, source, "strategic")
+        await job.done.wait()
+        return job
+
+    async def scenario():
+        jobs = [await ingest("intro|plan|risks", "board.pdf"), await ingest("intro|plan|risks", "board.pdf"),
+                await ingest("intro|plan v2|risks|budget", "board.pdf"), await ingest("intro|memo", "memo.pdf")]
+        await ingest("memo", "memo.pdf")
+        forgotten = await pipeline.forget("board.pdf")
+        await pipeline.stop()
+        return jobs, forgotten
+
+    (first, unchanged, edited, other), forgotten = asyncio.run(scenario())
+    executor.shutdown()
+    assert unchanged.unchanged and unchanged.chunks_indexed == 0
+    assert (edited.chunks_indexed, edited.duplicates, edited.chunks_removed) == (2, 2, 1)
+    assert other.chunks_indexed == 1
+    # New chunks and the tombstones they replace go out in the same commit; memo.pdf
+    # dropping "intro" leaves it alone while board.pdf still holds it
+    assert log == [
+        ("add", "strategic", ["intro", "plan", "risks"]), ("commit", "strategic", []),
+        ("add", "strategic", ["plan v2", "budget"]), ("commit", "strategic", ["strategic:plan"]),
+        ("add", "strategic", ["memo"]), ("commit", "strategic", []),
+        ("commit", "strategic", []),
+        ("commit", "strategic", ["strategic:budget", "strategic:intro", "strategic:plan v2", "strategic:risks"]),
+    ]
+    assert forgotten == 4
+    assert pipeline.manifest.get("board.pdf") is None
+    assert pipeline.manifest.get("memo.pdf").chunks == {content_hash("memo"): "strategic:memo"}
+
+
+def test_changing_audience_restores_chunks_under_the_new_one(tmp_path):
+    log = []
+    executor = BoundedExecutor(max_workers=1, max_queue=4, timeout=5)
+    pipeline = IngestionPipeline(
+        lambda domain, audience: RecordingSegment(log, f"{domain}/{audience}"), executor,
+        chunker=lambda text: ((part, 0, 0) for part in text.split("|")), manifest=DocumentManifest(str(tmp_path)),
+    )
+
+    async def scenario():
+        jobs = []
+        for source, audience in (("deck.pdf", "investor"), ("memo.pdf", "boardroom"), ("deck.pdf", "public")):
+            jobs.append(pipeline.submit("intro|plan", source, "strategic", audience=audience))
+            await jobs[-1].done.wait()
+        with pytest.raises(ValueError):
+            pipeline.submit("intro", "leak.pdf", "strategic", audience="everyone")
+        await pipeline.stop()
+        return jobs
+
+    deck, memo, public_deck = asyncio.run(scenario())
+    executor.shutdown()
+    # The same text is never shared across audiences, and the investor copy goes once it is public
+    assert (deck.chunks_indexed, memo.chunks_indexed, public_deck.chunks_indexed) == (2, 2, 2)
+    assert log[-1] == ("commit", "strategic/public", ["strategic/investor:intro", "strategic/investor:plan"])
+    assert pipeline.manifest.get("deck.pdf").audience == "public"
+    assert pipeline.known_chunks[("strategic", "boardroom", content_hash("plan"))] == "strategic/boardroom:plan"
+
+
+def test_concurrent_jobs_embed_a_shared_chunk_once(tmp_path):
+    log = []
+    executor = BoundedExecutor(max_workers=2, max_queue=8, timeout=5)
+    pipeline = IngestionPipeline(lambda domain, audience: RecordingSegment(log, domain), executor,
+                                 chunker=split_on_bars, batch_size=1, manifest=DocumentManifest(str(tmp_path)))
+
+    async def scenario():
+        jobs = [pipeline.submit("shared|only a", "a.pdf", "financial"), pipeline.submit("shared|only b", "b.pdf", "financial")]
+        await asyncio.gather(*(job.done.wait() for job in jobs))
+        await pipeline.stop()
+        return jobs
+
+    jobs = asyncio.run(scenario())
+    executor.shutdown()
+    added = [text for entry in log if entry[0] == "add" for text in entry[2]]
+    assert sorted(added) == ["only a", "only b", "shared"]
+    assert sorted(job.duplicates for job in jobs) == [0, 1]
+    shared = pipeline.known_chunks[("financial", "boardroom", content_hash("shared"))]
+    assert all(pipeline.manifest.get(source).chunks[content_hash("shared")] == shared for source in ("a.pdf", "b.pdf"))
+    assert not pipeline._reserved
+
+
+def test_chunks_reserved_by_a_failed_job_are_embedded_by_the_waiting_one():
+    log = []
+    executor = BoundedExecutor(max_workers=2, max_queue=8, timeout=5)
+    pipeline = IngestionPipeline(lambda domain, audience: FailingSegment(log, domain), executor,
+                                 chunker=split_on_bars, batch_size=1)
+
+    async def scenario():
+        failing = pipeline.submit("shared|boom", "a.pdf", "financial")
+        waiting = pipeline.submit("shared|only b", "b.pdf", "financial")
+        await asyncio.gather(failing.done.wait(), waiting.done.wait())
+        await pipeline.stop()
+        return failing, waiting
+
+    failing, waiting = asyncio.run(scenario())
+    executor.shutdown()
+    assert failing.status == "failed" and waiting.status == "completed"
+    assert (waiting.chunks_indexed, waiting.duplicates) == (2, 0)
+    assert pipeline.known_chunks[("financial", "boardroom", content_hash("shared"))] == "financial:shared"
+    assert not pipeline._reserved
+
+
+def test_a_commit_slower_than_the_batch_timeout_is_still_recorded(monkeypatch):
+    log = []
+    release = threading.Event()
+
+    class SlowSegment(RecordingSegment):
+        def commit(self, removed):
+            release.wait(timeout=5)
+            return super().commit(removed)
+
+    monkeypatch.setattr(api.ingestion, "INGEST_BATCH_TIMEOUT", 0.05)
+    executor = BoundedExecutor(max_workers=1, max_queue=4, timeout=0.05)
+    pipeline = IngestionPipeline(lambda domain, audience: SlowSegment(log, domain), executor, chunker=split_on_bars)
+
+    async def scenario():
+        job = pipeline.submit("plan|risks", "board.pdf", "strategic")
+        while not log or log[-1][0] != "add":
+            await asyncio.sleep(0)
+        # Well past the batch and executor timeouts before the commit returns
+        await asyncio.sleep(0.2)
+        release.set()
+        await job.done.wait()
+        await pipeline.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    executor.shutdown()
+    assert job.status == "completed" and job.chunks_indexed == 2
+    assert pipeline.known_chunks[("strategic", "boardroom", content_hash("risks"))] == "strategic:risks"
+
+
+def test_chunker_runs_off_the_event_loop_thread():
+    threads = set()
+
+    def chunker(text):
+        for part in text.split("|"):
+            threads.add(threading.get_ident())
+            yield part, 0, 0
+
+    executor = BoundedExecutor(max_workers=1, max_queue=4, timeout=5)
+    pipeline = IngestionPipeline(lambda domain, audience: RecordingSegment([], domain), executor, chunker=chunker,
+                                 batch_size=2)
+
+    async def scenario():
+        job = pipeline.submit("a|b|c|d|e", "notes.pdf", "operations")
+        await job.done.wait()
+        await pipeline.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    executor.shutdown()
+    assert job.status == "completed" and job.chunks_indexed == 5
+    assert threads and threading.get_ident() not in threads
+
+
+def test_a_chunk_taken_by_a_running_job_is_not_tombstoned(tmp_path):
+    log = []
+    staging, release = threading.Event(), threading.Event()
+
+    class SlowSegment(RecordingSegment):
+        def add(self, texts, metadatas):
+            if "only b" in texts:
+                staging.set()
+                release.wait(timeout=5)
+            super().add(texts, metadatas)
+
+    executor = BoundedExecutor(max_workers=2, max_queue=8, timeout=5)
+    pipeline = IngestionPipeline(lambda domain, audience: SlowSegment(log, domain), executor,
+                                 chunker=split_on_bars, batch_size=1, manifest=DocumentManifest(str(tmp_path)))
+
+    async def scenario():
+        first = pipeline.submit("shared|only a", "a.pdf", "financial")
+        await first.done.wait()
+        # b.pdf takes "shared" from known_chunks, then stalls before its manifest records it
+        taking = pipeline.submit("shared|only b", "b.pdf", "financial")
+        while not staging.is_set():
+            await asyncio.sleep(0.01)
+        dropping = pipeline.submit("only a v2", "a.pdf", "financial")
+        await dropping.done.wait()
+        release.set()
+        await taking.done.wait()
+        await pipeline.stop()
+        return dropping, taking
+
+    dropping, taking = asyncio.run(scenario())
+    executor.shutdown()
+    assert dropping.status == taking.status == "completed"
+    assert dropping.chunks_removed == 1
+    tombstoned = [ref for entry in log if entry[0] == "commit" for ref in entry[2]]
+    assert tombstoned == ["financial:only a"]
+    assert pipeline.manifest.get("b.pdf").chunks[content_hash("shared")] == "financial:shared"
+    assert pipeline.known_chunks[("financial", "boardroom", content_hash("shared"))] == "financial:shared"
+    assert not pipeline._in_use
@@ -0,0 +1,80 @@
+"""
+Tests for the BM25 knowledge index in api/knowledge_index.py
+"""
+import threading
+
+from api.knowledge_index import BM25Index, audience_bits, audience_mask, tokenize
+
+KNOWLEDGE_BASE = {
+    "financial": [
+        "Q3 2024 Revenue: 3.2M EUR (32% YoY growth)",
+        "Series A funding target: 8M EUR for technology infrastructure",
+    ],
+    "sustainability": [
+        "Water usage reduced by 35% through AI-optimized irrigation systems",
+        "Carbon neutral operations achieved in Q4 2024",
+    ],
+}
+
+
+def test_tokenize_keeps_figures_and_folds_plurals():
+    assert tokenize("The Revenues were 3.2M EUR") == ["revenue", "3.2m", "eur"]
+
+
+def test_search_ranks_by_question():
+    index = BM25Index.from_knowledge_base(KNOWLEDGE_BASE)
+
+    hits = index.search("How much water does irrigation use?", k=2)
+    assert hits[0].payload.startswith("Water usage")
+    assert hits[0].score > 0
+
+
+def test_domain_filter_is_applied_while_scoring():
+    index = BM25Index.from_knowledge_base(KNOWLEDGE_BASE)
+
+    assert index.search("2024 revenue", domains=["sustainability"])[0].payload.startswith("Carbon")
+    assert index.search("2024 revenue", domains=["unknown"]) == []
+
+
+def test_remove_drops_document():
+    index = BM25Index()
+    doc_id = index.add("GMP dossier submitted", domains=["compliance"])
+    index.add("ZEC filing due in March", domains=["compliance"])
+
+    assert index.remove(doc_id)
+    assert [hit.payload for hit in index.search("dossier filing")] == ["ZEC filing due in March"]
+    assert len(index) == 1
+
+
+def test_audience_bitmap_hides_chunks_above_the_reader():
+    index = BM25Index()
+    index.add("Revenue guidance for the press release", domains=["financial"], audiences=audience_bits("public"))
+    index.add("Revenue bridge for the investor update", domains=["financial"], audiences=audience_bits("investor"))
+    index.add("Revenue downside scenario for the board", domains=["financial"], audiences=audience_bits("boardroom"))
+    seen = {audience: len(index.search("revenue", k=5, audience_mask=audience_mask(audience)))
+            for audience in ("public", "investor", "boardroom", "press")}
+    assert seen == {"public": 1, "investor": 2, "boardroom": 3, "press": 1}
+    assert len(index.search("revenue", k=5)) == 3
+
+
+def test_searches_see_each_update_whole_while_it_is_written():
+    index = BM25Index()
+    current = index.update([("Harvest plan version 0", None, ["operations"], 0xFF)])
+    stop = threading.Event()
+    seen = []
+
+    def reader():
+        while not stop.is_set():
+            seen.append(len(index.search("harvest plan", k=5)))
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for version in range(1, 500):
+            current = index.update([(f"Harvest plan version {version}", None, ["operations"], 0xFF)], current)
+    finally:
+        stop.set()
+        thread.join()
+    # Each version replaces the last in one step, so a search never finds zero or two
+    assert seen and set(seen) == {1}
+    assert [hit.payload for hit in index.search("harvest plan")] == ["Harvest plan version 499"]
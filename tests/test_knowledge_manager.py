@@ -0,0 +1,222 @@
+"""
+Tests for lazy store opening and readiness of KnowledgeManager in enhanced_digital_twin.py
+"""
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+import api.embeddings
+import enhanced_digital_twin as enhanced
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(enhanced, "VECTOR_BACKEND", "native")
+    monkeypatch.setattr(enhanced, "VECTOR_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(api.embeddings, "EMBEDDING_CACHE_DIR", "")
+    manager = enhanced.KnowledgeManager(str(tmp_path / "stores"))
+    yield manager
+    asyncio.run(manager.close())
+
+
+def test_construction_opens_nothing(manager, tmp_path):
+    assert not (tmp_path / "stores").exists() and not (tmp_path / "index").exists()
+    assert manager.embeddings is None and manager.manifest is None
+    readiness = manager.readiness()
+    assert not readiness["ready"] and set(readiness["domains"].values()) == {"pending"}
+
+
+def test_domains_open_on_first_use_and_warm_up_opens_the_rest(manager):
+    async def scenario():
+        await manager.retrieve_scored("cash runway", ["financial"])
+        first = manager.readiness()
+        await manager.warm_up()
+        return first
+
+    first = asyncio.run(scenario())
+    assert first["domains"]["financial"] == "open" and first["domains"]["strategic"] == "pending"
+    assert not first["ready"]
+    assert manager.ready and manager.ingestion is not None
+    assert set(manager.readiness()["domains"].values()) == {"open"}
+
+
+def test_index_training_runs_after_the_commit(manager, monkeypatch):
+    import api.ann_index
+    monkeypatch.setattr(api.ann_index, "IVF_MIN_ROWS", 8)
+    segment = manager.open_segment("financial", "public")
+    ivf = manager.ann_index
+    release = threading.Event()
+    train = ivf.train
+
+    def slow_train(*args, **kwargs):
+        release.wait(timeout=5)
+        train(*args, **kwargs)
+
+    monkeypatch.setattr(ivf, "train", slow_train)
+    texts = [f"Quarterly revenue note {i} for the board" for i in range(12)]
+    segment.add(texts, [{"domain": "financial", "source": "notes.pdf"} for _ in texts])
+    segment.commit([])
+
+    # The commit has published its rows while training still waits
+    assert not ivf.trained and len(manager.vector_index) == 12
+    assert not manager.wait_for_training(timeout=0)
+    release.set()
+    assert manager.wait_for_training(timeout=5)
+    assert ivf.trained and not ivf.needs_training
+
+
+def test_keyword_index_follows_commits_tombstones_and_restarts(manager, tmp_path):
+    async def keyword_sources(target, query):
+        await target.open_domains(["financial"])
+        return [doc.page_content for doc, _ in target._search_lexical(query, ["financial"], 5, "public")]
+
+    async def scenario():
+        await manager.ingest_document("Permit ZEC-48213 covers the Tenerife greenhouse", "permits.txt", "financial",
+                                      audience="public")
+        first = await keyword_sources(manager, "48213")
+        await manager.ingest_document("Permit ZEC-59120 replaces the Tenerife greenhouse permit", "permits.txt",
+                                      "financial", audience="public")
+        replaced = await keyword_sources(manager, "48213"), await keyword_sources(manager, "59120")
+        await manager.close()
+        restarted = enhanced.KnowledgeManager(str(tmp_path / "stores"))
+        try:
+            return first, replaced, await keyword_sources(restarted, "permit Tenerife greenhouse")
+        finally:
+            await restarted.close()
+
+    first, (old, new), after_restart = asyncio.run(scenario())
+    assert first == ["Permit ZEC-48213 covers the Tenerife greenhouse"]
+    # The re-ingest tombstoned the old chunk in the same commit that added the new one
+    assert old == [] and new == ["Permit ZEC-59120 replaces the Tenerife greenhouse permit"]
+    assert after_restart == new
+    assert len(manager.lexical_index) == len(manager.vector_index) == 1
+
+
+def test_unlabelled_native_rows_get_the_default_audience(manager, tmp_path):
+    text = "Legacy board memo on the Tenerife land purchase"
+
+    async def scenario():
+        await manager.open_domains(["strategic"])
+        # Written the way rows were before audiences existed: open to every audience
+        manager.vector_index.add(manager.embeddings.embed([text]),
+                                 [{"text": text, "metadata": {"domain": "strategic", "chunk_hash": "legacy"}}], ["strategic"])
+        manager.vector_index.flush()
+        await manager.close()
+        reopened = enhanced.KnowledgeManager(str(tmp_path / "stores"))
+        try:
+            seen = {}
+            for audience in ("public", "boardroom"):
+                vector = await reopened.retrieve_scored("Tenerife land purchase", ["strategic"], 5, audience)
+                keyword = reopened._search_lexical("Tenerife land purchase", ["strategic"], 5, audience)
+                seen[audience] = (len(vector), len(keyword))
+            return seen, reopened._indexed_chunks()
+        finally:
+            await reopened.close()
+
+    seen, indexed = asyncio.run(scenario())
+    assert seen == {"public": (0, 0), "boardroom": (1, 1)}
+    assert ("strategic", enhanced.INGEST_DEFAULT_AUDIENCE, "legacy") in indexed
+
+
+
+def test_second_process_searches_the_writers_index_read_only(manager, tmp_path):
+    async def keyword(target, query):
+        return [doc.page_content for doc, _ in target._search_lexical(query, ["financial"], 5, "public")]
+
+    async def scenario():
+        await manager.open_domains(["financial"])
+        # Same directories, so the writer lock is taken, as in a second uvicorn worker
+        reader = enhanced.KnowledgeManager(str(tmp_path / "stores"))
+        try:
+            await reader.open_domains(["financial"])
+            with pytest.raises(enhanced.IndexLocked):
+                reader.submit_document("Permit 48213 covers the Tenerife greenhouse", "permits.txt", "financial")
+            await manager.ingest_document("Permit 48213 covers the Tenerife greenhouse", "permits.txt", "financial",
+                                          audience="public")
+            first = await reader.retrieve_scored("Tenerife greenhouse permit", ["financial"], 5), await keyword(reader, "48213")
+            await manager.ingest_document("Permit 59120 replaces the Tenerife greenhouse permit", "permits.txt",
+                                          "financial", audience="public")
+            return reader.vector_index.readonly, first, (await keyword(reader, "48213"), await keyword(reader, "59120"))
+        finally:
+            await reader.close()
+            await manager.close()
+
+    readonly, (vector, keyword_hits), (old, new) = asyncio.run(scenario())
+    assert readonly
+    assert [doc.page_content for doc, _ in vector] == keyword_hits == ["Permit 48213 covers the Tenerife greenhouse"]
+    assert old == [] and new == ["Permit 59120 replaces the Tenerife greenhouse permit"]
+
+
+class LegacyChroma:
+    """Chroma stand-in holding one labelled and one unlabelled chunk"""
+
+    def __init__(self):
+        self.updates = []
+        self._collection = self
+
+    def get(self):
+        return {"ids": ["new", "old"], "documents": ["Cash runway memo for investors", "Cash runway memo from 2023"],
+                "metadatas": [{"domain": "financial", "audience": "investor", "audience_level": 1}, {"domain": "financial"}]}
+
+    def update(self, ids, metadatas):
+        self.updates.append((ids, metadatas))
+
+
+def test_unlabelled_chroma_chunks_are_backfilled_with_the_default_audience(manager):
+    store = LegacyChroma()
+    manager.vector_stores["financial"] = store
+    manager._load_lexical_index("financial")
+
+    level = enhanced.AUDIENCES.index(enhanced.INGEST_DEFAULT_AUDIENCE)
+    assert store.updates == [(["old"], [{"domain": "financial", "audience": enhanced.INGEST_DEFAULT_AUDIENCE,
+                                         "audience_level": level}])]
+    visible = {audience: sorted(doc.page_content for doc, _ in manager._search_lexical("cash runway memo", ["financial"], 5, audience))
+               for audience in ("investor", "boardroom")}
+    assert visible == {"investor": ["Cash runway memo for investors"],
+                       "boardroom": ["Cash runway memo for investors", "Cash runway memo from 2023"]}
+
+
+class FlakyChroma:
+    """Chroma stand-in whose financial collection fails to open the first time"""
+    failures = {}
+
+    def __init__(self, collection_name, embedding_function, persist_directory):
+        if self.failures.get(collection_name):
+            self.failures[collection_name] -= 1
+            raise RuntimeError("collection is locked")
+        self._collection = self
+
+    def get(self):
+        return {"ids": [], "documents": [], "metadatas": []}
+
+
+def test_failed_domains_report_degraded_and_are_retried(manager, monkeypatch):
+    monkeypatch.setattr(enhanced, "VECTOR_BACKEND", "chroma")
+    monkeypatch.setattr(enhanced, "Chroma", FlakyChroma)
+    monkeypatch.setattr(FlakyChroma, "failures", {"ghc_financial": 1})
+    monkeypatch.setattr(enhanced, "knowledge_manager", manager)
+
+    async def ready_status():
+        transport = httpx.ASGITransport(app=enhanced.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get("/api/system/ready")
+        return response.status_code, response.json()
+
+    async def scenario():
+        await manager.warm_up()
+        degraded = await ready_status()
+        # Within the retry interval the failure stands
+        await manager.open_domains(["financial"])
+        still_failed = manager.readiness()["domains"]["financial"]
+        monkeypatch.setattr(enhanced, "KNOWLEDGE_OPEN_RETRY", 0)
+        await manager.open_domains(["financial"])
+        return degraded, still_failed, await ready_status()
+
+    (code, degraded), still_failed, recovered = asyncio.run(scenario())
+    assert code == 503 and not degraded["ready"] and degraded["status"] == "degraded"
+    assert degraded["domains"]["financial"] == "failed: collection is locked"
+    assert still_failed == "failed: collection is locked"
+    assert recovered[0] == 200 and recovered[1]["status"] == "ready"
+    assert manager.open_errors == {}
@@ -0,0 +1,40 @@
+"""
+Tests for conversation window compaction in api/graph.py
+"""
+from langchain_core.messages import HumanMessage, AIMessage
+
+from api.graph import compact_messages, MessageWindowPolicy, SUMMARY_MESSAGE_NAME
+
+
+def run_turns(policy, turns, answer="Answer is here. Detail follows."):
+    state = {"messages": []}
+    for i in range(turns):
+        state["messages"].append(HumanMessage(content=f"Question {i}. More text"))
+        state["messages"].append(AIMessage(content=answer))
+        compact_messages(state, policy)
+    return state
+
+
+def test_turn_limit_keeps_latest_turns_and_summary():
+    state = run_turns(MessageWindowPolicy(max_turns=3, token_budget=10**6), 6)
+    messages = state["messages"]
+
+    assert messages[0].name == SUMMARY_MESSAGE_NAME
+    assert "Question 0." in messages[0].content
+    assert [m.content for m in messages[1::2]] == ["Question 3. More text", "Question 4. More text", "Question 5. More text"]
+    assert state["message_window"]["turns"] == 3
+
+
+def test_token_budget_bounds_window():
+    policy = MessageWindowPolicy(max_turns=10**6, token_budget=500, summary_max_chars=300)
+    state = run_turns(policy, 200, answer="word " * 200)
+
+    assert len(state["messages"]) < 10
+    assert len(state["messages"][0].content) <= 300 + len("Summary of earlier conversation:\n")
+
+
+def test_summary_disabled_drops_old_turns():
+    state = run_turns(MessageWindowPolicy(max_turns=2, token_budget=10**6, summarize=False), 5)
+
+    assert len(state["messages"]) == 4
+    assert state["messages"][0].content == "Question 3. More text"
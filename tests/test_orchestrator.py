@@ -0,0 +1,84 @@
+"""
+Tests for deadline-bounded collaboration and shared retrieval in AgentOrchestrator (enhanced_digital_twin.py)
+"""
+import asyncio
+
+import api.embeddings
+import enhanced_digital_twin as enhanced
+from api.registry import RegistrySnapshot
+from enhanced_digital_twin import AgentOrchestrator, AgentRequest, AgentResponse, AgentType, KnowledgeSource
+
+
+class TimedAgent:
+    def __init__(self, agent_type, delay, log):
+        self.agent_type = agent_type
+        self.delay = delay
+        self.log = log
+
+    async def process_query(self, request, cache=None):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.log.append(self.agent_type)
+            raise
+        return AgentResponse(agent_type=self.agent_type, response=f"{self.agent_type.value} view", confidence=0.8,
+                             knowledge_sources=[KnowledgeSource.VECTOR_DB], recommended_actions=["Act"])
+
+
+def test_stragglers_are_cancelled_and_noted(monkeypatch):
+    agents = {"ceo_digital_twin": {"name": "CEO", "specialization": ["strategic"]},
+              "cfo_agent": {"name": "CFO", "specialization": ["financial"], "collaboration_deadline_ms": 50}}
+    monkeypatch.setattr(enhanced.agent_registry, "current", lambda: RegistrySnapshot(agents, {}, 1))
+    cancelled = []
+    orchestrator = AgentOrchestrator(enhanced.KnowledgeManager())
+    orchestrator.agents[AgentType.CEO] = TimedAgent(AgentType.CEO, 0, cancelled)
+    orchestrator.agents[AgentType.RISK_MANAGEMENT] = TimedAgent(AgentType.RISK_MANAGEMENT, 5, cancelled)
+    # The primary is a real agent so its deadline comes from the registry
+    primary = orchestrator.agents[AgentType.CFO]
+    monkeypatch.setattr(primary, "process_query", TimedAgent(AgentType.CFO, 0, cancelled).process_query)
+
+    request = AgentRequest(question="Can we fund the expansion?", agent_type=AgentType.CFO, require_collaboration=True)
+    response = asyncio.run(orchestrator.process_request(request))
+
+    assert cancelled == [AgentType.RISK_MANAGEMENT]
+    assert response.collaborating_agents == [AgentType.CEO]
+    assert response.metadata["collaboration_deadline_ms"] == 50
+    assert response.metadata["omitted_perspectives"] == {"risk_management": "deadline"}
+    assert "Risk Management (deadline)" in response.response
+
+
+def test_collaborators_reuse_the_primary_agents_searches(tmp_path, monkeypatch):
+    monkeypatch.setattr(enhanced, "VECTOR_BACKEND", "native")
+    monkeypatch.setattr(enhanced, "VECTOR_INDEX_DIR", str(tmp_path / "index"))
+    monkeypatch.setattr(api.embeddings, "EMBEDDING_CACHE_DIR", "")
+    monkeypatch.setattr(enhanced, "RETRIEVAL_MODE", "hybrid")
+    manager = enhanced.KnowledgeManager(str(tmp_path / "stores"))
+    orchestrator = AgentOrchestrator(manager)
+    searches = []
+    per_domain = manager._search_per_domain
+
+    async def record(kind, search, query, domains, top_k, audience, cache):
+        searches.append((kind, cache is None))
+        return await per_domain(kind, search, query, domains, top_k, audience, cache)
+
+    monkeypatch.setattr(manager, "_search_per_domain", record)
+
+    async def scenario():
+        await manager.ingest_document("Expansion capex of 4M EUR is funded from the Series A", "plan.txt", "financial",
+                                      audience="public")
+        alone = await orchestrator.process_request(
+            AgentRequest(question="How is the expansion funded?", agent_type=AgentType.CEO))
+        searched_alone = list(searches)
+        together = await orchestrator.process_request(
+            AgentRequest(question="How is the expansion funded?", agent_type=AgentType.CEO, require_collaboration=True))
+        await manager.close()
+        return alone, searched_alone, together
+
+    alone, searched_alone, together = asyncio.run(scenario())
+    # A lone agent runs one search per retriever over all its domains
+    assert searched_alone == [("vector", True), ("lexical", True)]
+    assert "retrieval_cache" not in alone.metadata
+    # CEO searches strategic, financial and operations; the CFO's financial and the COO's
+    # operations searches (vector and keyword) are served from the CEO's
+    assert together.collaborating_agents == [AgentType.CFO, AgentType.COO]
+    assert together.metadata["retrieval_cache"] == {"hits": 4, "misses": 10, "entries": 10}
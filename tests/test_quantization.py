@@ -0,0 +1,41 @@
+"""
+Tests for quantized codes with exact re-ranking in api/quantization.py
+"""
+import numpy as np
+import pytest
+
+from api.quantization import QuantizedIndex
+from api.vector_index import VectorIndex
+
+
+def clustered(rows, dim=64, topics=30, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(topics, dim))
+    vectors = (centers[rng.integers(0, topics, rows)] + rng.normal(size=(rows, dim)) * 0.4).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+@pytest.mark.parametrize("kind", ["int8", "pq"])
+def test_reranked_codes_match_exact_search(tmp_path, kind):
+    vectors = clustered(4000)
+    base = VectorIndex(tmp_path)
+    base.add(vectors[:3000], list(range(3000)), ["financial", "operations", "strategic"] * 1000)
+    quantized = QuantizedIndex(base, kind=kind, candidates=200)
+    quantized.train()
+    assert quantized.memory_bytes() == 3000 * (64 if kind == "int8" else 8)
+
+    # Rows added after training are encoded on the next search
+    base.add(vectors[3000:], list(range(3000, 4000)), ["financial"] * 1000)
+    queries = vectors[::97]
+    recall = np.mean([
+        len({h.doc_id for h in quantized.search(q, 5)} & {h.doc_id for h in base.search(q, 5)}) / 5 for q in queries
+    ])
+    assert recall >= 0.95
+    hit = quantized.search(vectors[3500], 1, domains=["financial"])[0]
+    assert hit.doc_id == 3500 and abs(hit.score - 1.0) < 1e-5
+
+    quantized.save()
+    base.close()
+    restored = QuantizedIndex(VectorIndex(tmp_path), kind=kind, candidates=200)
+    assert restored.load()
+    assert [h.doc_id for h in restored.search(vectors[10], 3)] == [h.doc_id for h in quantized.search(vectors[10], 3)]
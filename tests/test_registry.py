@@ -0,0 +1,80 @@
+"""
+Tests for the hot-reloaded agent registry in api/registry.py
+"""
+import json
+import os
+import threading
+
+from api.registry import AGENTS_FILE, KNOWLEDGE_FILE, KnowledgeRegistry
+
+AGENTS = {"ceo_digital_twin": {"name": "CEO Digital Twin", "specialization": ["strategic"]}}
+KNOWLEDGE = {"strategic": ["Series A target is 8M EUR"]}
+
+
+def write(path, data, bump=0):
+    path.write_text(data if isinstance(data, str) else json.dumps(data))
+    # Filesystem timestamps can be coarse; make every write visible to the watcher
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + bump * 1_000_000_000))
+
+
+def make_registry(tmp_path, **kwargs):
+    write(tmp_path / AGENTS_FILE, AGENTS)
+    write(tmp_path / KNOWLEDGE_FILE, KNOWLEDGE)
+    return KnowledgeRegistry(tmp_path, **kwargs)
+
+
+def test_reload_swaps_in_a_new_snapshot_and_notifies(tmp_path):
+    registry = make_registry(tmp_path, reload_interval=0)
+    seen = []
+    registry.subscribe(seen.append)
+    first = registry.current()
+
+    write(tmp_path / AGENTS_FILE, {**AGENTS, "esg_agent": {"name": "ESG", "specialization": ["sustainability"]}})
+    assert registry.reload()
+    assert registry.current().version == first.version + 1 and seen == [registry.current()]
+    assert registry.current().agent("esg_agent")["name"] == "ESG"
+    # Readers holding the old snapshot keep a consistent view
+    assert "esg_agent" not in first.agent_config
+
+
+def test_malformed_files_keep_the_previous_snapshot(tmp_path):
+    registry = make_registry(tmp_path, reload_interval=0)
+    seen = []
+    registry.subscribe(seen.append)
+    good = registry.current()
+
+    write(tmp_path / AGENTS_FILE, "{not json")
+    assert not registry.reload()
+    write(tmp_path / AGENTS_FILE, {"ceo_digital_twin": {"name": "CEO"}})
+    assert not registry.reload()
+    write(tmp_path / AGENTS_FILE, AGENTS)
+    write(tmp_path / KNOWLEDGE_FILE, {"strategic": "not a list"})
+    assert not registry.reload()
+    assert registry.current() is good and seen == []
+
+
+def test_watcher_reloads_when_a_file_changes(tmp_path):
+    registry = make_registry(tmp_path, reload_interval=0.01)
+    reloaded = threading.Event()
+    registry.subscribe(lambda snapshot: reloaded.set())
+    registry.start_watching()
+    try:
+        write(tmp_path / KNOWLEDGE_FILE, {"strategic": ["Series A closed"]}, bump=1)
+        assert reloaded.wait(5)
+    finally:
+        registry.stop_watching()
+    assert registry.current().knowledge_base == {"strategic": ["Series A closed"]}
+
+
+def test_live_telemetry_counts_agents_added_by_a_reload(tmp_path, monkeypatch):
+    import digital_twin_live as live
+    from api.telemetry import TelemetryStore
+
+    registry = make_registry(tmp_path, reload_interval=0)
+    monkeypatch.setattr(live, "TELEMETRY", TelemetryStore(registry.current().agent_config))
+    registry.subscribe(live._register_agents)
+    write(tmp_path / AGENTS_FILE, {**AGENTS, "esg_agent": {"name": "ESG", "specialization": ["sustainability"]}})
+    registry.reload()
+    live.TELEMETRY.record("esg_agent", "enhanced_ai", 0.01)
+    assert live.TELEMETRY.snapshot()["by_agent"]["esg_agent"]["1m"]["requests"] == 1
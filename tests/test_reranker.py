@@ -0,0 +1,42 @@
+"""
+Tests for the local rerank stage in api/reranker.py
+"""
+from api.reranker import CrossReranker, FeatureReranker
+
+CANDIDATES = [
+    ("Drought planning: the island water board and our greenhouse permit", 0.9),
+    ("Revenue grew 40% on banana exports to the mainland", 0.8),
+    ("Greenhouse water usage fell 30% after the drip irrigation retrofit", 0.7),
+    ("Water usage", 0.6),
+]
+
+
+def test_proximity_and_phrase_lift_the_focused_chunk():
+    reranker = FeatureReranker(budget_ms=1000)
+    ranked, timings = reranker.rerank("greenhouse water usage after the retrofit", CANDIDATES, 2)
+    assert ranked[0][0] == CANDIDATES[2][0]
+    assert 0 <= ranked[1][1] <= ranked[0][1] <= 1
+    assert timings["reranked"] and timings["rerank_candidates"] == 4
+
+
+def test_keeps_retrieval_order_without_query_terms_or_budget():
+    reranker = FeatureReranker()
+    ranked, _ = reranker.rerank("what is the", CANDIDATES, 3)
+    assert [doc for doc, _ in ranked] == [doc for doc, _ in CANDIDATES[:3]]
+    ranked, timings = reranker.rerank("greenhouse water usage", CANDIDATES, 3, budget_ms=0)
+    assert ranked == CANDIDATES[:3] and not timings["reranked"]
+    assert reranker.rerank("water", [], 5)[0] == []
+
+
+def test_cross_scores_only_when_the_estimate_fits_the_budget():
+    calls = []
+    def cross_score(pairs):
+        calls.append(pairs)
+        return [5.0 if "Revenue" in text else -5.0 for _, text in pairs]
+
+    reranker = CrossReranker(cross_score, candidates=4, budget_ms=1000)
+    ranked, _ = reranker.rerank("water", CANDIDATES, 1)
+    assert ranked[0][0] == CANDIDATES[1][0] and len(calls) == 2
+    reranker.ms_per_pair = 10_000
+    ranked, _ = reranker.rerank("water", CANDIDATES, 1)
+    assert ranked[0][0] != CANDIDATES[1][0] and len(calls) == 2 and reranker.cross_skipped == 1
@@ -0,0 +1,44 @@
+"""
+Tests for the shared chat response model and trusted serializer in api/responses.py
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import httpx
+
+import api.responses as responses
+import digital_twin_live as live
+import simple_digital_twin as simple
+
+
+class TickingClock:
+    """datetime stand-in whose now() moves one second per call"""
+
+    def __init__(self):
+        self.current = datetime(2026, 1, 1, 9, 0, 0)
+
+    def now(self):
+        self.current += timedelta(seconds=1)
+        return self.current
+
+
+def test_each_response_gets_its_own_timestamp(monkeypatch):
+    monkeypatch.setattr(responses, "datetime", TickingClock())
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=simple.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [(await client.post("/api/chat", json={"question": "Cash runway?"})).json() for _ in range(2)]
+
+    first, second = asyncio.run(scenario())
+    assert first["timestamp"] == "2026-01-01T09:00:01" and second["timestamp"] == "2026-01-01T09:00:02"
+
+
+def test_trusted_json_matches_the_validated_serialization():
+    for model, extra in ((simple.ChatResponse, set()), (live.ChatResponse, {"system_mode"})):
+        built = model(agent_type="cfo_agent", response="Runway is 18 months", collaborating_agents=["ceo_digital_twin"],
+                      metadata={"processing_method": "enhanced_ai", "scores": [0.9, 0.4]})
+        trusted = json.loads(responses.trusted_json(built).body)
+        assert trusted == model.model_validate(built.model_dump()).model_dump(mode="json")
+        assert set(trusted) == set(responses.ChatResponse.model_fields) | extra
@@ -0,0 +1,61 @@
+"""
+Tests for cross-domain result merging and the request-scoped cache in api/retrieval.py
+"""
+import asyncio
+
+import pytest
+
+from api.retrieval import RetrievalCache, content_hash, merge_top_k, normalize_query, reciprocal_rank_fusion
+
+
+def test_merge_is_global_best_first():
+    financial = [("revenue grew 40%", 0.9), ("cash runway 18 months", 0.5)]
+    operations = [("water usage down 30%", 0.8), ("two new greenhouses", 0.7), ("supplier audit", 0.1)]
+    top = merge_top_k([financial, operations], 3)
+    assert top == [("revenue grew 40%", 0.9), ("water usage down 30%", 0.8), ("two new greenhouses", 0.7)]
+
+
+def test_merge_drops_repeated_content():
+    strategic = [("Series A closed", 0.95), ("Expansion to Tenerife", 0.4)]
+    financial = [("Series A  closed ", 0.9), ("Burn rate stable", 0.6)]
+    top = merge_top_k([strategic, financial], 5)
+    assert [doc for doc, _ in top] == ["Series A closed", "Burn rate stable", "Expansion to Tenerife"]
+    assert content_hash("Series A closed") == content_hash(" Series A\nclosed")
+
+
+def test_rank_fusion_rewards_agreement_and_ignores_raw_scores():
+    vector = [("ZEC filing overview", 0.91), ("Tax incentives in the Canaries", 0.90), ("GMP dossier", 0.2)]
+    keyword = [("GMP dossier", 14.2), ("ZEC filing  overview", 9.5)]
+    fused = reciprocal_rank_fusion([vector, keyword], 3, rrf_k=60)
+    assert [doc for doc, _ in fused] == ["ZEC filing overview", "GMP dossier", "Tax incentives in the Canaries"]
+    assert fused[0][1] == 1 / 61 + 1 / 62
+    assert reciprocal_rank_fusion([vector, []], 0) == []
+
+
+def test_cache_shares_searches_within_a_request():
+    searches = []
+
+    async def search(domain):
+        searches.append(domain)
+        await asyncio.sleep(0)
+        if domain == "flaky" and searches.count("flaky") == 1:
+            raise RuntimeError("store unavailable")
+        return [(f"{domain} fact", 0.5)]
+
+    async def scenario():
+        cache = RetrievalCache()
+        key = lambda question, domain: ("vector", normalize_query(question), domain, 5, "public")
+        # Concurrent lookups of one key wait on the same search
+        first, second = await asyncio.gather(
+            cache.fetch(key("What is our revenue?", "financial"), lambda: search("financial")),
+            cache.fetch(key("what is our  REVENUES", "financial"), lambda: search("financial")),
+        )
+        with pytest.raises(RuntimeError):
+            await cache.fetch(key("revenue", "flaky"), lambda: search("flaky"))
+        retried = await cache.fetch(key("revenue", "flaky"), lambda: search("flaky"))
+        return cache, first, second, retried
+
+    cache, first, second, retried = asyncio.run(scenario())
+    assert first is second and retried == [("flaky fact", 0.5)]
+    assert searches == ["financial", "flaky", "flaky"]
+    assert cache.stats() == {"hits": 1, "misses": 3, "entries": 2}
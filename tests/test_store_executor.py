@@ -0,0 +1,78 @@
+"""
+Tests for the bounded vector-store executor in api/store_executor.py
+"""
+import asyncio
+import threading
+
+import pytest
+
+from api.store_executor import BoundedExecutor, ExecutorSaturated
+
+
+def test_timeout_and_saturation():
+    release = threading.Event()
+    executor = BoundedExecutor(max_workers=1, max_queue=1, timeout=5)
+
+    async def scenario():
+        blocked = asyncio.ensure_future(executor.run(release.wait))
+        queued = asyncio.ensure_future(executor.run(release.wait))
+        # Both are admitted as soon as they first run
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(release.wait)
+        release.set()
+        await blocked
+        await queued
+
+        release.clear()
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(release.wait, timeout=0.01)
+        release.set()
+
+    asyncio.run(scenario())
+    executor.shutdown(wait=True)
+    stats = executor.stats()
+    assert stats["rejected"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["completed"] == 3
+    assert stats["peak_queued"] == 1
+    assert stats["running"] == stats["queued"] == 0
+
+
+def test_zero_timeout_is_not_the_default():
+    release = threading.Event()
+    executor = BoundedExecutor(max_workers=1, max_queue=1, timeout=5)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await executor.run(release.wait, timeout=0)
+
+    asyncio.run(scenario())
+    release.set()
+    executor.shutdown(wait=True)
+    assert executor.stats()["timeouts"] == 1
+
+
+def test_blocking_calls_leave_loop_responsive():
+    executor = BoundedExecutor(max_workers=4, max_queue=16, timeout=5)
+    # Passes only once all four calls block in workers at the same time
+    together = threading.Barrier(4, timeout=5)
+    release = threading.Event()
+
+    def search():
+        together.wait()
+        return release.wait(timeout=5)
+
+    async def scenario():
+        searches = asyncio.gather(*[executor.run(search) for _ in range(4)])
+        ticks = 0
+        while executor.stats()["running"] < 4:
+            ticks += 1
+            await asyncio.sleep(0)
+        # The loop kept running while every worker was blocked
+        assert not release.is_set() and ticks > 0
+        release.set()
+        return await searches
+
+    assert asyncio.run(scenario()) == [True] * 4
+    executor.shutdown()
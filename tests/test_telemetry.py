@@ -0,0 +1,62 @@
+"""
+Tests for the rolling-window telemetry store in api/telemetry.py
+"""
+from api.telemetry import TelemetryStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_percentiles_and_rates():
+    clock = FakeClock()
+    store = TelemetryStore(["cfo_agent"], clock=clock)
+    for i in range(100):
+        store.record("cfo_agent", "langgraph", 0.1 if i < 90 else 2.0, error=i >= 98, fallback=i % 10 == 0)
+
+    stats = store.window_stats("1m")
+    assert stats["requests"] == 100
+    assert stats["p50_ms"] <= 100
+    assert stats["p99_ms"] > 1500
+    assert stats["error_rate"] == 0.02
+    assert stats["fallback_rate"] == 0.1
+
+
+def test_windows_expire_independently():
+    clock = FakeClock()
+    store = TelemetryStore(["cfo_agent"], clock=clock)
+    store.record("cfo_agent", "enhanced_ai", 0.05)
+
+    clock.now += 120
+    assert store.window_stats("1m")["requests"] == 0
+    assert store.window_stats("15m")["requests"] == 1
+    assert store.window_stats("1h", method="enhanced_ai")["requests"] == 1
+
+    clock.now += 3600
+    assert store.window_stats("1h")["requests"] == 0
+
+
+def test_unknown_keys_share_other_series():
+    store = TelemetryStore(["cfo_agent"], clock=FakeClock())
+    store.record("made_up_agent", "made_up_method", 0.01)
+
+    snapshot = store.snapshot()
+    assert snapshot["by_agent"]["other"]["1m"]["requests"] == 1
+    assert snapshot["by_method"]["other"]["1m"]["requests"] == 1
+    assert set(snapshot["by_agent"]) == {"cfo_agent", "other"}
+
+
+def test_agent_types_added_later_get_their_own_series():
+    store = TelemetryStore(["cfo_agent"], clock=FakeClock())
+    store.record("esg_agent", "enhanced_ai", 0.01)
+    store.add_agent_types(["cfo_agent", "esg_agent"])
+    store.record("esg_agent", "enhanced_ai", 0.01)
+
+    snapshot = store.snapshot()
+    assert list(snapshot["by_agent"]) == ["cfo_agent", "esg_agent", "other"]
+    assert snapshot["by_agent"]["esg_agent"]["1m"]["requests"] == 1
+    assert snapshot["by_agent"]["other"]["1m"]["requests"] == 1
@@ -0,0 +1,118 @@
+"""
+Tests for the memory-mapped vector index in api/vector_index.py
+"""
+import numpy as np
+import pytest
+
+from api.vector_index import IndexLocked, VectorIndex
+
+
+def unit(rows, dim=16, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_search_matches_brute_force_with_filters(tmp_path):
+    vectors = unit(3000)
+    domains = ["financial", "operations", "strategic"] * 1000
+    audiences = [1, 3, 7] * 1000
+    index = VectorIndex(tmp_path, initial_capacity=64)
+    for start in range(0, 3000, 700):
+        index.add(vectors[start:start + 700], [{"row": i} for i in range(start, min(start + 700, 3000))],
+                  domains[start:start + 700], audiences[start:start + 700])
+
+    query = vectors[42]
+    hits = index.search(query, k=5)
+    assert [hit.doc_id for hit in hits] == list(np.argsort(-(vectors @ query))[:5])
+    assert hits[0].doc_id == 42 and hits[0].payload == {"row": 42}
+
+    financial = index.search(query, k=5, domains=["financial"])
+    assert all(hit.doc_id % 3 == 0 for hit in financial)
+    public = index.search(query, k=5, audience_mask=4)
+    assert all(hit.doc_id % 3 == 2 for hit in public)
+    assert index.search(query, k=5, domains=["unknown"]) == []
+
+    index.remove([42])
+    assert 42 not in [hit.doc_id for hit in index.search(query, k=5)]
+    assert len(index) == 2999
+    assert index.domain_counts()["financial"] == 999
+
+
+def test_readers_see_only_published_rows(tmp_path):
+    writer = VectorIndex(tmp_path)
+    vectors = unit(10)
+    writer.add(vectors[:6], [f"chunk {i}" for i in range(6)], ["financial"] * 6)
+    writer.flush()
+
+    reader = VectorIndex(tmp_path, readonly=True)
+    assert len(reader) == 6
+    writer.add(vectors[6:], [f"chunk {i}" for i in range(6, 10)], ["operations"] * 4)
+    assert not reader.refresh()
+    writer.flush()
+    assert reader.refresh()
+    assert reader.search(vectors[8], k=1)[0].payload == "chunk 8"
+    assert reader.search(vectors[8], k=1, domains=["operations"])[0].doc_id == 8
+
+
+
+def test_one_writer_at_a_time(tmp_path):
+    writer = VectorIndex(tmp_path)
+    writer.add(unit(3), ["a", "b", "c"], ["financial"] * 3)
+    with pytest.raises(IndexLocked):
+        VectorIndex(tmp_path)
+    # Readers never take the lock
+    assert len(VectorIndex(tmp_path, readonly=True)) == 0
+
+    writer.close()
+    with pytest.raises(PermissionError):
+        writer.add(unit(1), ["d"], ["financial"])
+    # Closing flushed the rows and released the directory
+    assert len(VectorIndex(tmp_path)) == 3
+
+
+def test_pinned_readers_keep_their_snapshot_until_released(tmp_path):
+    index = VectorIndex(tmp_path, initial_capacity=4)
+    vectors = unit(12)
+    index.add(vectors[:6], [f"v1 chunk {i}" for i in range(6)], ["strategic"] * 6)
+
+    segment = index.stage()
+    segment.add(vectors[6:], [f"v2 chunk {i}" for i in range(6, 12)], ["strategic"] * 6)
+    # Staged rows stay invisible, even to queries started after the stage
+    assert len(index) == 6 and index.search(vectors[8], k=1)[0].doc_id != 8
+
+    with index.pin() as before:
+        rows = segment.commit(remove=range(6))
+        assert list(rows) == list(range(6, 12))
+        # The pinned view still shows exactly the first version
+        assert before.size == 6 and not len(before.deleted)
+        assert index._search(before, vectors[2], 1, None, 0xFF)[0].doc_id == 2
+        # New queries see the second version only, through the tombstone overlay
+        assert index.search(vectors[2], k=1)[0].doc_id != 2
+        assert index.search(vectors[8], k=1)[0].payload == "v2 chunk 8"
+        assert len(index) == 6 and list(index._view.deleted) == list(range(6))
+        assert index.reclaim() == 0
+
+    # Releasing the last old pin folds the tombstones into the bitmap
+    assert not len(index._view.deleted)
+    assert not index._view.domains[:6].any()
+    assert index.domain_counts() == {"strategic": 6}
+
+
+
+def test_growing_the_files_keeps_the_view_version(tmp_path):
+    index = VectorIndex(tmp_path, initial_capacity=4)
+    vectors = unit(6)
+    index.add(vectors[:4], [f"chunk {i}" for i in range(4)], ["strategic"] * 4)
+    index.remove([3])
+    published, publish = [], index._publish
+
+    def record(view):
+        published.append((view.version, view.size, len(view.deleted)))
+        publish(view)
+
+    index._publish = record
+    # Past capacity, so the commit remaps the files and publishes the remapped view first
+    index.add(vectors[4:], ["chunk 4", "chunk 5"], ["strategic"] * 2)
+    # A query pinning the remapped view sees the same snapshot under the same version
+    assert published[0] == (2, 4, 0)
+    assert [version for version, _, _ in published] == [2, 3]